@@ -1,12 +1,10 @@
 import pygame
 import random
-import requests
 import time
-import threading
-import subprocess
+import flappy_speech
+from flappy_speech import speak, speech_report
 
 ELEVENLABS_KEY = "sk_dcd6c7f2dde7cab80421df8afab14901b3b8b16cb4b61abd"
-TTS_URL = "https://api.elevenlabs.io/v1/text-to-speech/EXAVITQu4vr4xnSDxMaL"
 
 SITUATIONAL_INSULTS = {
     "flap_streak": ["Not bad!", "Okay fine!", "Don't get cocky!", "Beginner's luck!"],
@@ -61,33 +59,7 @@ game_over = False
 
 ai_log = []
 
-tts_lock = threading.Lock()
-
-def speak(text):
-    def _speak():
-        try:
-            with tts_lock:
-                resp = requests.post(
-                    TTS_URL,
-                    headers={
-                        "Accept": "audio/mpeg",
-                        "Content-Type": "application/json",
-                        "xi-api-key": ELEVENLABS_KEY
-                    },
-                    json={
-                        "text": text,
-                        "voice_settings": {"stability": 0, "similarity_boost": 1}
-                    },
-                    timeout=10
-                )
-                if resp.status_code == 200:
-                    with open("/tmp/insult.mp3", "wb") as f:
-                        f.write(resp.content)
-                    subprocess.run(["afplay", "/tmp/insult.mp3"], capture_output=True, timeout=5)
-        except:
-            pass
-    
-    threading.Thread(target=_speak, daemon=True).start()
+flappy_speech.start(ELEVENLABS_KEY, [p for pool in SITUATIONAL_INSULTS.values() for p in pool])
 
 def get_situation_insult(situation):
     pool = SITUATIONAL_INSULTS.get(situation, SITUATIONAL_INSULTS["close_call"])
@@ -200,16 +172,17 @@ while running:
             
             if current_time - last_comment_time > 0.8:
                 last_comment_time = current_time
+                # Chatter reuses the milestone lines under its own keys: priority 0, never merged with the milestone
                 if flap_count >= 3:
-                    speak(get_situation_insult("multi_flap"))
+                    speak(get_situation_insult("multi_flap"), "multi_flap")
                 elif score >= 20:
-                    speak(get_situation_insult("score_20"))
+                    speak(get_situation_insult("score_20"), "flap_score_20")
                 elif score >= 10:
-                    speak(get_situation_insult("score_10"))
+                    speak(get_situation_insult("score_10"), "flap_score_10")
                 elif score >= 5:
-                    speak(get_situation_insult("score_5"))
+                    speak(get_situation_insult("score_5"), "flap_score_5")
                 else:
-                    speak(get_situation_insult("flap_streak"))
+                    speak(get_situation_insult("flap_streak"), "flap_streak")
             
             flap_count = 0
             last_flap_time = current_time
@@ -236,31 +209,31 @@ while running:
             if bird_right > pipe_hitbox_left and bird_left < pipe_hitbox_right:
                 if bird_top < pipe[1] or bird_bottom > pipe[1] + pipe_gap:
                     game_over = True
-                    speak(get_situation_insult("pipe_hit"))
+                    speak(get_situation_insult("pipe_hit"), "pipe_hit")
             
             if pipe[0] + pipe_width < bird_x <= pipe[0] + pipe_width + pipe_speed:
                 score += 1
                 if score == 5:
-                    speak(get_situation_insult("score_5"))
+                    speak(get_situation_insult("score_5"), "score_5")
                 elif score == 10:
-                    speak(get_situation_insult("score_10"))
+                    speak(get_situation_insult("score_10"), "score_10")
                 elif score == 20:
-                    speak(get_situation_insult("score_20"))
+                    speak(get_situation_insult("score_20"), "score_20")
         
         pipes = [p for p in pipes if p[0] + pipe_width > 0]
         
         if bird_y > HEIGHT - 20:
             game_over = True
-            speak(get_situation_insult("ground_hit"))
+            speak(get_situation_insult("ground_hit"), "ground_hit")
         
         if bird_y < 0:
             game_over = True
-            speak(get_situation_insult("ceiling_hit"))
+            speak(get_situation_insult("ceiling_hit"), "ceiling_hit")
         
         if game_over:
             if score > high_score:
                 high_score = score
-                speak(get_situation_insult("high_score"))
+                speak(get_situation_insult("high_score"), "high_score")
             time.sleep(0.3)
             reset_game()
         
@@ -291,4 +264,5 @@ while running:
     pygame.display.flip()
     clock.tick(60)
 
+speech_report()
 pygame.quit()
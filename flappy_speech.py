@@ -0,0 +1,220 @@
+# Speech for flappy_mlx.py: an on-disk cache of spoken lines and a one-worker priority scheduler.
+# Importing this has no side effects; flappy_mlx.py calls start() once the game is set up.
+import os
+import json
+import time
+import heapq
+import hashlib
+import threading
+import subprocess
+import requests
+
+ELEVENLABS_KEY = os.environ.get("ELEVENLABS_API_KEY", "")
+TTS_URL = os.environ.get("TTS_URL", "https://api.elevenlabs.io/v1/text-to-speech/EXAVITQu4vr4xnSDxMaL")
+VOICE_SETTINGS = {"stability": 0, "similarity_boost": 1}
+
+# Spoken lines cached on disk by text + voice, so commentary plays instantly (and offline) after the first fetch
+AUDIO_CACHE_DIR = os.path.expanduser(os.environ.get("FLAPPY_AUDIO_CACHE", "~/.cache/flappy_mlx"))
+AUDIO_CACHE_MAX_BYTES = int(float(os.environ.get("FLAPPY_AUDIO_CACHE_MB", "50")) * 1024 * 1024)
+
+# Speech scheduler: one worker, highest priority first; stale lines are dropped, not played late
+SPEECH_PRIORITY = {"high_score": 3, "pipe_hit": 2, "ground_hit": 2, "ceiling_hit": 2,
+                   "score_5": 1, "score_10": 1, "score_20": 1}  # anything else (flap_*, multi_flap) is chatter (0)
+SPEECH_DEADLINE = {0: 0.8, 1: 2.0, 2: 3.0, 3: 4.0}  # seconds a line may wait before it is stale
+SPEECH_QUEUE_MAX = 4
+
+speech_cond = threading.Condition()
+speech_queue = []  # heap of (-priority, seq, queued_at, situation, text)
+speech_seq = 0
+speech_playing = None  # (priority, Popen) of the line being played
+speech_stats = {"queued": 0, "played": 0, "stale": 0, "coalesced": 0, "full": 0, "preempted": 0,
+                "failed": 0, "max_depth": 0, "late_ms": []}
+audio_cache_evictions = 0
+
+def audio_cache_path(text):
+    # The URL carries the voice id; any change to text, voice or settings is a different file
+    key = json.dumps({"url": TTS_URL, "text": text, "voice_settings": VOICE_SETTINGS}, sort_keys=True)
+    return os.path.join(AUDIO_CACHE_DIR, hashlib.sha256(key.encode()).hexdigest() + ".mp3")
+
+def audio_cache_entries():
+    entries = []
+    for name in os.listdir(AUDIO_CACHE_DIR):
+        if name.endswith(".mp3"):
+            st = os.stat(os.path.join(AUDIO_CACHE_DIR, name))
+            entries.append((st.st_mtime, st.st_size, name))
+    return entries
+
+def evict_audio_cache():
+    # LRU by mtime (touched on every hit): drop the least recently played files until under the limit
+    evicted = 0
+    try:
+        entries = audio_cache_entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= AUDIO_CACHE_MAX_BYTES:
+                break
+            os.remove(os.path.join(AUDIO_CACHE_DIR, name))
+            total -= size
+            evicted += 1
+    except OSError:
+        pass
+    return evicted
+
+def fetch_audio(text):
+    global audio_cache_evictions
+    path = audio_cache_path(text)
+    if os.path.exists(path):
+        try:
+            os.utime(path)
+            return path
+        except OSError:
+            pass
+    resp = requests.post(
+        TTS_URL,
+        headers={
+            "Accept": "audio/mpeg",
+            "Content-Type": "application/json",
+            "xi-api-key": ELEVENLABS_KEY
+        },
+        json={
+            "text": text,
+            "voice_settings": VOICE_SETTINGS
+        },
+        timeout=10
+    )
+    if resp.status_code != 200 or not resp.content:
+        return None
+    os.makedirs(AUDIO_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(resp.content)
+    os.replace(tmp, path)
+    audio_cache_evictions += evict_audio_cache()
+    return path
+
+def prefetch_phrases(phrases):
+    # Every line the game can say is known up front: fetch the misses once, in the background
+    phrases = list(dict.fromkeys(phrases))
+    fetched = 0
+    for phrase in phrases:
+        if audio_cache_evictions:
+            # Cache too small for the whole set: stop rather than evict what was just fetched
+            break
+        if os.path.exists(audio_cache_path(phrase)):
+            continue
+        try:
+            if fetch_audio(phrase):
+                fetched += 1
+        except Exception:
+            pass
+    print(f"Speech cache: {len(phrases)} phrases, {fetched} fetched ({AUDIO_CACHE_DIR})")
+
+def speak(text, situation=None):
+    # Called from the game loop: never blocks on the network or on playback
+    global speech_seq
+    priority = SPEECH_PRIORITY.get(situation, 0)
+    now = time.time()
+    with speech_cond:
+        for i, item in enumerate(speech_queue):
+            if situation is not None and item[3] == situation:
+                # Same event still waiting: say the newest line once instead of both
+                speech_queue[i] = (item[0], item[1], now, situation, text)
+                heapq.heapify(speech_queue)
+                speech_stats["coalesced"] += 1
+                return
+        if priority > 0:
+            # Events preempt flap chatter, queued or playing
+            chatter = [item for item in speech_queue if item[0] == 0]
+            if chatter:
+                speech_queue[:] = [item for item in speech_queue if item[0] != 0]
+                heapq.heapify(speech_queue)
+                speech_stats["preempted"] += len(chatter)
+            if speech_playing and speech_playing[0] == 0 and speech_playing[1].poll() is None:
+                speech_playing[1].kill()
+                speech_stats["preempted"] += 1
+        if len(speech_queue) >= SPEECH_QUEUE_MAX:
+            # Full: the new line replaces the least important, oldest waiting one, or is dropped itself
+            worst = max(speech_queue, key=lambda item: (item[0], -item[1]))
+            if -worst[0] >= priority:
+                speech_stats["full"] += 1
+                return
+            speech_queue.remove(worst)
+            heapq.heapify(speech_queue)
+            speech_stats["full"] += 1
+        speech_seq += 1
+        heapq.heappush(speech_queue, (-priority, speech_seq, now, situation, text))
+        speech_stats["queued"] += 1
+        speech_stats["max_depth"] = max(speech_stats["max_depth"], len(speech_queue))
+        speech_cond.notify()
+
+def start_player(path):
+    return subprocess.Popen(["afplay", path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def play_next():
+    # One line off the queue, played to the end (or until preempted); False if the queue was empty
+    global speech_playing
+    with speech_cond:
+        if not speech_queue:
+            return False
+        neg_priority, _, queued_at, situation, text = heapq.heappop(speech_queue)
+        depth = len(speech_queue)
+    priority = -neg_priority
+    try:
+        path = fetch_audio(text)
+    except Exception:
+        path = None
+    late = time.time() - queued_at
+    if not path:
+        with speech_cond:
+            speech_stats["failed"] += 1
+        return True
+    if late > SPEECH_DEADLINE[priority]:
+        with speech_cond:
+            speech_stats["stale"] += 1
+        print(f"Speech: dropped stale {text!r} ({late * 1000:.0f} ms old)")
+        return True
+    with speech_cond:
+        try:
+            proc = start_player(path)
+        except OSError:
+            speech_stats["failed"] += 1
+            return True
+        speech_playing = (priority, proc)
+        speech_stats["played"] += 1
+        speech_stats["late_ms"].append(late * 1000)
+        del speech_stats["late_ms"][:-200]
+    print(f"Speech: {text!r} {late * 1000:.0f} ms late, {depth} queued")
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+    with speech_cond:
+        speech_playing = None
+    return True
+
+def speech_worker():
+    while True:
+        with speech_cond:
+            while not speech_queue:
+                speech_cond.wait()
+        play_next()
+
+def speech_report():
+    with speech_cond:
+        late = sorted(speech_stats["late_ms"])
+        stats = dict(speech_stats)
+    if late:
+        p50 = late[len(late) // 2]
+        p95 = late[min(len(late) - 1, int(len(late) * 0.95))]
+        lateness = f"late p50 {p50:.0f} ms, p95 {p95:.0f} ms"
+    else:
+        lateness = "nothing played"
+    print(f"Speech: {stats['played']}/{stats['queued']} played, {lateness}; dropped {stats['stale']} stale, "
+          f"{stats['full']} on full queue, {stats['preempted']} preempted, {stats['coalesced']} coalesced, {stats['failed']} failed; "
+          f"max depth {stats['max_depth']}")
+
+def start(api_key, phrases):
+    global ELEVENLABS_KEY
+    ELEVENLABS_KEY = api_key
+    threading.Thread(target=prefetch_phrases, args=(phrases,), daemon=True).start()
+    threading.Thread(target=speech_worker, daemon=True).start()
@@ -29,8 +29,8 @@ if [ ! -p "$TTS_FIFO" ]; then
 fi
 if [ -p "$TTS_FIFO" ]; then
   export TTS_FIFO
-  # Start TTS reader in background: open FIFO, read lines, speak each; reopen on EOF
-  ( while true; do while IFS= read -r line; do [ -n "$line" ] && termux-tts-speak "$line" 2>/dev/null; done < "$TTS_FIFO" 2>/dev/null; done ) &
+  # Start TTS reader in background: speaks each line; "__STOP__" (barge-in) drops queued lines and stops speech
+  python3 "$JARVIS_DIR/scripts/tts-fifo-reader.py" --fifo "$TTS_FIFO" --cmd termux-tts-speak &
   echo "TTS FIFO reader started ($TTS_FIFO)."
 else
   echo "Warning: TTS FIFO not created ($TTS_FIFO). TTS will be disabled."
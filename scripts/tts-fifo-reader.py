@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+TTS FIFO reader for the voice node: speaks each line written to the FIFO, one at a time.
+The barge-in line (tts_barge_in_signal, default __STOP__) drops everything queued and kills the
+utterance being spoken, so an interrupted reply goes quiet immediately.
+
+  python3 scripts/tts-fifo-reader.py                       # ~/.tts_pipe, termux-tts-speak
+  TTS_FIFO=/tmp/tts python3 scripts/tts-fifo-reader.py --cmd "espeak"
+"""
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import threading
+from collections import deque
+
+
+class Speaker:
+    def __init__(self, cmd: list):
+        self.cmd = cmd
+        self.lines = deque()
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.proc = None
+
+    def add(self, line: str) -> None:
+        with self.lock:
+            self.lines.append(line)
+        self.ready.set()
+
+    def stop(self) -> None:
+        with self.lock:
+            self.lines.clear()
+            proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def run(self) -> None:
+        while True:
+            self.ready.wait()
+            with self.lock:
+                if not self.lines:
+                    self.ready.clear()
+                    continue
+                line = self.lines.popleft()
+                try:
+                    self.proc = subprocess.Popen(self.cmd + [line], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                except OSError as e:
+                    print(f"TTS command failed: {e}", file=sys.stderr)
+                    self.proc = None
+                    continue
+                proc = self.proc
+            proc.wait()
+            with self.lock:
+                self.proc = None
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Speak lines from the voice node TTS FIFO")
+    ap.add_argument("--fifo", default=os.environ.get("TTS_FIFO", os.path.expanduser("~/.tts_pipe")))
+    ap.add_argument("--cmd", default="termux-tts-speak", help="TTS command; the line is appended as the last argument")
+    ap.add_argument("--stop", default="__STOP__", help="barge-in line (tts_barge_in_signal)")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.fifo):
+        os.mkfifo(args.fifo)
+    speaker = Speaker(shlex.split(args.cmd))
+    threading.Thread(target=speaker.run, daemon=True).start()
+    try:
+        while True:
+            # Reopen on EOF (the voice node or another writer restarted)
+            with open(args.fifo, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line == args.stop:
+                        speaker.stop()
+                    elif line:
+                        speaker.add(line)
+    except KeyboardInterrupt:
+        speaker.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Text handling between the gateway stream and the TTS FIFO, shared by voice_node.py and voice-node-demo.py.
+Pure Python (no numpy / audio deps). Everything here is incremental: feed() the reply as it streams in.
+"""
+
+from __future__ import annotations
+
+import re
+
+_ABBREVIATIONS = frozenset(
+    "mr mrs ms dr prof sr jr st mt vs etc approx dept est fig inc ltd co corp vol ave blvd rd "
+    "jan feb mar apr jun jul aug sep sept oct nov dec mon tue wed thu fri sat sun".split()
+)
+_CLAUSE_BREAKS = ",;:\u2014\u2013"
+# MarkdownStripper handles these runs in one step instead of per character: text with no markup
+# characters (copied word by word), and the inside of code, link text and link URLs up to their next
+# character of interest
+_TEXT_RUN = re.compile(r"[^`*_\[#>]+")
+_WS_SPLIT = re.compile(r"(\s+)")
+_CODE_RUN = re.compile(r"[^`\n]+")
+_LINK_TEXT_RUN = re.compile(r"[^\]\n]+")
+_LINK_URL_RUN = re.compile(r"[^()\n]+")
+
+
+class SentenceSegmenter:
+    """
+    Streaming sentence splitter for TTS. feed() scans only text it has not seen before (amortized O(1) per
+    character) and returns the sentences completed so far; flush() returns whatever is left.
+    A sentence ends at .!? followed by whitespace, or at a newline; "e.g.", "Dr.", initials and
+    decimals/URLs (no space after the dot) don't end one. With first_clause_words > 0, the first piece of
+    a reply is flushed early at a comma/semicolon/colon/dash once it has that many words, so TTS starts sooner.
+    """
+
+    def __init__(self, first_clause_words: int = 0):
+        self.first_clause_words = first_clause_words
+        self.buf = ""
+        self.pos = 0
+        self.emitted = 0
+
+    @staticmethod
+    def _is_abbreviation(buf: str, start: int, dot: int) -> bool:
+        j = dot
+        while j > start and not buf[j - 1].isspace():
+            j -= 1
+        token = buf[j:dot].lstrip("(\"'").lower()
+        if not token:
+            return False
+        if token in _ABBREVIATIONS:
+            return True
+        if len(token) == 1 and token.isalpha() and token != "i":
+            return True  # initials: "J. R. R. Tolkien"
+        return "." in token and len(token) <= 5  # e.g / i.e / a.m / u.s
+
+    def feed(self, text: str) -> list:
+        buf = self.buf + text
+        out = []
+        start = 0
+        i = self.pos
+        n = len(buf)
+        while i < n:
+            c = buf[i]
+            cut = -1
+            if c == "\n":
+                cut = i + 1
+            elif c in ".!?" or c in _CLAUSE_BREAKS or c == "-":
+                if i + 1 >= n:
+                    break  # need the next character to decide
+                nxt = buf[i + 1]
+                if c in ".!?":
+                    if nxt.isspace() and not (c == "." and self._is_abbreviation(buf, start, i)):
+                        cut = i + 1
+                elif self.emitted == 0 and self.first_clause_words > 0 and nxt.isspace():
+                    is_break = c != "-" or (i > start and buf[i - 1].isspace())
+                    if is_break and len(buf[start:i].split()) >= self.first_clause_words:
+                        cut = i + 1
+            if cut >= 0:
+                piece = buf[start:cut].strip()
+                start = cut
+                if piece:
+                    out.append(piece)
+                    self.emitted += 1
+            i += 1
+        self.buf = buf[start:]
+        self.pos = i - start
+        return out
+
+    def flush(self) -> str:
+        rest = self.buf.strip()
+        self.buf = ""
+        self.pos = 0
+        if rest:
+            self.emitted += 1
+        return rest
+
+
+class MarkdownStripper:
+    """
+    Single-pass, streaming markdown-to-speech filter. feed() takes reply deltas and returns the plain text
+    that is safe to speak so far; constructs still open at a chunk boundary (a ``` fence, `inline code`,
+    [link text](url), a backtick run or "_" that needs the next character) are held until they resolve.
+    Code (fenced and inline) is dropped, links keep their text, * and word-boundary _ are removed, leading
+    # / > on a line are removed, and whitespace is collapsed (a run containing a newline becomes one newline).
+    """
+
+    TEXT, FENCE, CODE, LINK_TEXT, LINK_URL = range(5)
+    MAX_LINK_TEXT = 200
+
+    def __init__(self):
+        self.state = self.TEXT
+        self.tail = ""
+        self.ticks = 0
+        self.link = []
+        self.line_start = True
+        self.prev = " "
+        self.pending_ws = ""
+        self.emitted = False
+
+    def _ws(self, c: str) -> None:
+        self.prev = " "
+        if c == "\n" or self.pending_ws == "\n":
+            self.pending_ws = "\n"
+        else:
+            self.pending_ws = " "
+
+    def _put(self, out: list, c: str) -> None:
+        if c.isspace():
+            self._ws(c)
+            return
+        if self.pending_ws and self.emitted:
+            out.append(self.pending_ws)
+        self.pending_ws = ""
+        out.append(c)
+        self.prev = c
+        self.emitted = True
+
+    def _text_run(self, out: list, run: str, lines: bool = True) -> None:
+        """_put for each character of a markup-free run, a word at a time (words at even split indexes)."""
+        if not run:
+            return
+        if "\n" not in run:
+            # One line: every gap is a single space
+            words = run.split()
+            if run[0].isspace() and self.pending_ws != "\n":
+                self.pending_ws = " "
+            if words:
+                if self.pending_ws and self.emitted:
+                    out.append(self.pending_ws)
+                out.append(" ".join(words))
+                self.emitted = True
+                if lines:
+                    self.line_start = False
+                self.pending_ws = ""
+                self.prev = words[-1][-1]
+            if run[-1].isspace():
+                self.pending_ws = self.pending_ws or " "
+                self.prev = " "
+            return
+        for k, part in enumerate(_WS_SPLIT.split(run)):
+            if not part:
+                continue
+            if k % 2:
+                if "\n" in part:
+                    if lines:
+                        self.line_start = True
+                    self.pending_ws = "\n"
+                elif self.pending_ws != "\n":
+                    self.pending_ws = " "
+                self.prev = " "
+                continue
+            if self.pending_ws and self.emitted:
+                out.append(self.pending_ws)
+            self.pending_ws = ""
+            out.append(part)
+            self.prev = part[-1]
+            self.emitted = True
+            if lines:
+                self.line_start = False
+
+    def _end_link(self, out: list) -> None:
+        self._text_run(out, "".join(self.link).replace("*", ""), lines=False)
+        self.link = []
+
+    def _run(self, text: str, final: bool) -> str:
+        out = []
+        i = 0
+        n = len(text)
+        while i < n:
+            c = text[i]
+            state = self.state
+            if c == "`" and state in (self.TEXT, self.FENCE, self.CODE):
+                k = i
+                while k < n and text[k] == "`":
+                    k += 1
+                if k == n and not final:
+                    break  # the run may continue in the next delta
+                run = k - i
+                i = k
+                if state == self.TEXT:
+                    self.state, self.ticks = (self.FENCE, 3) if run >= 3 else (self.CODE, run)
+                    self._ws(" ")
+                elif (state == self.FENCE and run >= 3) or (state == self.CODE and run == self.ticks):
+                    self.state = self.TEXT
+                    self._ws(" ")
+                continue
+            if state == self.FENCE:
+                j = text.find("`", i)
+                i = n if j < 0 else j
+                continue
+            if state == self.CODE:
+                if c == "\n":  # unterminated inline code ends with the line
+                    self.state = self.TEXT
+                    self._ws(c)
+                    i += 1
+                else:
+                    i = _CODE_RUN.match(text, i).end()
+                continue
+            if state == self.LINK_TEXT:
+                if c == "]":
+                    if i + 1 >= n and not final:
+                        break
+                    self.state = self.LINK_URL if i + 1 < n and text[i + 1] == "(" else self.TEXT
+                    self.ticks = 0
+                    self._end_link(out)
+                    i += 2 if self.state == self.LINK_URL else 1
+                elif c == "\n" or len(self.link) >= self.MAX_LINK_TEXT:
+                    self.state = self.TEXT
+                    self._end_link(out)
+                else:
+                    j = min(_LINK_TEXT_RUN.match(text, i).end(), i + self.MAX_LINK_TEXT - len(self.link))
+                    self.link.extend(text[i:j])
+                    i = j
+                continue
+            if state == self.LINK_URL:
+                if c == "(":
+                    self.ticks += 1  # nested parens in the URL; ticks is free outside code
+                elif c == ")" and self.ticks:
+                    self.ticks -= 1
+                elif c == ")" or c == "\n":
+                    self.state = self.TEXT
+                    if c == "\n":
+                        continue
+                else:
+                    i = _LINK_URL_RUN.match(text, i).end()
+                    continue
+                i += 1
+                continue
+            # TEXT
+            m = _TEXT_RUN.match(text, i)
+            if m is not None:
+                self._text_run(out, m.group())
+                i = m.end()
+                continue
+            if c == "*":
+                pass
+            elif c == "_":
+                if i + 1 >= n and not final:
+                    break
+                nxt = text[i + 1] if i + 1 < n else " "
+                if self.prev.isalnum() and nxt.isalnum():
+                    self._put(out, c)  # snake_case stays
+            elif c == "[":
+                self.state = self.LINK_TEXT
+                self.link = []
+            elif (c == "#" or c == ">") and self.line_start:
+                pass
+            else:
+                if c == "\n":
+                    self.line_start = True
+                elif not c.isspace():
+                    self.line_start = False
+                self._put(out, c)
+            i += 1
+        self.tail = text[i:]
+        return "".join(out)
+
+    def feed(self, delta: str) -> str:
+        if self.tail:
+            return self._run(self.tail + delta, final=False)
+        if self.state == self.TEXT and delta:
+            m = _TEXT_RUN.match(delta)
+            if m is not None and m.end() == len(delta):
+                # Most deltas are a word or two of plain prose: skip the state machine
+                out = []
+                self._text_run(out, delta)
+                return "".join(out)
+        return self._run(delta, final=False)
+
+    def flush(self) -> str:
+        out = self._run(self.tail, final=True)
+        if self.state == self.LINK_TEXT:
+            rest = []
+            self._end_link(rest)
+            out += "".join(rest)
+        self.__init__()
+        return out
+
+
+def strip_for_tts(text: str) -> str:
+    if not text:
+        return ""
+    s = MarkdownStripper()
+    plain = s.feed(text) + s.flush()
+    return " ".join(plain.split())[:3000]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Wake arbiter for several voice nodes in one space: every node that hears "Hey JARVIS" claims the turn
+over UDP; when --window closes, the best-placed claim (mid-reply first, then SNR + wake score) wins
+and the others stay quiet, so one utterance makes one STT run and one gateway request.
+
+  python3 scripts/voice-node-arbiter.py                   # 0.0.0.0:18790, 250 ms window
+  python3 scripts/voice-node-arbiter.py --port 18790 --window 0.3
+  # each node: wake_arbiter: "192.168.86.20:18790" in ~/.jarvis/voice_node.yaml
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import socket
+import sys
+import time
+from collections import OrderedDict
+
+
+class Arbiter:
+    def __init__(self, window: float, holdoff: float, score_weight: float):
+        self.window = window
+        self.holdoff = holdoff
+        self.score_weight = score_weight
+        self.round = None  # {"opened": t, "claims": [(claim, addr)]}
+        self.rounds = 0
+        self.last_winner = None
+        self.closed_at = float("-inf")
+        self.verdicts = OrderedDict()  # claim id → verdict, so a re-sent claim gets the same answer
+
+    def rank(self, claim: dict) -> tuple:
+        snr = claim.get("snr")
+        score = claim.get("score")
+        merit = (snr if isinstance(snr, (int, float)) else 0.0) + self.score_weight * (
+            score if isinstance(score, (int, float)) else 0.0
+        )
+        return (bool(claim.get("replying")), merit)
+
+    def _verdict(self, claim_id: str, win: bool, winner: str) -> dict:
+        verdict = {"id": claim_id, "win": win, "winner": winner, "round": self.rounds}
+        self.verdicts[claim_id] = verdict
+        while len(self.verdicts) > 256:
+            self.verdicts.popitem(last=False)
+        return verdict
+
+    def claim(self, claim: dict, addr, now: float) -> list:
+        """Take one claim; returns (addr, verdict) pairs to send now."""
+        claim_id = claim.get("id")
+        if not claim_id:
+            return []
+        if claim_id in self.verdicts:
+            return [(addr, self.verdicts[claim_id])]
+        if self.round is not None:
+            if all(c["id"] != claim_id for c, _ in self.round["claims"]):
+                self.round["claims"].append((claim, addr))
+            return []
+        if now - self.closed_at < self.holdoff:
+            # Late for the last round: same wake word, heard slowly; only that round's winner may go on
+            win = claim.get("node") == self.last_winner
+            print(f"  late claim from {claim.get('node')}: {'wins (same node)' if win else 'loses'}", flush=True)
+            return [(addr, self._verdict(claim_id, win, self.last_winner))]
+        self.round = {"opened": now, "claims": [(claim, addr)]}
+        return []
+
+    def deadline(self) -> float | None:
+        return None if self.round is None else self.round["opened"] + self.window
+
+    def close(self, now: float) -> list:
+        """Decide the open round if its window has passed; returns (addr, verdict) pairs."""
+        if self.round is None or now < self.deadline():
+            return []
+        claims = sorted(self.round["claims"], key=lambda ca: self.rank(ca[0]), reverse=True)
+        self.round = None
+        self.rounds += 1
+        self.closed_at = now
+        winner = claims[0][0].get("node")
+        self.last_winner = winner
+        out = [(addr, self._verdict(c["id"], i == 0, winner)) for i, (c, addr) in enumerate(claims)]
+        heard = ", ".join(
+            f"{c.get('node')} (snr {c.get('snr') if c.get('snr') is None else round(c['snr'], 1)}, "
+            f"score {c.get('score') if c.get('score') is None else round(c['score'], 2)}"
+            f"{', replying' if c.get('replying') else ''})"
+            for c, _ in claims
+        )
+        print(f"round {self.rounds}: {winner} answers; heard by {heard}", flush=True)
+        return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Pick one voice node to answer each wake word")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=18790)
+    ap.add_argument("--window", type=float, default=0.25, help="seconds to collect claims after the first one")
+    ap.add_argument("--holdoff", type=float, default=2.0, help="seconds after a round in which late claims lose")
+    ap.add_argument("--score-weight", type=float, default=10.0, help="dB of SNR one unit of wake score is worth")
+    args = ap.parse_args()
+
+    arbiter = Arbiter(args.window, args.holdoff, args.score_weight)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((args.host, args.port))
+    print(f"Wake arbiter on {args.host}:{args.port} (window {args.window * 1000:.0f} ms)", flush=True)
+    try:
+        while True:
+            deadline = arbiter.deadline()
+            sock.settimeout(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            out = []
+            try:
+                data, addr = sock.recvfrom(4096)
+                claim = json.loads(data)
+                if isinstance(claim, dict):
+                    out = arbiter.claim(claim, addr, time.monotonic())
+            except socket.timeout:
+                pass
+            except (OSError, ValueError) as e:
+                print(f"Bad claim: {e}", file=sys.stderr)
+            out += arbiter.close(time.monotonic())
+            for addr, verdict in out:
+                try:
+                    sock.sendto(json.dumps(verdict).encode(), addr)
+                except OSError as e:
+                    print(f"Reply to {addr}: {e}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
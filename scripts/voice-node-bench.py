@@ -0,0 +1,840 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for scripts/voice_node.py hot paths. No microphone or gateway needed.
+
+  # STT input handoff: temp WAV round trip vs in-memory (handoff cost only)
+  python3 scripts/voice-node-bench.py stt-input --seconds 5 --runs 50
+  # Same, through the STT backend configured in ~/.jarvis/voice_node.yaml
+  python3 scripts/voice-node-bench.py stt-input --real --runs 5
+  # Markdown stripping on long streamed replies: old regex chain vs streaming stripper
+  python3 scripts/voice-node-bench.py strip --chars 20000
+  python3 scripts/voice-node-bench.py strip --chars 20000 --delta 64   # batched deltas
+  # Wake frame handoff: per-chunk frames via tolist() (remainder dropped) vs carry-over aligner
+  python3 scripts/voice-node-bench.py wake-frames --seconds 60
+  # Same, plus CPU per second of audio through the configured wake model, one chunk vs batched
+  python3 scripts/voice-node-bench.py wake-frames --real
+  # Wake gate under a step in steady background noise (fan, TV hum): it must close again, yet open for speech
+  python3 scripts/voice-node-bench.py wake-gate --noise-rms 0.02 --seconds 60
+  # Capture conversion: device rate/channels → 16 kHz mono, polyphase vs linear interpolation
+  python3 scripts/voice-node-bench.py resample --rate 48000 --channels 2
+  # Speech barge-in gate: JARVIS's own echo must never interrupt a reply; the user talking over it must
+  python3 scripts/voice-node-bench.py barge-in --echo-rms 0.046 --user-rms 0.15
+  # Multi-node wake arbitration: N simulated nodes hear each wake word with jittered detection times
+  python3 scripts/voice-node-bench.py arbiter --nodes 4 --wakes 50
+  # Gateway hedging: a primary with a slow tail (or down) plus a steady fallback, hedge on vs off
+  python3 scripts/voice-node-bench.py hedge --slow-ratio 0.2 --hedge 1.0
+  # Replay recorded utterances through the full pipeline (wake → VAD → STT → gateway → TTS FIFO),
+  # with a stub STT and an in-process stub gateway; --speed 0 = as fast as possible
+  python3 scripts/voice-node-bench.py replay recordings/*.wav --speed 1
+  # Same, streaming STT with speculative gateway requests (hit rate, wasted requests, first token saved)
+  python3 scripts/voice-node-bench.py replay recordings/*.wav --speed 1 --speculate
+  # Same, with the configured STT backend and gateway
+  python3 scripts/voice-node-bench.py replay recordings/*.wav --real-stt --gateway http://127.0.0.1:18789
+
+Set TMPDIR to put temp files on the storage you want to measure (e.g. Termux $PREFIX/tmp).
+"""
+
+import argparse
+import contextlib
+import ctypes
+import http.server
+import io
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import voice_node  # noqa: E402
+
+
+def summarize(name: str, samples_ms: list) -> None:
+    s = sorted(samples_ms)
+    p95 = s[min(len(s) - 1, int(round(0.95 * (len(s) - 1))))]
+    print(f"  {name:<10} median {statistics.median(s):8.2f} ms   p95 {p95:8.2f} ms   min {s[0]:8.2f} ms   (n={len(s)})")
+
+
+def test_audio(seconds: float, sample_rate: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(int(seconds * sample_rate)) * 3000).astype(np.int16)
+
+
+def file_handoff(audio: np.ndarray, sr: int) -> None:
+    """What main() used to do per turn: write WAV, STT reads it, STT writes .txt, we read and unlink both."""
+    path = voice_node.write_temp_wav(audio, sr)
+    with open(path, "rb") as f:
+        f.read()
+    with open(path + ".txt", "w") as f:
+        f.write("what time is it\n")
+    with open(path + ".txt", "r") as f:
+        f.read()
+    os.unlink(path + ".txt")
+    os.unlink(path)
+
+
+def memory_handoff(audio: np.ndarray, sr: int) -> None:
+    voice_node.wav_bytes(audio, sr)
+
+
+def bench_stt_input(args) -> int:
+    sr = 16000
+    audio = test_audio(args.seconds, sr)
+    print(f"STT input handoff: {args.seconds:.1f}s of audio, tmp dir {tempfile.gettempdir()}")
+    if not args.real:
+        for name, fn in (("file", file_handoff), ("memory", memory_handoff)):
+            times = []
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                fn(audio, sr)
+                times.append((time.perf_counter() - t0) * 1000)
+            summarize(name, times)
+        return 0
+    for mode in ("file", "memory"):
+        config = voice_node.load_config()
+        config["stt_input"] = mode
+        stt = voice_node.STTWorker(config)
+        if stt.backend is None:
+            print("No STT configured (whisper_server_cmd, whisper_cmd or whisper_python).", file=sys.stderr)
+            return 1
+        stt.transcribe(audio[:sr], sr)  # warm up / load model
+        times = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            if mode == "file":
+                path = voice_node.write_temp_wav(audio, sr)
+                try:
+                    stt.transcribe(path)
+                finally:
+                    os.unlink(path)
+            else:
+                stt.transcribe(audio, sr)
+            times.append((time.perf_counter() - t0) * 1000)
+        stt.close()
+        summarize(mode, times)
+    return 0
+
+
+def strip_for_tts_regex(text: str) -> str:
+    """strip_for_tts before the streaming stripper (seven re.sub passes), kept as the baseline."""
+    if not text:
+        return ""
+    text = re.sub(r"```[\s\S]*?```", " ", text)
+    text = re.sub(r"`[^`]+`", " ", text)
+    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)
+    text = re.sub(r"\*\*([^*]+)\*\*", r"\1", text)
+    text = re.sub(r"\*([^*]+)\*", r"\1", text)
+    text = re.sub(r"\n+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    return text[:3000]
+
+
+CODE_MARKER = "zzcodezz"
+
+
+def markdown_reply(chars: int) -> str:
+    """A long LLM-style reply: prose with emphasis, links, inline code and multi-sentence code fences."""
+    parts = []
+    i = 0
+    while sum(len(p) for p in parts) < chars:
+        parts.append(f"Step {i} is **important**, see [the docs](https://example.com/p/{i}) and run `make {i}`. ")
+        if i % 5 == 4:
+            parts.append(f"Example:\n```python\nprint('{CODE_MARKER}. done.')\nx = {i}. y = 2\n```\nThat's *it*. ")
+        i += 1
+    return "".join(parts)
+
+
+def tokens(text: str, size: int = 4) -> list:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def speak_regex(deltas: list) -> list:
+    """Old stream_and_speak path: re-join + regex split per token, strip each sentence on its own."""
+    sentence_end = re.compile(r"[.!?]\s*")
+    buf, out = [], []
+    for d in deltas:
+        buf.append(d)
+        parts = sentence_end.split("".join(buf))
+        if len(parts) > 1:
+            out.extend(strip_for_tts_regex(p.strip()) for p in parts[:-1])
+            buf = [parts[-1]]
+    out.append(strip_for_tts_regex("".join(buf).strip()))
+    return [s for s in out if s]
+
+
+def speak_streaming(deltas: list) -> list:
+    stripper = voice_node.MarkdownStripper()
+    segmenter = voice_node.SentenceSegmenter(4)
+    out = []
+    for d in deltas:
+        out.extend(segmenter.feed(stripper.feed(d)))
+    out.extend(segmenter.feed(stripper.flush()))
+    out.append(segmenter.flush())
+    return [s for s in out if s]
+
+
+def bench_strip(args) -> int:
+    reply = markdown_reply(args.chars)
+    deltas = tokens(reply, args.delta)
+    print(f"Markdown stripping: {len(reply)} chars in {len(deltas)} streamed deltas of {args.delta}")
+    for name, fn in (("regex", speak_regex), ("streaming", speak_streaming)):
+        times = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            sentences = fn(deltas)
+            times.append((time.perf_counter() - t0) * 1000)
+        summarize(name, times)
+        leaked = sum(s.count(CODE_MARKER) for s in sentences)
+        print(f"  {'':<10} {len(sentences)} sentences, code read aloud {leaked} times")
+    return 0
+
+
+def frames_tolist(chunks: list, frame_length: int) -> int:
+    """check_wake's Porcupine path before the aligner: list + ctypes array per frame, remainder dropped."""
+    used = 0
+    for chunk in chunks:
+        for i in range(0, len(chunk) - frame_length + 1, frame_length):
+            pcm = chunk[i : i + frame_length].tolist()
+            (ctypes.c_short * len(pcm))(*pcm)
+            used += frame_length
+    return used
+
+
+def frames_aligned(chunks: list, frame_length: int) -> int:
+    aligner = voice_node.WakeFrameAligner(frame_length)
+    used = 0
+    for chunk in chunks:
+        for frame in aligner.feed(chunk):
+            frame.ctypes.data_as(ctypes.POINTER(ctypes.c_short))
+            used += frame_length
+    return used
+
+
+def bench_wake_frames(args) -> int:
+    config = voice_node.load_config()
+    sr, chunk = config["sample_rate"], config["chunk_samples"]
+    audio = test_audio(args.seconds, sr)
+    chunks = [audio[i : i + chunk] for i in range(0, len(audio) - chunk + 1, chunk)]
+    fed = len(chunks) * chunk
+    print(f"Wake frame handoff: {args.seconds:.0f}s of audio, {chunk}-sample chunks, {args.frame}-sample frames")
+    for name, fn in (("tolist", frames_tolist), ("aligned", frames_aligned)):
+        times = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            used = fn(chunks, args.frame)
+            times.append((time.perf_counter() - t0) * 1000 / args.seconds)
+        summarize(name, times)
+        print(f"  {'':<10} per second of audio; {100 * (fed - used) / fed:.1f}% of samples never reach the engine")
+    if not args.real:
+        return 0
+    model = voice_node.create_wake_model(config)
+    if model is None:
+        print("No wake model configured.", file=sys.stderr)
+        return 1
+    batch = max(1, int(config.get("wake_batch_max_chunks", 4)))
+    print(f"{type(model).__name__}: CPU per second of audio")
+    for name, n in (("1 chunk", 1), (f"{batch} chunks", batch)):
+        aligner = voice_node.wake_frame_aligner(model)
+        t0, c0 = time.perf_counter(), time.process_time()
+        for i in range(0, len(chunks), n):
+            voice_node.check_wake(np.concatenate(chunks[i : i + n]), model, config, aligner)
+        wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+        print(f"  {name:<10} cpu {1000 * cpu / args.seconds:8.2f} ms   wall {1000 * wall / args.seconds:8.2f} ms")
+    return 0
+
+
+def bench_wake_gate(args) -> int:
+    config = dict(voice_node.load_config())
+    sr, chunk = config["sample_rate"], config["chunk_samples"]
+    rng = np.random.default_rng(0)
+    quiet = 10.0
+    total = quiet + args.seconds
+    n = int(total * sr)
+    mic = rng.standard_normal(n) * 0.001
+    # Fan-like noise: stationary, low-passed, switched on after the quiet stretch
+    fan = np.convolve(rng.standard_normal(n), np.ones(8) / 8, mode="same")
+    mic[int(quiet * sr) :] += (fan / np.sqrt(np.mean(fan * fan)) * args.noise_rms)[int(quiet * sr) :]
+    burst_at = quiet + args.seconds * 0.75
+    burst = barge_in_audio(1.0, sr, args.speech_rms, rng, True)
+    mic[int(burst_at * sr) : int(burst_at * sr) + len(burst)] += burst / 32768
+    mic = np.clip(mic * 32768, -32768, 32767).astype(np.int16)
+    hold = float(config.get("wake_gate_hold_seconds", 1.5))
+    print(
+        f"Wake gate: {quiet:.0f}s quiet, then {args.seconds:.0f}s of steady noise at {args.noise_rms} RMS; "
+        f"1s of speech at {args.speech_rms} RMS at {burst_at:.0f}s"
+    )
+    failed = False
+    for mode in ("energy", "flux"):
+        gate = voice_node.WakeGate(mode, config)
+        opened = []
+        for i in range(0, len(mic) - chunk + 1, chunk):
+            opened.append((i / sr, gate.check(mic[i : i + chunk])))
+        closed_at = next((t for t, o in opened if t > quiet and not o), None)
+        steady = [o for t, o in opened if t >= quiet + args.seconds / 2 and not burst_at - 0.1 <= t < burst_at + 1 + hold]
+        heard = any(o for t, o in opened if burst_at <= t < burst_at + 1)
+        duty = 100 * sum(steady) / max(1, len(steady))
+        failed |= duty > 5 or not heard
+        print(
+            f"  {mode:<10} closes {('%.1fs' % (closed_at - quiet)) if closed_at else 'never'} after the noise starts; "
+            f"open {duty:.0f}% of the steady second half; speech {'opens it' if heard else 'MISSED'}"
+        )
+    return 1 if failed else 0
+
+
+def tone(freq: float, rate: int, seconds: float, channels: int) -> np.ndarray:
+    t = np.arange(int(rate * seconds)) / rate
+    x = (np.sin(2 * np.pi * freq * t) * 10000).astype(np.int16)
+    return np.repeat(x[:, None], channels, axis=1)
+
+
+def level_db(x: np.ndarray) -> float:
+    x = x.astype(np.float32)[len(x) // 4 :]  # skip the filter warm-up
+    return 20 * np.log10(np.sqrt(2 * np.mean(x * x)) / 10000 + 1e-9)
+
+
+def fmt_db(db: float) -> str:
+    # A 10000-amplitude tone rounds to silence in int16 below about -86 dB
+    return "< -86 dB" if db < -86 else f"{db:.0f} dB"
+
+
+def resample_linear(rate: int, sr: int):
+    """Baseline: per-chunk linear interpolation (no anti-alias filter), like a naive capture shim."""
+    pos = [0.0]
+
+    def process(x: np.ndarray) -> np.ndarray:
+        x = x.mean(axis=1, dtype=np.float32) if x.ndim == 2 else x.astype(np.float32)
+        step = rate / sr
+        at = np.arange(pos[0], len(x) - 1, step)
+        pos[0] = at[-1] + step - len(x) if len(at) else pos[0] - len(x)
+        return np.interp(at, np.arange(len(x)), x).astype(np.int16)
+
+    return process
+
+
+def bench_resample(args) -> int:
+    config = voice_node.load_config()
+    sr, chunk = config["sample_rate"], config["chunk_samples"]
+    block = round(chunk * args.rate / sr)
+    audio = test_audio(args.seconds * args.channels, args.rate).reshape(-1, args.channels)
+    print(f"Capture conversion: {args.rate} Hz x{args.channels} → {sr} Hz mono, {block}-frame callbacks")
+    # Tones between the output and input Nyquist, off round fractions of the rate (fs/4 cancels by construction)
+    alias_probes = [round(sr / 2 + (args.rate - sr) / 2 * f) + 37 for f in (0.03, 0.1, 0.3, 0.55, 0.8, 0.95)]
+    for name in ("polyphase", "linear"):
+        times = []
+        for _ in range(args.runs):
+            fn = voice_node.PolyphaseResampler(args.rate, sr).process if name == "polyphase" else resample_linear(args.rate, sr)
+            t0 = time.perf_counter()
+            for i in range(0, len(audio) - block + 1, block):
+                fn(audio[i : i + block])
+            times.append((time.perf_counter() - t0) * 1000 / args.seconds)
+        summarize(name, times)
+        levels = {}
+        for hz in [1000, 6000] + alias_probes:
+            fn = voice_node.PolyphaseResampler(args.rate, sr).process if name == "polyphase" else resample_linear(args.rate, sr)
+            x = tone(hz, args.rate, 1.0, args.channels)
+            levels[hz] = level_db(np.concatenate([fn(x[i : i + block]) for i in range(0, len(x) - block + 1, block)]))
+        worst = max(alias_probes, key=levels.get)
+        print(
+            f"  {'':<10} per second of audio; passband 1 kHz {levels[1000]:+.1f} dB, 6 kHz {levels[6000]:+.1f} dB; "
+            f"above Nyquist worst alias {fmt_db(levels[worst])} ({worst / 1000:.1f} kHz)"
+        )
+        print(f"  {'':<10} " + ", ".join(f"{hz / 1000:.1f} kHz {fmt_db(levels[hz])}" for hz in alias_probes))
+    return 0
+
+
+def barge_in_audio(seconds: float, sr: int, level: float, rng, syllables: bool) -> np.ndarray:
+    """Noise at `level` RMS (0..1 full scale); with syllables, a 4 Hz on/off envelope like running speech."""
+    x = rng.standard_normal(int(seconds * sr))
+    if syllables:
+        t = np.arange(len(x)) / sr
+        x *= np.clip(np.sin(2 * np.pi * 4 * t) * 1.5, 0.05, 1.0)
+        x /= np.sqrt(np.mean(x * x))
+    return x * level * 32768
+
+
+def bench_barge_in(args) -> int:
+    config = dict(voice_node.load_config())
+    sr, chunk = config["sample_rate"], config["chunk_samples"]
+    step = chunk / sr
+    print(
+        f"Speech barge-in gate: room {args.room_rms}, echo {args.echo_rms} (starts {args.tts_latency}s into playback), "
+        f"user {args.user_rms}; {args.seconds:.0f}s of playback after 1s fetching"
+    )
+    scenarios = [
+        ("steady echo", args.echo_rms, False, None),
+        ("speech echo", args.echo_rms, True, None),
+        ("user over echo", args.echo_rms, True, args.seconds / 2),
+        ("user, no echo", 0.0, False, args.seconds / 2),
+        ("user at fetch", args.echo_rms, True, 0.5),
+    ]
+    failed = False
+    for name, echo_rms, syllables, user_at in scenarios:
+        rng = np.random.default_rng(0)
+        total = 1.0 + args.seconds
+        mic = barge_in_audio(total, sr, args.room_rms, rng, False)
+        start = int((1.0 + args.tts_latency) * sr)
+        mic[start:] += barge_in_audio(total, sr, echo_rms, rng, syllables)[: len(mic) - start]
+        if user_at is not None:
+            at = int(user_at * sr)
+            mic[at:] += barge_in_audio(total, sr, args.user_rms, rng, True)[: len(mic) - at]
+        mic = np.clip(mic, -32768, 32767).astype(np.int16)
+        gate = voice_node.BargeInGate(config)
+        fired = None
+        for i in range(0, len(mic) - chunk + 1, chunk):
+            if i / sr >= 1.0:
+                gate.playback_end = 1.0 + args.seconds  # first sentence out: playback by estimate
+            if gate.observe(mic[i : i + chunk], now=i / sr):
+                fired = (i + chunk) / sr
+                break
+        if user_at is None:
+            ok = fired is None
+            result = "no barge-in" if ok else f"FALSE barge-in at {fired:.2f}s"
+        else:
+            ok = fired is not None and fired >= user_at
+            result = f"barge-in {(fired - user_at) * 1000:.0f} ms after the user started" if ok else (
+                "MISSED" if fired is None else f"FALSE barge-in at {fired:.2f}s, before the user")
+        failed |= not ok
+        print(f"  {name:<15} {result}")
+    print(f"  ({step * 1000:.0f} ms chunks, barge_in_speech_frames {config.get('barge_in_speech_frames', 2)})")
+    return 1 if failed else 0
+
+
+def bench_arbiter(args) -> int:
+    proc = None
+    address = args.arbiter
+    if not address:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice-node-arbiter.py")
+        cmd = [sys.executable, script, "--host", "127.0.0.1", "--port", str(port), "--window", str(args.window)]
+        proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL if not args.verbose else None)
+        address = f"127.0.0.1:{port}"
+        time.sleep(0.5)
+    config = dict(voice_node.load_config(), wake_arbiter_fail_open=True)
+    nodes = [voice_node.WakeArbiter(address, dict(config, node_id=f"node{i}")) for i in range(args.nodes)]
+    rng = random.Random(1)
+    answered, best_won = [], 0
+    try:
+        for _ in range(args.wakes):
+            # Each node detects the phrase a little later or earlier and hears it at its own SNR
+            snrs = [rng.uniform(0, 30) for _ in nodes]
+            wins = [None] * len(nodes)
+
+            def run(i):
+                time.sleep(rng.uniform(0, args.jitter))
+                wins[i] = nodes[i].claim(rng.uniform(0.6, 1.0), snrs[i])
+
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(len(nodes))]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            answered.append(sum(wins))
+            best_won += bool(wins[max(range(len(nodes)), key=snrs.__getitem__)])
+            time.sleep(args.gap)
+    finally:
+        if proc is not None:
+            proc.terminate()
+    print(f"{args.nodes} nodes, {args.wakes} wake words, detection jitter up to {args.jitter * 1000:.0f} ms")
+    print(f"  gateway requests: {sum(answered)} with arbitration, {args.nodes * args.wakes} without")
+    print(
+        f"  wake words answered by exactly one node: {answered.count(1)}/{args.wakes}; "
+        f"by none: {answered.count(0)}; highest SNR answered: {best_won}/{args.wakes}"
+    )
+    summarize("claim wait", [ms for node in nodes for ms in node.wait_ms])
+    print(f"  timeouts (fail-open): {sum(node.timeouts for node in nodes)}")
+    return 0
+
+
+class StubSTT:
+    """STT backend stand-in: returns self.text (replay sets it per file from the .txt sidecar) after rtf x audio length."""
+
+    def __init__(self, rtf: float, text: str):
+        self.rtf = rtf
+        self.text = text
+
+    def start(self) -> None:
+        pass
+
+    def alive(self) -> bool:
+        return True
+
+    def transcribe(self, job, timeout: float) -> str:
+        if job.audio is not None:
+            time.sleep(self.rtf * len(job.audio) / job.sample_rate)
+        return self.text
+
+    def cancel(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class StubGateway(http.server.BaseHTTPRequestHandler):
+    """OpenAI-style SSE stream: first token after ttft seconds (slow_ttft for a slow_ratio fraction of
+    requests), then one word every token_interval seconds."""
+
+    reply = "It is three o'clock. Anything else?"
+    ttft = 0.3
+    slow_ttft = 0.0
+    slow_ratio = 0.0
+    token_interval = 0.02
+    rng = random.Random(2)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            time.sleep(self.slow_ttft if self.rng.random() < self.slow_ratio else self.ttft)
+            for i, word in enumerate(self.reply.split(" ")):
+                if i:
+                    time.sleep(self.token_interval)
+                delta = {"choices": [{"delta": {"content": (" " if i else "") + word}}]}
+                self.wfile.write(b"data: " + json.dumps(delta).encode() + b"\n\n")
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except OSError:
+            pass  # client closed the stream (barge-in)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_gateway(args, handler=StubGateway) -> str:
+    handler.ttft = args.stub_ttft
+    handler.reply = args.stub_reply
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-gateway", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def drain_fifo(path: str, lines: list) -> None:
+    """TTS FIFO reader that only records what would have been spoken."""
+    while True:
+        with open(path) as f:
+            for line in f:
+                lines.append(line.strip())
+
+
+def bench_hedge(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="voice-bench-")
+    fifo = os.path.join(workdir, "tts")
+    os.mkfifo(fifo)
+    threading.Thread(target=drain_fifo, args=(fifo, []), daemon=True).start()
+    args.stub_reply = StubGateway.reply
+    primary = type("Primary", (StubGateway,), {"slow_ttft": args.slow_ttft, "slow_ratio": args.slow_ratio, "rng": random.Random(2)})
+    fallback = type("Fallback", (StubGateway,), {})
+    args.stub_ttft = args.primary_ttft
+    primary_url = start_stub_gateway(args, primary)
+    if args.down:
+        with socket.socket() as s:  # nothing listens here: connection refused
+            s.bind(("127.0.0.1", 0))
+            primary_url = f"http://127.0.0.1:{s.getsockname()[1]}"
+    args.stub_ttft = args.fallback_ttft
+    fallback_url = start_stub_gateway(args, fallback)
+    print(
+        f"Primary: first token {args.primary_ttft:g}s, {args.slow_ratio:.0%} at {args.slow_ttft:g}s"
+        f"{' (down)' if args.down else ''}; fallback {args.fallback_ttft:g}s; {args.requests} turns"
+    )
+    try:
+        for name, urls, hedge in (
+            ("primary only", [primary_url], 0.0),
+            ("failover", [primary_url, fallback_url], 0.0),
+            (f"hedge {args.hedge:g}s", [primary_url, fallback_url], args.hedge),
+        ):
+            voice_node._GATEWAY_ENDPOINTS.clear()  # fresh breakers per policy
+            primary.rng = random.Random(2)  # same slow turns for every policy
+            config = dict(
+                voice_node.load_config(), tts_fifo=fifo, gateway_url=urls,
+                gateway_hedge_ttft_seconds=hedge, gateway_timeout_seconds=args.timeout,
+            )
+            ttft, served = [], []
+            for _ in range(args.requests):
+                trace = voice_node.TurnTrace("bench")
+                with contextlib.redirect_stderr(io.StringIO()):
+                    voice_node.stream_and_speak(
+                        urls, "main", [{"role": "user", "content": "hi"}], "", fifo, threading.Event(), config, trace=trace
+                    )
+                if "first_token" in trace.marks:
+                    ttft.append((trace.marks["first_token"] - trace.marks["request_sent"]) * 1000)
+                    served.append(trace.gateway)
+            endpoints = voice_node.gateway_endpoints(urls, config)
+            sent = sum(ep.requests for ep in endpoints)
+            print(f"  {name}: {len(ttft)}/{args.requests} answered, {sent - args.requests} extra request(s)")
+            if ttft:
+                s = sorted(ttft)
+                p99 = s[min(len(s) - 1, int(round(0.99 * (len(s) - 1))))]
+                summarize("ttft", ttft)
+                print(f"  {'':<10} p99    {p99:8.2f} ms   max {s[-1]:8.2f} ms")
+            for ep in endpoints:
+                st = ep.stats()
+                print(f"    {ep.name:<22} served {served.count(ep.name):>3}  breaker {st['breaker']} (trips {st['trips']}), errors {st['errors']}")
+    finally:
+        os.unlink(fifo)
+        os.rmdir(workdir)
+    return 0
+
+
+class TraceCollector:
+    """Takes the place of the pipeline's TraceLog; keeps finished turns in memory."""
+
+    def __init__(self):
+        self.traces = []
+
+    def write(self, trace, outcome: str) -> None:
+        trace.outcome = outcome
+        self.traces.append(trace)
+
+
+def load_wav(path: str, sample_rate: int) -> np.ndarray:
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: need 16-bit PCM")
+        audio = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16).reshape(-1, w.getnchannels())
+        # Same conversion as live capture at a native rate
+        return voice_node.PolyphaseResampler(w.getframerate(), sample_rate).process(audio)
+
+
+def speech_end_sample(audio: np.ndarray, sr: int) -> int:
+    """Ground truth for end of speech: end of the last 20 ms frame within 20 dB of the loudest one."""
+    frame = sr // 50
+    n = len(audio) // frame
+    if n == 0:
+        return len(audio)
+    energy = np.sqrt((audio[: n * frame].astype(np.float32).reshape(n, frame) ** 2).mean(axis=1))
+    voiced = np.nonzero(energy > max(energy.max() * 0.1, 100.0))[0]
+    return int((voiced[-1] + 1) * frame) if len(voiced) else len(audio)
+
+
+def replay_file(pipeline, collector, audio: np.ndarray, args) -> dict:
+    """Feed one recording (plus lead-in and trailing silence) into the pipeline at args.speed x real time."""
+    config = pipeline.config
+    sr, chunk = pipeline.sr, pipeline.chunk
+    lead = np.zeros(int(args.lead * sr), dtype=np.int16)
+    tail = np.zeros(int((config["vad_silence_seconds"] + args.tail) * sr), dtype=np.int16)
+    samples = np.concatenate([lead, audio, tail])
+    truth = len(lead) + speech_end_sample(audio, sr)
+    collector.traces.clear()
+    if pipeline.wake_model is None:
+        pipeline.trigger("replay")
+        time.sleep(0.05)  # let the record stage start before audio arrives
+    feed_times = []
+    t0 = time.monotonic()
+    for start in range(0, len(samples) - chunk + 1, chunk):
+        if args.speed > 0:
+            delay = t0 + start / sr / args.speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        feed_times.append(time.monotonic())
+        pipeline.on_audio(samples[start : start + chunk].copy())
+    deadline = time.monotonic() + args.timeout
+    while time.monotonic() < deadline:
+        backlog = pipeline.wake.stats()["backlog"] if pipeline.wake_model is not None else 0
+        if backlog == 0 and pipeline.idle():
+            time.sleep(0.1)
+            if pipeline.idle():
+                break
+        time.sleep(0.02)
+    pipeline.tts_stop.set()
+    pipeline.wait_idle()
+
+    result = {"wake": None if pipeline.wake_model is None else False, "outcome": "no turn"}
+    trace = collector.traces[0] if collector.traces else None
+    if trace is None:
+        return result
+    if pipeline.wake_model is not None:
+        result["wake"] = trace.source == "wake"
+    result["outcome"] = trace.outcome
+    marks = trace.marks
+    if "stt_start" in marks and "stt_end" in marks and trace.audio_seconds:
+        result["rtf"] = (marks["stt_end"] - marks["stt_start"]) / trace.audio_seconds
+    if args.speed <= 0:
+        return result  # unpaced: feed times say nothing about when speech "ended"
+    # Latencies are measured from when the last voiced chunk was fed, i.e. when the user stopped talking
+    truth_fed = feed_times[min(truth // chunk, len(feed_times) - 1)]
+    if "record_end" in marks:
+        result["eos_ms"] = (marks["record_end"] - truth_fed) * 1000 * args.speed  # in audio time
+    first_out = marks.get("first_fifo_write", marks.get("first_sentence"))
+    if first_out is not None:
+        result["e2e_ms"] = (first_out - truth_fed) * 1000
+    return result
+
+
+def fmt(value, width: int, digits: int = 0) -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:{width}.{digits}f}"
+
+
+def bench_replay(args) -> int:
+    config = voice_node.load_config()
+    workdir = tempfile.mkdtemp(prefix="voice-bench-")
+    fifo = os.path.join(workdir, "tts")
+    os.mkfifo(fifo)
+    spoken = []
+    threading.Thread(target=drain_fifo, args=(fifo, spoken), daemon=True).start()
+    config.update(tts_fifo=fifo, trace_log="", stt_streaming=args.speculate, pipeline_stats_seconds=0)
+    config["gateway_url"] = args.gateway or start_stub_gateway(args)
+    wake_model = None if args.no_wake else voice_node.create_wake_model(config)
+    if wake_model is None:
+        print("No wake model (or --no-wake): each file is triggered at its start; wake hit rate not measured.")
+    pipeline = voice_node.VoicePipeline(config, wake_model)
+    stub = None
+    if not args.real_stt:
+        stub = pipeline.stt.backend = StubSTT(args.stub_rtf, "")
+        pipeline.streaming = args.speculate  # decided at construction, when there was no backend yet
+    pipeline.speculate = args.speculate and pipeline.streaming
+    collector = pipeline.trace_log = TraceCollector()
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    pace = f"{args.speed:g}x real time" if args.speed > 0 else "max speed (wake hit rate and RTF only)"
+    print(f"Replaying {len(args.wavs)} file(s) at {pace}, gateway {config['gateway_url']}")
+    print(f"  {'file':<28} {'wake':>5} {'eos_ms':>8} {'rtf':>6} {'e2e_ms':>8}  outcome")
+    results = []
+    with quiet:
+        pipeline.start(listen_for_wake=wake_model is not None)
+    try:
+        for path in args.wavs:
+            try:
+                audio = load_wav(path, pipeline.sr)
+            except (OSError, ValueError, wave.Error) as e:
+                print(f"  {os.path.basename(path):<28} skipped: {e}", file=sys.stderr)
+                continue
+            if stub is not None:
+                sidecar = os.path.splitext(path)[0] + ".txt"
+                stub.text = open(sidecar).read().strip() if os.path.isfile(sidecar) else args.stub_text
+            with quiet:
+                r = replay_file(pipeline, collector, audio, args)
+            results.append(r)
+            wake = {None: "n/a", True: "hit", False: "miss"}[r["wake"]]
+            print(
+                f"  {os.path.basename(path)[:28]:<28} {wake:>5} {fmt(r.get('eos_ms'), 8)}"
+                f" {fmt(r.get('rtf'), 6, 2)} {fmt(r.get('e2e_ms'), 8)}  {r['outcome']}"
+            )
+    finally:
+        with quiet:
+            pipeline.close()
+        os.unlink(fifo)
+        os.rmdir(workdir)
+    if not results:
+        return 1
+    print()
+    woken = [r["wake"] for r in results if r["wake"] is not None]
+    if woken:
+        print(f"  wake hit rate   {sum(woken)}/{len(woken)} ({100 * sum(woken) / len(woken):.0f}%)")
+    for key, label in (("eos_ms", "eos"), ("e2e_ms", "e2e")):
+        values = [r[key] for r in results if key in r]
+        if values:
+            summarize(label, values)
+    rtfs = [r["rtf"] for r in results if "rtf" in r]
+    if rtfs:
+        print(f"  {'stt rtf':<10} median {statistics.median(rtfs):8.3f}      max {max(rtfs):8.3f}      (n={len(rtfs)})")
+    print(f"  {len(spoken)} line(s) reached the TTS FIFO")
+    if args.speculate:
+        spec = pipeline.speculation_stats()
+        print(
+            f"  speculation: {spec['hits']}/{spec['started']} request(s) used, {spec['wasted_requests']} wasted, "
+            f"first token ~{spec['median_saved_ms'] or 0:.0f} ms sooner (median of hits)"
+        )
+    gate = pipeline.wake.stats().get("gate") if wake_model is not None else None
+    if gate:
+        print(f"  wake gate ({gate['mode']}): skipped {100 * (gate['skip_ratio'] or 0):.0f}% of chunks, ~{gate['est_cpu_saved_s']:.2f}s CPU saved")
+    return 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="voice_node.py benchmarks")
+    sub = ap.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("stt-input", help="temp WAV file vs in-memory STT input")
+    p.add_argument("--seconds", type=float, default=5.0, help="utterance length (default 5)")
+    p.add_argument("--runs", type=int, default=50)
+    p.add_argument("--real", action="store_true", help="run through the configured STT backend")
+    p.set_defaults(func=bench_stt_input)
+    p = sub.add_parser("strip", help="regex strip_for_tts vs streaming MarkdownStripper on long replies")
+    p.add_argument("--chars", type=int, default=20000, help="reply length (default 20000)")
+    p.add_argument("--delta", type=int, default=4, help="characters per streamed delta (default 4, about a token)")
+    p.add_argument("--runs", type=int, default=5)
+    p.set_defaults(func=bench_strip)
+    p = sub.add_parser("wake-frames", help="wake frame handoff: tolist() per frame vs carry-over aligner")
+    p.add_argument("--seconds", type=float, default=60.0, help="audio length (default 60)")
+    p.add_argument("--frame", type=int, default=512, help="engine frame length (Porcupine: 512)")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--real", action="store_true", help="also run the configured wake model")
+    p.set_defaults(func=bench_wake_frames)
+    p = sub.add_parser("wake-gate", help="wake gate duty cycle after a step in steady background noise")
+    p.add_argument("--noise-rms", type=float, default=0.02)
+    p.add_argument("--speech-rms", type=float, default=0.1)
+    p.add_argument("--seconds", type=float, default=60.0, help="noise length after 10s of quiet")
+    p.set_defaults(func=bench_wake_gate)
+    p = sub.add_parser("resample", help="capture conversion to 16 kHz mono: polyphase vs linear interpolation")
+    p.add_argument("--rate", type=int, default=48000, help="device rate (default 48000)")
+    p.add_argument("--channels", type=int, default=2)
+    p.add_argument("--seconds", type=float, default=30.0)
+    p.add_argument("--runs", type=int, default=5)
+    p.set_defaults(func=bench_resample)
+    p = sub.add_parser("barge-in", help="speech barge-in gate: self-echo never interrupts, the user does")
+    p.add_argument("--room-rms", type=float, default=0.003)
+    p.add_argument("--echo-rms", type=float, default=0.046, help="JARVIS's own voice in the mic")
+    p.add_argument("--user-rms", type=float, default=0.15)
+    p.add_argument("--tts-latency", type=float, default=0.4, help="seconds from playback start to audible echo")
+    p.add_argument("--seconds", type=float, default=20.0, help="playback length")
+    p.set_defaults(func=bench_barge_in)
+    p = sub.add_parser("arbiter", help="multi-node wake arbitration: requests per wake word, claim wait")
+    p.add_argument("--nodes", type=int, default=4)
+    p.add_argument("--wakes", type=int, default=50)
+    p.add_argument("--jitter", type=float, default=0.15, help="spread of detection times across nodes, seconds")
+    p.add_argument("--window", type=float, default=0.25, help="arbiter window when started here")
+    p.add_argument("--gap", type=float, default=2.5, help="seconds between wake words (> arbiter holdoff)")
+    p.add_argument("--arbiter", help="host:port of a running arbiter (default: start one)")
+    p.add_argument("--verbose", action="store_true", help="show the arbiter's output")
+    p.set_defaults(func=bench_arbiter)
+    p = sub.add_parser("hedge", help="gateway failover and hedged requests: time to first token, extra requests")
+    p.add_argument("--requests", type=int, default=40)
+    p.add_argument("--primary-ttft", type=float, default=0.3)
+    p.add_argument("--slow-ttft", type=float, default=6.0, help="primary's slow-tail first token, seconds")
+    p.add_argument("--slow-ratio", type=float, default=0.2, help="fraction of primary requests in the slow tail")
+    p.add_argument("--fallback-ttft", type=float, default=0.8)
+    p.add_argument("--hedge", type=float, default=1.0, help="gateway_hedge_ttft_seconds for the hedged run")
+    p.add_argument("--timeout", type=float, default=30.0)
+    p.add_argument("--down", action="store_true", help="primary unreachable (connection refused)")
+    p.set_defaults(func=bench_hedge)
+    p = sub.add_parser("replay", help="replay WAV files through wake → VAD → STT → gateway → TTS FIFO")
+    p.add_argument("wavs", nargs="+", help="16-bit WAV (any rate/channels), one utterance each")
+    p.add_argument("--speed", type=float, default=1.0, help="pace relative to real time (0 = no pacing); e2e is user-perceived only at 1")
+    p.add_argument("--lead", type=float, default=0.5, help="silence before each file, seconds")
+    p.add_argument("--tail", type=float, default=1.0, help="silence after each file beyond vad_silence_seconds")
+    p.add_argument("--timeout", type=float, default=30.0, help="max wait for a turn to finish after feeding")
+    p.add_argument("--no-wake", action="store_true", help="skip the wake model; trigger each file at its start")
+    p.add_argument("--real-stt", action="store_true", help="use the configured STT backend instead of the stub")
+    p.add_argument("--speculate", action="store_true", help="streaming STT + speculative gateway requests")
+    p.add_argument("--stub-text", default="what is on my calendar tomorrow", help="stub transcript when a file has no .txt sidecar")
+    p.add_argument("--stub-rtf", type=float, default=0.1, help="stub STT time as a fraction of audio length")
+    p.add_argument("--gateway", help="gateway URL (default: in-process stub)")
+    p.add_argument("--stub-ttft", type=float, default=0.3, help="stub gateway time to first token, seconds")
+    p.add_argument("--stub-reply", default=StubGateway.reply)
+    p.add_argument("--verbose", action="store_true", help="show the pipeline's own output")
+    p.set_defaults(func=bench_replay)
+    args = ap.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
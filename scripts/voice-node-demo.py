@@ -7,10 +7,12 @@ Use this to verify gateway + TTS without wake word or Whisper.
 """
 
 import os
-import re
 import sys
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from tts_text import strip_for_tts  # noqa: E402 (same stripper as voice_node.py)
+
 def main():
     gateway_url = os.environ.get("GATEWAY_URL", "http://127.0.0.1:18789").rstrip("/")
     tts_fifo = os.environ.get("TTS_FIFO", os.path.expanduser("~/.tts_pipe"))
@@ -60,9 +62,7 @@ def main():
         print("Then run the TTS reader in another terminal: while true; do while IFS= read -r line; do [ -n \"$line\" ] && termux-tts-speak \"$line\"; done < ~/.tts_pipe; done", file=sys.stderr)
         return
     # Strip markdown for TTS
-    plain = content.replace("```", " ").replace("`", " ").replace("**", " ").replace("*", " ")
-    plain = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", plain)
-    plain = re.sub(r"\n+", " ", plain).replace("  ", " ").strip()[:3000]
+    plain = strip_for_tts(content)
     try:
         with open(tts_fifo, "w") as f:
             f.write(plain + "\n")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Summarize voice node latency traces (trace_log in voice_node.yaml): p50/p95/p99 per stage.
+
+  python3 scripts/voice-node-trace.py ~/.jarvis/voice_node_trace.jsonl
+  # Compare before/after a config change (one table per value)
+  python3 scripts/voice-node-trace.py ~/.jarvis/voice_node_trace.jsonl --by vad_silence_seconds
+  # Per gateway endpoint that served the reply (with several in gateway_url)
+  python3 scripts/voice-node-trace.py ~/.jarvis/voice_node_trace.jsonl --by gateway
+  # Only the last 50 completed turns
+  python3 scripts/voice-node-trace.py ~/.jarvis/voice_node_trace.jsonl --last 50 --outcome ok
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from voice_node import TRACE_SPANS  # noqa: E402
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    k = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def load(path: str) -> list:
+    records = []
+    with open(os.path.expanduser(path)) as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                print(f"{path}:{n}: skipping malformed line", file=sys.stderr)
+    return records
+
+
+def print_table(records: list) -> None:
+    outcomes = Counter(r.get("outcome") for r in records)
+    print("  turns: " + ", ".join(f"{k or '?'} {v}" for k, v in outcomes.most_common()))
+    print(f"  {'span':<18} {'n':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}   (ms)")
+    for name, _, _ in TRACE_SPANS:
+        values = sorted(r["spans_ms"][name] for r in records if name in r.get("spans_ms", {}))
+        if not values:
+            continue
+        print(
+            f"  {name:<18} {len(values):>5} {percentile(values, 50):>9.1f} {percentile(values, 95):>9.1f}"
+            f" {percentile(values, 99):>9.1f} {values[-1]:>9.1f}"
+        )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="p50/p95/p99 per stage from a voice node trace log")
+    ap.add_argument("log", help="JSONL file written by voice_node.py (trace_log)")
+    ap.add_argument("--by", metavar="KEY", help="group by a recorded config key (e.g. chunk_samples) or record field (gateway, source)")
+    ap.add_argument("--last", type=int, default=0, help="only the last N turns")
+    ap.add_argument("--outcome", help="only turns with this outcome (ok, barge_in, no_transcript, ...)")
+    args = ap.parse_args()
+
+    records = load(args.log)
+    if args.outcome:
+        records = [r for r in records if r.get("outcome") == args.outcome]
+    if args.last > 0:
+        records = records[-args.last :]
+    if not records:
+        print("No turns in log.", file=sys.stderr)
+        return 1
+    if not args.by:
+        print(f"{args.log}: {len(records)} turns, {records[0].get('ts')} .. {records[-1].get('ts')}")
+        print_table(records)
+        return 0
+    groups = {}
+    for r in records:
+        value = r.get("config", {}).get(args.by, r.get(args.by))
+        groups.setdefault(json.dumps(value), []).append(r)
+    for value, group in groups.items():
+        print(f"{args.by} = {value}: {len(group)} turns, {group[0].get('ts')} .. {group[-1].get('ts')}")
+        print_table(group)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,12 +11,19 @@ from __future__ import annotations
 
 import os
 import sys
+import ctypes
 import json
 import subprocess
 import tempfile
 import threading
 import time
 import re
+import queue
+import io
+import multiprocessing
+import socket
+import wave
+from collections import deque
 from pathlib import Path
 
 # Config: YAML optional
@@ -52,32 +59,106 @@ except ImportError:
 
 import requests
 
+from tts_text import MarkdownStripper, SentenceSegmenter, strip_for_tts
+
 # -----------------------------------------------------------------------------
 # Config
 # -----------------------------------------------------------------------------
 
 DEFAULT_CONFIG = {
-    "gateway_url": "http://127.0.0.1:18789",
+    "gateway_url": "http://127.0.0.1:18789",  # or a list tried in order: URLs / {url, token}; Supabase Edge URLs too
+    "gateway_token": "",  # Bearer token for endpoints without their own (gateway token or Edge JARVIS_AUTH_TOKEN)
+    "gateway_session_id": "voice-node",  # Edge only: session its Supabase memory is kept under
     "gateway_agent_id": "main",
     "sample_rate": 16000,
     "ring_buffer_seconds": 2.0,
     "chunk_samples": 1280,
+    "capture_device": "",  # sounddevice input name/index; empty = default
+    "capture_rate": 0,  # 0 = device native rate, resampled here (polyphase); 16000 = let PulseAudio resample
+    "capture_channels": 0,  # 0 = device native (max 2), downmixed to mono here
     "wakeword_models": [],
     "wakeword_threshold": 0.5,
     "wake_phrase": "Hey JARVIS",
     "wakeword_engine": "",  # "openwakeword" | "porcupine" (empty = auto: OWW if available else Porcupine)
+    "wake_batch_max_chunks": 4,  # OpenWakeWord: when behind, score up to N queued chunks in one predict()
+    "wake_gate": "off",  # cascade: "energy" | "flux" run the wake model only when something speech-like is heard
+    "wake_gate_ratio": 3.0,  # level must be this far above its noise floor
+    "wake_gate_min_rms": 0.005,  # ...and the chunk at least this loud (0..1 full scale)
+    "wake_gate_hold_seconds": 1.5,  # keep the model running this long after the last active chunk
+    "wake_gate_lookback_seconds": 0.5,  # audio before the gate opened, replayed to the model (phrase onset)
+    "wake_arbiter": "",  # "host:port" of scripts/voice-node-arbiter.py: with several nodes, only one answers a wake word
+    "wake_arbiter_timeout_seconds": 1.0,  # longest wait for the arbiter's verdict (its window is ~0.25 s)
+    "wake_arbiter_fail_open": True,  # no verdict in time: answer anyway (False: stay quiet)
+    "node_id": "",  # this node's name for the arbiter; empty = hostname:pid
     "porcupine_access_key": "",
     "porcupine_keyword_path": "",  # path to .ppn; if empty and engine=porcupine, use built-in "jarvis"
     "vad_silence_threshold": 0.08,
     "vad_silence_seconds": 0.7,
     "vad_max_utterance_seconds": 15.0,
+    "vad_engine": "energy",  # "energy" | "silero" (needs onnxruntime + vad_silero_model)
+    "vad_hangover_frames": 3,
+    "vad_noise_ratio": 3.0,
+    "vad_peak_decay_seconds": 1.5,
+    "vad_silero_model": "",  # path to silero_vad.onnx (v5)
+    "vad_silero_threshold": 0.5,
     "whisper_cmd": "",
     "whisper_python": False,
+    "whisper_python_model": "base",
+    "whisper_server_cmd": "",  # e.g. "whisper-server -m ggml-base.en.bin --host 127.0.0.1 --port 8178" (resident model)
+    "whisper_server_url": "http://127.0.0.1:8178",
+    "whisper_server_startup_seconds": 60,
+    "stt_timeout_seconds": 60,
+    "stt_streaming": False,  # decode while recording: segments at VAD pauses + partial hypotheses
+    "stt_partial_interval_seconds": 1.0,
+    "stt_segment_pause_seconds": 0.25,
+    "stt_min_segment_seconds": 2.0,
+    "stt_max_segment_seconds": 8.0,
+    "stt_input": "memory",  # "memory" (PCM/WAV bytes, no temp files) | "file" (temp WAV; old whisper builds)
+    "stt_preroll_trim": True,  # start STT audio just before where the wake phrase ended, not the whole ring
+    "stt_preroll_margin_seconds": 0.3,  # audio kept before the detected end of the wake phrase
+    "stt_trim_silence": False,  # also cut leading (energy) and trailing (VAD) silence before STT
+    "stt_max_restarts": 5,
+    "speculate": False,  # stt_streaming: start the gateway request before the final transcript, spoken only if it matches
+    "speculate_stable_partials": 2,  # ...once this many partial hypotheses in a row agree (0 = off)
+    "speculate_pause_seconds": 0.3,  # ...or once the VAD has heard this much silence (0 = off; < vad_silence_seconds)
+    "gateway_pool_size": 2,
+    "gateway_keepalive_seconds": 30,  # skip pre-warm if the pool was used this recently
+    "gateway_probe_path": "/",
+    "gateway_probe_interval_seconds": 0,  # >0: background health probe that also keeps the connection warm
+    "gateway_prewarm_on_wake": True,
+    "gateway_timeout_seconds": 30,  # give up on a turn with no first token after this long
+    "gateway_hedge_ttft_seconds": 2.5,  # no first token by then: also ask the next endpoint, first to answer wins (0 = off)
+    "gateway_breaker_failures": 3,  # failures in a row before an endpoint is skipped...
+    "gateway_breaker_reset_seconds": 30,  # ...for this long, then retried once
+    "pipeline_queue_size": 2,  # bounded queue between record → stt → reply stages
+    "pipeline_put_timeout_seconds": 30,  # backpressure: how long a stage waits for room downstream
+    "pipeline_stats_seconds": 0,  # >0: print per-stage queue depth / busy time every N seconds
+    "trace_log": "",  # e.g. ~/.jarvis/voice_node_trace.jsonl: one latency record per turn (scripts/voice-node-trace.py)
     "tts_fifo": "",
     "tts_barge_in_signal": "__STOP__",
+    "tts_backlog_size": 16,  # sentences waiting for a slow or absent FIFO reader
+    "tts_backlog_policy": "merge",  # when full: "merge" (into the last line) | "drop_oldest" | "drop_newest"
+    "tts_max_line_age_seconds": 10,  # don't speak lines that waited longer than this for a reader
+    "tts_reconnect_seconds": 0.5,  # retry opening the FIFO when no reader is attached
+    "barge_in": "wake",  # "wake" | "speech" | "off": what interrupts a reply
+    "barge_in_echo_ratio": 2.5,  # user must be this much louder than JARVIS's echo in the mic
+    "barge_in_min_rms": 0.02,
+    "barge_in_speech_frames": 2,  # consecutive loud chunks (80 ms each) for speech barge-in
+    "barge_in_echo_warmup_seconds": 0.5,  # audible playback used only to learn the echo level
+    "tts_chars_per_second": 14.0,  # speaking rate estimate, used to know when playback ends
+    "tts_first_clause_words": 4,  # flush the reply's first clause at , ; : or dash once it has N words (0 = off)
     "system_prompt": "You are a concise voice assistant. Reply in short, spoken sentences. Avoid lists and markdown.",
-    "system_prompt_file": "",  # e.g. ~/.jarvis/SOUL.md — if set and file exists, used as system_prompt (voice: keep short or first N chars)
+    "system_prompt_file": "",  # e.g. ~/.jarvis/SOUL.md — if set and file exists, used as system_prompt (cut to system_prompt_max_tokens)
+    "system_prompt_max_tokens": 400,
+    "context_recent_tokens": 1200,  # recent turns sent verbatim; older ones are folded into the summary
+    "context_summary": "extractive",  # "extractive" (local) | "gateway" (LLM, in the background) | "off" (drop old turns)
+    "context_summary_tokens": 200,
     "strip_wake_phrase_from_transcript": True,
+    "local_intents": True,  # answer time/date/stop/volume/repeat on-device instead of asking the gateway
+    "local_intent_table": [],  # extra entries (checked first): {intent, phrases, patterns, reply}
+    "volume_cmd": "termux-volume",
+    "volume_stream": "music",
+    "volume_step": 2,
 }
 
 
@@ -106,7 +187,9 @@ def load_config() -> dict:
             break
     # Env overrides
     if os.environ.get("GATEWAY_URL"):
-        config["gateway_url"] = os.environ["GATEWAY_URL"].rstrip("/")
+        # Comma-separated for failover: GATEWAY_URL=http://mac:18789,https://x.supabase.co/functions/v1/jarvis
+        urls = [u.strip().rstrip("/") for u in os.environ["GATEWAY_URL"].split(",") if u.strip()]
+        config["gateway_url"] = urls[0] if len(urls) == 1 else urls
     if os.environ.get("TTS_FIFO"):
         config["tts_fifo"] = os.environ["TTS_FIFO"]
     # Optional: load system prompt from file (e.g. ~/.jarvis/SOUL.md)
@@ -117,8 +200,8 @@ def load_config() -> dict:
             try:
                 with open(path, "r") as f:
                     content = f.read()
-                # For voice, use first 1500 chars to keep context small; full SOUL can live in gateway workspace
-                config["system_prompt"] = content[:1500] if len(content) > 1500 else content
+                # For voice, keep the prompt small (token budget); full SOUL can live in gateway workspace
+                config["system_prompt"] = truncate_to_tokens(content.strip(), int(config.get("system_prompt_max_tokens", 400)))
             except Exception as e:
                 print(f"Warning: could not read system_prompt_file {path}: {e}", file=sys.stderr)
     if not config["tts_fifo"]:
@@ -132,42 +215,271 @@ def load_config() -> dict:
 # Ring buffer (int16)
 # -----------------------------------------------------------------------------
 
+class RingView:
+    """Read-only window [start_seq, end_seq) into a RingBuffer: one segment, or two when it wraps."""
+
+    __slots__ = ("ring", "start_seq", "end_seq", "segments")
+
+    def __init__(self, ring: "RingBuffer", start_seq: int, end_seq: int, segments: tuple):
+        self.ring = ring
+        self.start_seq = start_seq
+        self.end_seq = end_seq
+        self.segments = segments
+
+    def __len__(self) -> int:
+        return self.end_seq - self.start_seq
+
+    def intact(self) -> bool:
+        """True if the producer has not overwritten any of this window since it was taken."""
+        return self.ring._claim_seq - self.start_seq <= self.ring.size
+
+    def array(self) -> np.ndarray:
+        """Contiguous samples: a view when unwrapped, else a copy of just these samples."""
+        if not self.segments:
+            return np.zeros(0, dtype=np.int16)
+        if len(self.segments) == 1:
+            return self.segments[0]
+        return np.concatenate(self.segments)
+
+    def copy(self) -> np.ndarray:
+        """Owned copy of the samples; counts a torn read on the ring if the producer lapped us."""
+        out = np.concatenate(self.segments) if self.segments else np.zeros(0, dtype=np.int16)
+        if not self.intact():
+            self.ring.torn_reads += 1
+        return out
+
+
 class RingBuffer:
+    """
+    Single-producer / single-consumer int16 ring with monotonically increasing sample sequence numbers.
+    The audio callback is the only writer (push); the main loop reads with latest(n) / since(seq), which
+    return RingView windows over the backing array instead of copying the whole buffer.
+    Sequence numbers count samples ever pushed, so the consumer can tell exactly what it missed:
+    since() on a sequence the producer already overwrote counts an overrun, and a view the producer
+    laps before the consumer is done with it is reported by RingView.intact() / counted as a torn read.
+    """
+
     def __init__(self, size_samples: int):
         self.buf = np.zeros(size_samples, dtype=np.int16)
         self.size = size_samples
-        self.pos = 0
-        self.filled = 0
+        # write_seq: samples published; _claim_seq: samples the producer is about to write (>= write_seq)
+        self.write_seq = 0
+        self._claim_seq = 0
+        self._floor_seq = 0
+        self.overruns = 0
+        self.overrun_samples = 0
+        self.torn_reads = 0
+
+    @property
+    def pos(self) -> int:
+        return self.write_seq % self.size
+
+    @property
+    def filled(self) -> int:
+        return min(self.write_seq - self._floor_seq, self.size)
 
     def push(self, chunk: np.ndarray) -> None:
         n = len(chunk)
-        if n >= self.size:
-            self.buf[:] = chunk[-self.size:]
-            self.pos = 0
-            self.filled = self.size
+        if n == 0:
             return
-        if self.pos + n <= self.size:
-            self.buf[self.pos : self.pos + n] = chunk
-            self.pos += n
+        seq = self.write_seq
+        # Claim before writing so readers can detect a lap that is still in progress.
+        self._claim_seq = seq + n
+        if n >= self.size:
+            chunk = chunk[-self.size:]
+            seq += n - self.size
+            n = self.size
+        pos = seq % self.size
+        if pos + n <= self.size:
+            self.buf[pos : pos + n] = chunk
         else:
-            first = self.size - self.pos
-            self.buf[self.pos:] = chunk[:first]
+            first = self.size - pos
+            self.buf[pos:] = chunk[:first]
             self.buf[: n - first] = chunk[first:]
-            self.pos = n - first
-        self.filled = min(self.filled + n, self.size)
+        self.write_seq = self._claim_seq
+
+    def _view(self, start: int, end: int) -> RingView:
+        if end <= start:
+            return RingView(self, end, end, ())
+        a = start % self.size
+        b = a + (end - start)
+        if b <= self.size:
+            segments = (self.buf[a:b],)
+        else:
+            segments = (self.buf[a:], self.buf[: b - self.size])
+        return RingView(self, start, end, segments)
+
+    def latest(self, n: int) -> RingView:
+        """The newest min(n, filled) samples."""
+        end = self.write_seq
+        start = max(end - n, end - self.size, self._floor_seq)
+        return self._view(start, end)
+
+    def since(self, seq: int, max_samples: int | None = None) -> RingView:
+        """Samples from sequence number seq up to now (at most max_samples). If seq was already overwritten,
+        counts an overrun and returns from the oldest sample still held."""
+        end = self.write_seq
+        oldest = max(end - self.size, self._floor_seq)
+        if seq < oldest:
+            if seq < end - self.size:
+                self.overruns += 1
+                self.overrun_samples += end - self.size - seq
+            seq = oldest
+        if max_samples is not None:
+            end = min(end, seq + max_samples)
+        return self._view(seq, end)
 
     def get_all(self) -> np.ndarray:
-        if self.filled < self.size:
-            return self.buf[: self.filled].copy()
-        return np.concatenate([self.buf[self.pos :], self.buf[: self.pos]])
+        return self.latest(self.size).copy()
 
     def clear(self) -> None:
-        self.pos = 0
-        self.filled = 0
+        # Consumer-side: hide everything written so far without touching the producer's cursor.
+        self._floor_seq = self.write_seq
+
+    def stats(self) -> dict:
+        return {
+            "written": self.write_seq,
+            "overruns": self.overruns,
+            "overrun_samples": self.overrun_samples,
+            "torn_reads": self.torn_reads,
+        }
+
+
+# -----------------------------------------------------------------------------
+# Capture: device-native rate/channels → downmix + polyphase resample (int16, sample_rate)
+# -----------------------------------------------------------------------------
+
+class PolyphaseResampler:
+    """
+    Rational-ratio resampler, out/in = L/M (48000→16000 is 1/3, 44100→16000 is 160/441), using a
+    Kaiser-windowed sinc split into L polyphase branches. Each call produces every output sample whose
+    input has arrived as one gather plus a row-wise dot product (no Python loop per sample; for integer
+    ratios like 48k→16k a strided window view and one matrix-vector product); filter history
+    carries across calls, so chunk boundaries are seamless. 2-D (frames, channels) input is downmixed first.
+    The cutoff sits at 0.9 x the lower Nyquist so the transition band ends before it: tones between the
+    output and input Nyquist are rejected instead of folding back just below 8 kHz (7 kHz is ~3 dB down).
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, zero_crossings: int = 16, beta: float = 8.0, cutoff: float = 0.9):
+        from math import gcd
+
+        g = gcd(int(in_rate), int(out_rate))
+        self.L, self.M = int(out_rate) // g, int(in_rate) // g
+        self.in_rate, self.out_rate = int(in_rate), int(out_rate)
+        up = max(self.L, self.M)
+        n = 2 * zero_crossings * up + 1
+        t = (np.arange(n) - (n - 1) / 2) / up
+        h = cutoff * np.sinc(cutoff * t) * np.kaiser(n, beta) * (self.L / up)  # cutoff x the lower Nyquist, gain L
+        self.K = -(-n // self.L)
+        h = np.concatenate([h, np.zeros(self.K * self.L - n)])
+        # taps[p, k] = h[p + k L]: branch p weights input samples x[base], x[base - 1], ...
+        self.taps = h.reshape(self.K, self.L).T.astype(np.float32).copy()
+        self.hist = np.zeros(self.K - 1, dtype=np.float32)
+        self.in_count = 0
+        self.out_count = 0
+        self.passthrough = self.L == self.M
+
+    @staticmethod
+    def downmix(x: np.ndarray) -> np.ndarray:
+        if x.ndim == 2:
+            return x[:, 0].astype(np.float32) if x.shape[1] == 1 else x.mean(axis=1, dtype=np.float32)
+        return x.astype(np.float32)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """int16 samples at in_rate (mono, or frames x channels) → int16 mono at out_rate."""
+        x = self.downmix(x)
+        if self.passthrough:
+            return np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+        buf = np.concatenate([self.hist, x])
+        first = self.in_count - (self.K - 1)  # input index of buf[0]
+        self.in_count += len(x)
+        end = -(-self.in_count * self.L // self.M)
+        n = np.arange(self.out_count, end, dtype=np.int64)
+        self.out_count = end
+        t = n * self.M
+        if self.L == 1:
+            # Integer decimation: one branch, so the input windows are a strided view (no gather copy)
+            if len(n) == 0:
+                y = np.zeros(0, dtype=np.float32)
+            else:
+                windows = np.lib.stride_tricks.sliding_window_view(buf, self.K)
+                start = int(t[0]) - first - (self.K - 1)
+                y = windows[start : start + len(n) * self.M : self.M] @ self.taps[0, ::-1]
+        else:
+            idx = (t // self.L - first)[:, None] - np.arange(self.K)[None, :]
+            y = np.einsum("nk,nk->n", self.taps[t % self.L], buf[idx])
+        self.hist = buf[len(buf) - (self.K - 1) :]
+        return np.clip(np.rint(y), -32768, 32767).astype(np.int16)
+
+
+class AudioCapture:
+    """
+    sounddevice input at the device's native rate and channel count (capture_rate / capture_channels = 0),
+    converted once per callback by a PolyphaseResampler to mono int16 at sample_rate, then handed to
+    on_audio (ring buffer, wake, recording). Input status flags (overflows) and conversion time are counted.
+    With capture_rate: 16000 and capture_channels: 1 the device/PulseAudio does the conversion, as before.
+    """
+
+    def __init__(self, config: dict, on_audio):
+        self.on_audio = on_audio
+        self.sr = config["sample_rate"]
+        self.chunk = config["chunk_samples"]
+        device = config.get("capture_device") or None
+        info = sd.query_devices(device, "input")
+        self.rate = int(config.get("capture_rate") or info["default_samplerate"])
+        self.channels = int(config.get("capture_channels") or min(int(info["max_input_channels"]), 2) or 1)
+        self.resampler = PolyphaseResampler(self.rate, self.sr)
+        self.blocksize = round(self.chunk * self.rate / self.sr)
+        self.callbacks = 0
+        self.status_flags = 0
+        self.convert_seconds = 0.0
+        self.stream = sd.InputStream(
+            device=device,
+            samplerate=self.rate,
+            channels=self.channels,
+            dtype="int16",
+            blocksize=self.blocksize,
+            callback=self._callback,
+        )
+
+    def _callback(self, indata, frames, time_info, status) -> None:
+        if status:
+            self.status_flags += 1
+            print(status, file=sys.stderr)
+        if indata is None or frames == 0:
+            return
+        t0 = time.perf_counter()
+        # One owned int16 chunk per callback: the ring copies it into its own storage, the queue keeps it.
+        samples = self.resampler.process(indata)
+        self.convert_seconds += time.perf_counter() - t0
+        self.callbacks += 1
+        if len(samples):
+            self.on_audio(samples)
+
+    def describe(self) -> str:
+        conv = "no conversion" if self.resampler.passthrough and self.channels == 1 else f"→ {self.sr} Hz mono"
+        return f"{self.rate} Hz x{self.channels} {conv}"
+
+    def start(self) -> None:
+        self.stream.start()
+
+    def close(self) -> None:
+        self.stream.stop()
+        self.stream.close()
+
+    def stats(self) -> dict:
+        seconds = self.resampler.in_count / self.rate if self.rate else 0
+        return {
+            "rate": self.rate,
+            "channels": self.channels,
+            "callbacks": self.callbacks,
+            "status_flags": self.status_flags,
+            "convert_ms_per_s": round(1000 * self.convert_seconds / seconds, 3) if seconds else None,
+        }
 
 
 # -----------------------------------------------------------------------------
-# Simple energy VAD (no torch/silero required)
+# Streaming VAD: energy (no deps) or Silero ONNX (optional)
 # -----------------------------------------------------------------------------
 
 def rms(samples: np.ndarray) -> float:
@@ -176,44 +488,188 @@ def rms(samples: np.ndarray) -> float:
     return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)) / 32768.0)
 
 
+class StreamingVAD:
+    """
+    End-of-utterance detector fed one chunk at a time; O(1) work per chunk beyond the backend's frame test.
+    Subclasses implement _voiced(chunk). After process() returns True, speech_end_sample is the sample offset
+    (from reset) where the last voiced chunk ended and speech_end_time its time.monotonic() when processed;
+    end_reason is "silence", "max_length" or "" while still listening.
+    is_speech is the per-chunk decision smoothed with vad_hangover_frames, for consumers that need it live.
+    """
+
+    name = "base"
+
+    def __init__(self, config: dict):
+        sr = config["sample_rate"]
+        self.silence_samples = int(sr * config["vad_silence_seconds"])
+        self.max_samples = int(sr * config["vad_max_utterance_seconds"])
+        self.hangover_frames = int(config.get("vad_hangover_frames", 3))
+        self.reset()
+
+    def reset(self) -> None:
+        self.samples = 0
+        self.speech_end_sample = 0
+        self.speech_end_time = time.monotonic()
+        self.heard_speech = False
+        self.is_speech = False
+        self.end_reason = ""
+        self._hangover_left = 0
+
+    def _voiced(self, chunk: np.ndarray) -> bool:
+        raise NotImplementedError
+
+    def process(self, chunk: np.ndarray) -> bool:
+        """Consume one chunk; True once the utterance has ended."""
+        if self.end_reason:
+            return True
+        self.samples += len(chunk)
+        if self._voiced(chunk):
+            self.heard_speech = True
+            self.speech_end_sample = self.samples
+            self.speech_end_time = time.monotonic()
+            self._hangover_left = self.hangover_frames
+            self.is_speech = True
+        elif self._hangover_left > 0:
+            self._hangover_left -= 1
+            self.is_speech = True
+        else:
+            self.is_speech = False
+        if self.samples - self.speech_end_sample >= self.silence_samples:
+            self.end_reason = "silence"
+        elif self.samples >= self.max_samples:
+            self.end_reason = "max_length"
+        return bool(self.end_reason)
+
+
+class EnergyVAD(StreamingVAD):
+    """
+    RMS energy against a decaying peak and an adaptive noise floor.
+    Voiced = energy above vad_silence_threshold x recent peak and above vad_noise_ratio x noise floor.
+    The peak decays with half-life vad_peak_decay_seconds, so one loud transient stops masking speech
+    end after a second or two. The floor follows quiet frames quickly and drifts up slowly.
+    """
+
+    name = "energy"
+
+    def __init__(self, config: dict):
+        self.thresh = float(config["vad_silence_threshold"])
+        self.noise_ratio = float(config.get("vad_noise_ratio", 3.0))
+        chunk_sec = config["chunk_samples"] / config["sample_rate"]
+        half_life = max(float(config.get("vad_peak_decay_seconds", 1.5)), 1e-3)
+        self.peak_decay = 0.5 ** (chunk_sec / half_life)
+        super().__init__(config)
+
+    def reset(self) -> None:
+        super().reset()
+        self.peak = 0.01
+        self.noise_floor = None
+
+    def _voiced(self, chunk: np.ndarray) -> bool:
+        energy = rms(chunk)
+        self.peak = max(energy, self.peak * self.peak_decay)
+        if self.noise_floor is None:
+            self.noise_floor = min(energy, 0.01)
+        elif energy < self.noise_floor:
+            self.noise_floor += (energy - self.noise_floor) * 0.5
+        else:
+            self.noise_floor += (energy - self.noise_floor) * 0.01
+        return energy >= self.thresh * self.peak and energy > self.noise_ratio * self.noise_floor
+
+
+class SileroVAD(StreamingVAD):
+    """Silero VAD v5 via onnxruntime (no torch). Frames of 512 samples at 16 kHz; leftovers carry to the next chunk."""
+
+    name = "silero"
+    frame = 512
+
+    def __init__(self, config: dict):
+        import onnxruntime
+
+        path = os.path.expanduser((config.get("vad_silero_model") or "").strip())
+        if not path or not os.path.isfile(path):
+            raise FileNotFoundError(f"vad_silero_model not found: {path or '(unset)'}")
+        opts = onnxruntime.SessionOptions()
+        opts.intra_op_num_threads = 1
+        opts.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.prob_thresh = float(config.get("vad_silero_threshold", 0.5))
+        self.sr = np.array(config["sample_rate"], dtype=np.int64)
+        super().__init__(config)
+
+    def reset(self) -> None:
+        super().reset()
+        self.state = np.zeros((2, 1, 128), dtype=np.float32)
+        self.carry = np.zeros(0, dtype=np.float32)
+
+    def _voiced(self, chunk: np.ndarray) -> bool:
+        audio = np.concatenate([self.carry, chunk.astype(np.float32) / 32768.0])
+        voiced = False
+        usable = len(audio) - len(audio) % self.frame
+        for i in range(0, usable, self.frame):
+            out, self.state = self.session.run(
+                None, {"input": audio[None, i : i + self.frame], "state": self.state, "sr": self.sr}
+            )
+            if float(out[0][0]) >= self.prob_thresh:
+                voiced = True
+        self.carry = audio[usable:]
+        return voiced
+
+
+def create_vad(config: dict) -> StreamingVAD:
+    engine = (config.get("vad_engine") or "energy").strip().lower()
+    if engine == "silero":
+        try:
+            return SileroVAD(config)
+        except Exception as e:
+            print(f"Warning: could not load Silero VAD ({e}); using energy VAD.", file=sys.stderr)
+    return EnergyVAD(config)
+
+
 def record_until_silence(
     stream,
     config: dict,
     stop_event: threading.Event,
     stream_callback_queue,
+    vad: StreamingVAD | None = None,
+    on_chunk=None,
 ) -> np.ndarray:
-    """Record from stream until silence for vad_silence_seconds or max length. Uses pre-filled queue chunks."""
-    sr = config["sample_rate"]
-    silence_thresh = config["vad_silence_threshold"]
-    silence_sec = config["vad_silence_seconds"]
-    max_sec = config["vad_max_utterance_seconds"]
-    silence_samples = int(sr * silence_sec)
-    max_samples = int(sr * max_sec)
-    silence_count = 0
+    """Record from stream until the VAD reports end of utterance. Uses pre-filled queue chunks.
+    Pass a vad to read its speech_end_sample / speech_end_time / end_reason afterwards;
+    on_chunk(chunk, vad) is called for every chunk after the VAD has seen it."""
+    if vad is None:
+        vad = create_vad(config)
+    vad.reset()
     chunks = []
-    recent_max = 0.01
     while not stop_event.is_set():
         try:
             chunk = stream_callback_queue.get(timeout=0.2)
         except Exception:
             continue
         chunks.append(chunk)
-        n = len(chunk)
-        energy = rms(chunk)
-        recent_max = max(recent_max, energy)
-        if energy < silence_thresh * recent_max:
-            silence_count += n
-            if silence_count >= silence_samples:
-                break
-        else:
-            silence_count = 0
-        if sum(len(c) for c in chunks) >= max_samples:
+        ended = vad.process(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk, vad)
+        if ended:
             break
     if not chunks:
         return np.array([], dtype=np.int16)
     return np.concatenate(chunks)
 
 
+def leading_silence(audio: np.ndarray, sr: int, pad_seconds: float = 0.2) -> int:
+    """Samples of silence at the start of audio (minus pad_seconds), from 20 ms frame energies."""
+    frame = sr // 50
+    n = len(audio) // frame
+    if n == 0:
+        return 0
+    x = audio[: n * frame].astype(np.float32).reshape(n, frame) / 32768.0
+    energy = np.sqrt((x * x).mean(axis=1))
+    voiced = np.nonzero(energy > max(energy.max() * 0.1, 0.005))[0]
+    if len(voiced) == 0:
+        return 0
+    return max(0, int(voiced[0]) * frame - int(pad_seconds * sr))
+
+
 # -----------------------------------------------------------------------------
 # Wake word
 # -----------------------------------------------------------------------------
@@ -253,42 +709,501 @@ def create_wake_model(config: dict):
         return None
 
 
-def check_wake(audio: np.ndarray, model, config: dict) -> bool:
+OWW_FRAME_SAMPLES = 1280  # OpenWakeWord scores audio in 80 ms steps (16 kHz)
+
+
+class WakeFrameAligner:
+    """
+    Cuts the capture stream into the wake engine's frame size (Porcupine frame_length, 512; OpenWakeWord 1280).
+    Samples left over at the end of a chunk are carried into the next one instead of being dropped, so a
+    1280-sample chunk and 512-sample frames lose nothing at the seams. Frames are contiguous int16 arrays:
+    views into the chunk where possible, and a small copy only for the frame that spans two chunks.
+    """
+
+    def __init__(self, frame_length: int):
+        self.frame_length = int(frame_length)
+        self._carry = np.empty(self.frame_length, dtype=np.int16)
+        self._fill = 0
+        self.frames = 0
+        self.carried = 0  # frames stitched together from two chunks
+
+    @property
+    def pending(self) -> int:
+        """Samples carried over, waiting for the rest of their frame."""
+        return self._fill
+
+    def reset(self) -> None:
+        """Drop carried samples (the stream is discontinuous, e.g. after resync)."""
+        self._fill = 0
+
+    def _take(self, audio: np.ndarray) -> tuple[list, np.ndarray]:
+        fl = self.frame_length
+        audio = np.ascontiguousarray(audio, dtype=np.int16)
+        head = []
+        if self._fill:
+            take = min(fl - self._fill, len(audio))
+            self._carry[self._fill : self._fill + take] = audio[:take]
+            self._fill += take
+            audio = audio[take:]
+            if self._fill < fl:
+                return head, audio[:0]
+            head.append(self._carry)
+            self._carry = np.empty(fl, dtype=np.int16)
+            self._fill = 0
+            self.carried += 1
+        whole = len(audio) - len(audio) % fl
+        rest = len(audio) - whole
+        if rest:
+            self._carry[:rest] = audio[whole:]
+            self._fill = rest
+        return head, audio[:whole]
+
+    def feed(self, audio: np.ndarray) -> list:
+        """Frames completed by this chunk, in order."""
+        head, body = self._take(audio)
+        fl = self.frame_length
+        frames = head + [body[i : i + fl] for i in range(0, len(body), fl)]
+        self.frames += len(frames)
+        return frames
+
+    def feed_block(self, audio: np.ndarray) -> np.ndarray:
+        """Same samples as feed(), as one contiguous block of whole frames (for batch inference)."""
+        head, body = self._take(audio)
+        block = np.concatenate(head + [body]) if head else body
+        self.frames += len(block) // self.frame_length
+        return block
+
+
+def wake_frame_aligner(model) -> WakeFrameAligner:
+    return WakeFrameAligner(getattr(model, "frame_length", None) or OWW_FRAME_SAMPLES)
+
+
+def _porcupine_process(model, frame: np.ndarray) -> int:
+    """Porcupine.process without building a Python list and a ctypes array per frame."""
+    process = getattr(model, "_process_func", None)
+    handle = getattr(model, "_handle", None)
+    if process is None or handle is None:
+        return model.process(frame.tolist())
+    result = ctypes.c_int()
+    status = process(handle, frame.ctypes.data_as(ctypes.POINTER(ctypes.c_short)), ctypes.byref(result))
+    if status is not model.PicovoiceStatuses.SUCCESS:
+        return model.process(frame.tolist())  # let pvporcupine raise its own error
+    return result.value
+
+
+def find_wake(
+    audio: np.ndarray, model, config: dict, aligner: WakeFrameAligner | None = None, info: dict | None = None
+) -> int | None:
+    """Run the wake model over audio; None, or the offset in audio where the detecting frame ended.
+    Reuse one aligner per stream; on a detection info["score"] gets the model's score (Porcupine: 1.0)."""
     if model is None:
-        return False
-    # Porcupine: expects frames of model.frame_length (e.g. 512); our chunk may be 1280
+        return None
+    if aligner is None:
+        aligner = wake_frame_aligner(model)
+    # Porcupine: fixed frames of model.frame_length (512); no batch API. Offsets are frame-exact.
     if HAS_PORCUPINE and hasattr(model, "frame_length"):
         try:
-            fl = model.frame_length
-            # Feed our chunk in frame_length-sized pieces
-            for i in range(0, len(audio) - fl + 1, fl):
-                frame = audio[i : i + fl]
-                if len(frame) != fl:
-                    break
-                idx = model.process(frame.tolist())
-                if idx >= 0:
-                    return True
+            end = -aligner.pending
+            for frame in aligner.feed(audio):
+                end += len(frame)
+                if _porcupine_process(model, frame) >= 0:
+                    if info is not None:
+                        info["score"] = 1.0
+                    return end
         except Exception:
             pass
-        return False
-    # OpenWakeWord
+        return None
+    # OpenWakeWord: one predict() over all whole 80 ms steps; it returns the max score across them, so
+    # the offset is the end of the first step (earliest it can have fired; trimming there never cuts speech)
     try:
-        pred = model.predict(audio)
+        first = max(0, OWW_FRAME_SAMPLES - aligner.pending)
+        block = aligner.feed_block(audio)
+        if len(block) == 0:
+            return None
+        pred = model.predict(block)
         thresh = config.get("wakeword_threshold", 0.5)
         for scores in pred.values():
-            if isinstance(scores, (list, tuple)) and scores and scores[-1] > thresh:
-                return True
-            if isinstance(scores, (int, float)) and scores > thresh:
-                return True
+            if isinstance(scores, (list, tuple)) and scores:
+                scores = scores[-1]
+            if isinstance(scores, (int, float, np.floating)) and scores > thresh:
+                if info is not None:
+                    info["score"] = float(scores)
+                return first
     except Exception:
         pass
-    return False
+    return None
+
+
+def check_wake(audio: np.ndarray, model, config: dict, aligner: WakeFrameAligner | None = None) -> bool:
+    """True if the wake word is in audio (see find_wake)."""
+    return find_wake(audio, model, config, aligner) is not None
+
+
+class WakeGate:
+    """Cheap first stage of the wake cascade: is anything speech-like in this chunk (wake_gate "energy" or "flux")?
+    The neural model only runs while the gate is open, and for wake_gate_hold_seconds after."""
+
+    fft_size = 256
+
+    def __init__(self, mode: str, config: dict):
+        self.mode = mode
+        self.chunk = config["chunk_samples"]
+        self.ratio = float(config.get("wake_gate_ratio", 3.0))
+        self.min_rms = float(config.get("wake_gate_min_rms", 0.005))
+        self.hold_samples = int(float(config.get("wake_gate_hold_seconds", 1.5)) * config["sample_rate"])
+        self.window = np.hanning(self.fft_size).astype(np.float32)
+        self.prev_mag = None
+        self.floor = None
+        self.quiet_samples = self.hold_samples  # start closed
+        self.seconds = 0.0
+
+    def _flux(self, x: np.ndarray) -> np.ndarray:
+        n, chunk = x.shape
+        per = chunk // self.fft_size
+        frames = x[:, : per * self.fft_size].reshape(n * per, self.fft_size)
+        mag = np.abs(np.fft.rfft(frames * self.window, axis=1))
+        prev = mag[:1] if self.prev_mag is None else self.prev_mag[None, :]
+        self.prev_mag = mag[-1]
+        rise = np.maximum(np.diff(np.concatenate([prev, mag]), axis=0), 0.0).sum(axis=1)
+        return rise.reshape(n, per).mean(axis=1)
+
+    def check(self, audio: np.ndarray) -> bool:
+        """Feed whole chunks; True if the gate is open for any of them."""
+        t0 = time.monotonic()
+        n = len(audio) // self.chunk
+        x = audio[: n * self.chunk].astype(np.float32).reshape(n, self.chunk) / 32768.0
+        energy = np.sqrt((x * x).mean(axis=1))
+        levels = self._flux(x) if self.mode == "flux" else energy
+        is_open = False
+        for level, loud in zip(levels.tolist(), (energy >= self.min_rms).tolist()):
+            if self.floor is None:
+                self.floor = level
+            active = loud and level > self.ratio * self.floor
+            # Floor follows quiet chunks quickly and drifts up slowly; while active it still creeps up
+            # (~12 s to absorb a step), so a fan or TV switching on can't hold the gate open for good
+            if level < self.floor:
+                self.floor += (level - self.floor) * 0.5
+            else:
+                self.floor += (level - self.floor) * (0.0025 if active else 0.01)
+            self.floor = max(self.floor, 1e-6)
+            self.quiet_samples = 0 if active else self.quiet_samples + self.chunk
+            is_open = is_open or self.quiet_samples < self.hold_samples
+        self.seconds += time.monotonic() - t0
+        return is_open
+
+
+def create_wake_gate(config: dict) -> WakeGate | None:
+    mode = (config.get("wake_gate") or "off").strip().lower()
+    if mode in ("", "off", "none"):
+        return None
+    if mode not in ("energy", "flux"):
+        print(f"Warning: unknown wake_gate {mode!r}; gate off.", file=sys.stderr)
+        return None
+    return WakeGate(mode, config)
+
+
+class WakeConsumer:
+    """
+    Feeds every captured chunk to check_wake exactly once, in order.
+    The audio callback calls notify() after each ring.push(); wait_for_wake() drains the ring from its own
+    sequence cursor, so scheduler jitter can delay a chunk but never skip or repeat it. A WakeFrameAligner
+    keeps the engine's frames continuous across chunks; when several chunks are waiting, up to
+    wake_batch_max_chunks of them go to check_wake together (one OpenWakeWord predict()).
+    With a WakeGate (wake_gate), chunks the gate rejects skip check_wake; when it opens again, the last
+    wake_gate_lookback_seconds of skipped audio go to the model first so the start of the phrase isn't lost.
+    Counters: processed (chunks checked), dropped (chunks overwritten before we got to them),
+    late (chunks checked while at least one newer chunk was already waiting).
+    """
+
+    def __init__(self, ring: RingBuffer, chunk_samples: int, model, config: dict):
+        self.ring = ring
+        self.chunk = chunk_samples
+        self.model = model
+        self.config = config
+        self.seq = ring.write_seq
+        self.data_ready = threading.Event()
+        self.processed = 0
+        self.dropped = 0
+        self.late = 0
+        self.busy_seconds = 0.0
+        self.batches = 0
+        self.batch_max = max(1, int(config.get("wake_batch_max_chunks", 4)))
+        self.aligner = wake_frame_aligner(model)
+        self.gate = create_wake_gate(config)
+        self.lookback = int(float(config.get("wake_gate_lookback_seconds", 0.5)) * config["sample_rate"])
+        self.skipped = 0
+        self.gated = False
+        self.infer_seconds = 0.0
+        self.inferred = 0
+        self.wake_end_seq = None  # ring sequence number where the last detected phrase ended
+        self.wake_score = None
+        self.on_chunk = None
+
+    def notify(self) -> None:
+        self.data_ready.set()
+
+    def resync(self) -> None:
+        """Skip audio captured while we were not listening (e.g. waiting on a wake arbiter); not counted as dropped."""
+        self.seq = self.ring.write_seq
+        self.aligner.reset()
+
+    def wait_for_wake(self, stop_event: threading.Event | None = None) -> bool:
+        """Block until a wake word is detected (True) or stop_event is set (False)."""
+        while stop_event is None or not stop_event.is_set():
+            self.data_ready.wait(timeout=0.2)
+            self.data_ready.clear()
+            while self.ring.write_seq - self.seq >= self.chunk:
+                n = min(self.batch_max, (self.ring.write_seq - self.seq) // self.chunk)
+                view = self.ring.since(self.seq, n * self.chunk)
+                if view.start_seq > self.seq:
+                    self.dropped += -(-(view.start_seq - self.seq) // self.chunk)
+                    self.aligner.reset()
+                self.seq = view.end_seq
+                n = len(view) // self.chunk
+                if n == 0:
+                    continue
+                if self.ring.write_seq - self.seq >= self.chunk:
+                    self.late += n
+                else:
+                    self.late += n - 1
+                self.processed += n
+                self.batches += 1
+                t0 = time.monotonic()
+                audio = view.array()[: n * self.chunk]
+                if self.on_chunk is not None:
+                    for i in range(0, len(audio), self.chunk):
+                        self.on_chunk(audio[i : i + self.chunk])
+                if self.gate is not None and not self.gate.check(audio):
+                    self.skipped += n
+                    self.gated = True
+                    self.busy_seconds += time.monotonic() - t0
+                    continue
+                audio_seq = view.start_seq
+                if self.gated:
+                    # Gate just opened: replay the look-back first, from a clean frame boundary
+                    self.gated = False
+                    self.aligner.reset()
+                    start = view.start_seq - self.lookback
+                    back = self.ring.since(start, view.start_seq - start)
+                    if len(back) and back.end_seq <= view.start_seq:
+                        audio = np.concatenate([back.array(), audio])
+                        audio_seq = back.start_seq
+                t1 = time.monotonic()
+                info = {}
+                end = find_wake(audio, self.model, self.config, self.aligner, info)
+                woke = end is not None
+                if woke:
+                    self.wake_end_seq = audio_seq + end
+                    self.wake_score = info.get("score")
+                self.infer_seconds += time.monotonic() - t1
+                self.inferred += n
+                self.busy_seconds += time.monotonic() - t0
+                if not view.intact():
+                    self.ring.torn_reads += 1
+                if woke:
+                    return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "late": self.late,
+            "backlog": (self.ring.write_seq - self.seq) // self.chunk,
+            "busy_s": round(self.busy_seconds, 2),
+            "batches": self.batches,
+            "frames": self.aligner.frames,
+            **({"gate": self.gate_stats()} if self.gate is not None else {}),
+        }
+
+    def gate_stats(self) -> dict:
+        """Skip ratio and CPU saved, estimated from the measured cost of the chunks that did run the model."""
+        per_chunk = self.infer_seconds / self.inferred if self.inferred else 0.0
+        total = self.skipped + self.inferred
+        return {
+            "mode": self.gate.mode,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / total, 3) if total else None,
+            "gate_s": round(self.gate.seconds, 3),
+            "infer_ms_per_chunk": round(per_chunk * 1000, 2),
+            "est_cpu_saved_s": round(self.skipped * per_chunk - self.gate.seconds, 2),
+        }
+
+
+# -----------------------------------------------------------------------------
+# Wake arbitration: several nodes hear one wake word, only the best-placed one answers
+# -----------------------------------------------------------------------------
+
+def wake_snr_db(audio: np.ndarray, frame: int, phrase_samples: int) -> float | None:
+    """How far the wake phrase (the last phrase_samples of audio) stands above the noise before it, in dB;
+    None without at least a few frames of each."""
+    n = len(audio) // frame
+    split = n - phrase_samples // frame
+    if split < 3 or n - split < 3:
+        return None
+    x = audio[len(audio) - n * frame :].astype(np.float32).reshape(n, frame) / 32768.0
+    levels = np.sqrt((x * x).mean(axis=1))
+    noise = max(float(np.percentile(levels[:split], 20)), 1e-5)
+    return 20.0 * float(np.log10(max(float(np.percentile(levels[split:], 90)), 1e-5) / noise))
+
+
+class WakeArbiter:
+    """Client of the wake arbiter (scripts/voice-node-arbiter.py, UDP on wake_arbiter = "host:port").
+    claim() asks whether this node answers the wake word; see wake_arbiter_* for timeout and fail-open."""
+
+    resend_seconds = 0.2
+
+    def __init__(self, address: str, config: dict):
+        host, _, port = address.strip().rpartition(":")
+        self.address = (host or "127.0.0.1", int(port))
+        self.node = config.get("node_id") or f"{socket.gethostname()}:{os.getpid()}"
+        self.timeout = float(config.get("wake_arbiter_timeout_seconds", 1.0))
+        self.fail_open = bool(config.get("wake_arbiter_fail_open", True))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.seq = 0
+        self.won = 0
+        self.lost = 0
+        self.timeouts = 0
+        self.last_winner = None
+        self.wait_ms = deque(maxlen=50)
+
+    def claim(self, score: float | None, snr_db: float | None, replying: bool = False) -> bool:
+        """Ask whether this node should answer the wake word it just heard (blocks for the arbiter's window)."""
+        self.seq += 1
+        claim_id = f"{self.node}/{self.seq}"
+        msg = json.dumps(
+            {"id": claim_id, "node": self.node, "score": score, "snr": snr_db, "replying": replying}
+        ).encode()
+        t0 = time.monotonic()
+        deadline = t0 + self.timeout
+        verdict = None
+        while verdict is None and time.monotonic() < deadline:
+            try:
+                self.sock.sendto(msg, self.address)
+            except OSError:
+                pass
+            resend = min(deadline, time.monotonic() + self.resend_seconds)
+            while verdict is None and (wait := resend - time.monotonic()) > 0:
+                self.sock.settimeout(wait)
+                try:
+                    data, _ = self.sock.recvfrom(4096)
+                    reply = json.loads(data)
+                except (OSError, ValueError):  # timeout, refused, garbage
+                    break
+                if isinstance(reply, dict) and reply.get("id") == claim_id:
+                    verdict = reply
+        self.wait_ms.append((time.monotonic() - t0) * 1000)
+        if verdict is None:
+            self.timeouts += 1
+            print(
+                f"[arbiter] no verdict from {self.address[0]}:{self.address[1]} in {self.timeout:.1f}s; "
+                f"{'answering anyway' if self.fail_open else 'staying quiet'}",
+                file=sys.stderr,
+            )
+            return self.fail_open
+        self.last_winner = verdict.get("winner")
+        if verdict.get("win"):
+            self.won += 1
+            return True
+        self.lost += 1
+        return False
+
+    def stats(self) -> dict:
+        wait = sorted(self.wait_ms)
+        return {
+            "node": self.node,
+            "won": self.won,
+            "lost": self.lost,
+            "timeouts": self.timeouts,
+            "median_wait_ms": round(wait[len(wait) // 2], 1) if wait else None,
+            "max_wait_ms": round(wait[-1], 1) if wait else None,
+        }
 
 
 # -----------------------------------------------------------------------------
 # STT
 # -----------------------------------------------------------------------------
 
+_WHISPER_PY_MODELS: dict = {}
+_WHISPER_PY_LOCK = threading.Lock()
+
+
+def _whisper_python_model(config: dict):
+    """Load the Python whisper model once per process (keyed by name)."""
+    name = (config.get("whisper_python_model") or "base").strip()
+    with _WHISPER_PY_LOCK:
+        model = _WHISPER_PY_MODELS.get(name)
+        if model is None:
+            import whisper
+            model = whisper.load_model(name)
+            _WHISPER_PY_MODELS[name] = model
+    return model
+
+
+def wav_bytes(audio: np.ndarray, sample_rate: int) -> bytes:
+    """16-bit mono WAV in memory (header + PCM), for backends that want a WAV but not a file."""
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.ascontiguousarray(audio, dtype=np.int16).tobytes())
+    return buf.getvalue()
+
+
+def write_temp_wav(audio: np.ndarray, sample_rate: int) -> str:
+    """Write audio to a temp WAV file and return its path (caller unlinks). File-input fallback only."""
+    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+        f.write(wav_bytes(audio, sample_rate))
+        return f.name
+
+
+def _unlink_quiet(path: str) -> None:
+    try:
+        os.unlink(path)
+    except Exception:
+        pass
+
+
+_CLI_TIMESTAMP = re.compile(r"^\[[^\]]*\]\s*")
+
+
+def _parse_cli_stdout(stdout: str) -> str:
+    """Transcript from whisper-cli stdout: drop timestamp prefixes and log lines, join segments."""
+    lines = []
+    for line in (stdout or "").splitlines():
+        line = line.strip()
+        if line.startswith("[") and "-->" in line:
+            line = _CLI_TIMESTAMP.sub("", line)
+        elif line.startswith("["):
+            continue
+        if line:
+            lines.append(line)
+    return " ".join(lines)[:2000]
+
+
+def _read_cli_output(audio_path: str, stdout: str) -> str:
+    # whisper-cli -otxt often writes to <audio_path>.txt; prefer that over stdout
+    txt_path = audio_path + ".txt"
+    if os.path.isfile(txt_path):
+        try:
+            with open(txt_path, "r") as f:
+                text = f.read().strip()[:2000]
+            try:
+                os.unlink(txt_path)
+            except Exception:
+                pass
+            return text
+        except Exception:
+            pass
+    # Else parse stdout
+    for line in (stdout or "").splitlines():
+        line = line.strip()
+        if line and not line.startswith("["):
+            return line[:2000]
+    return (stdout or "").strip()[:2000]
+
+
 def transcribe(audio_path: str, config: dict) -> str:
     cmd = (config.get("whisper_cmd") or "").strip()
     if cmd:
@@ -299,33 +1214,13 @@ def transcribe(audio_path: str, config: dict) -> str:
             out = subprocess.run(args, capture_output=True, text=True, timeout=60)
             if out.returncode != 0:
                 return ""
-            # whisper-cli -otxt often writes to <audio_path>.txt; prefer that over stdout
-            txt_path = audio_path + ".txt"
-            if os.path.isfile(txt_path):
-                try:
-                    with open(txt_path, "r") as f:
-                        text = f.read().strip()[:2000]
-                    try:
-                        os.unlink(txt_path)
-                    except Exception:
-                        pass
-                    return text
-                except Exception:
-                    pass
-            # Else parse stdout
-            for line in (out.stdout or "").splitlines():
-                line = line.strip()
-                if line and not line.startswith("["):
-                    return line[:2000]
-            return (out.stdout or "").strip()[:2000]
+            return _read_cli_output(audio_path, out.stdout)
         except Exception as e:
             print(f"Whisper command failed: {e}", file=sys.stderr)
             return ""
     if config.get("whisper_python"):
         try:
-            import whisper
-            model = whisper.load_model("base")
-            r = model.transcribe(audio_path, fp16=False)
+            r = _whisper_python_model(config).transcribe(audio_path, fp16=False)
             return (r.get("text") or "").strip()[:2000]
         except Exception as e:
             print(f"Whisper Python failed: {e}", file=sys.stderr)
@@ -333,269 +1228,2348 @@ def transcribe(audio_path: str, config: dict) -> str:
     return ""
 
 
-# -----------------------------------------------------------------------------
-# Gateway (streaming) + TTS
-# -----------------------------------------------------------------------------
+class STTJob:
+    """One transcription request: in-memory int16 PCM (audio) or, for the file fallback, a WAV path."""
 
-def strip_wake_phrase_from_text(text: str, wake_phrase: str) -> str:
-    """Remove wake phrase (and common variants) from the start of the transcript."""
-    if not text or not (text := text.strip()):
-        return ""
-    lower = text.lower()
-    # Try exact wake phrase (e.g. "Hey JARVIS") then "hey jarvis", then "jarvis"
-    for prefix in (
-        wake_phrase.strip(),
-        "hey jarvis",
-        "jarvis",
-    ):
-        if not prefix:
-            continue
-        if lower.startswith(prefix.lower()):
-            rest = text[len(prefix) :].lstrip(" ,")
-            return rest
-    return text
+    def __init__(self, audio, sample_rate: int = 16000):
+        if isinstance(audio, str):
+            self.audio, self.audio_path = None, audio
+        else:
+            self.audio, self.audio_path = audio, None
+        self.sample_rate = sample_rate
+        self.text = ""
+        self.error = ""
+        self.cancelled = False
+        self.done = threading.Event()
 
+    def cancel(self) -> None:
+        self.cancelled = True
 
-def strip_for_tts(text: str) -> str:
-    if not text:
-        return ""
-    text = re.sub(r"```[\s\S]*?```", " ", text)
-    text = re.sub(r"`[^`]+`", " ", text)
-    text = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", text)
-    text = re.sub(r"\*\*([^*]+)\*\*", r"\1", text)
-    text = re.sub(r"\*([^*]+)\*", r"\1", text)
-    text = re.sub(r"\n+", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
-    return text[:3000]
 
+class WhisperServerBackend:
+    """Managed whisper.cpp `whisper-server` child: loads the model once and serves POST /inference.
+    Started from whisper_server_cmd, restarted if it exits or stops answering."""
 
-def stream_and_speak(
-    gateway_url: str,
-    agent_id: str,
-    messages: list[dict],
-    system_prompt: str,
-    tts_fifo_path: str,
-    barge_signal: str,
-    stop_tts_event: threading.Event,
-    config: dict,
-) -> str:
-    """Stream reply from gateway and send sentences to TTS FIFO. Returns full reply text."""
-    url = f"{gateway_url.rstrip('/')}/v1/chat/completions"
-    headers = {"Content-Type": "application/json", "x-openclaw-agent-id": agent_id}
-    payload = {
-        "model": "openclaw:main",
-        "messages": [{"role": "system", "content": system_prompt}] + messages,
-        "stream": True,
-        "user": "voice-node",
-    }
-    sentence_end = re.compile(r"[.!?]\s*")
-    buf = []
-    full_text = []
-    fifo = None
-    try:
-        if os.path.exists(tts_fifo_path):
-            fifo = open(tts_fifo_path, "w")
-    except Exception as e:
-        print(f"TTS FIFO open failed: {e}", file=sys.stderr)
-    try:
-        with requests.Session() as s:
-            r = s.post(url, headers=headers, json=payload, stream=True, timeout=30)
-            r.raise_for_status()
-            for line in r.iter_lines():
-                if stop_tts_event.is_set():
-                    break
-                if not line or not line.strip().startswith(b"data:"):
-                    continue
-                try:
-                    raw = line.split(b"data:", 1)[1].strip()
-                    if raw == b"[DONE]":
-                        break
-                    data = json.loads(raw)
-                    delta = (data.get("choices") or [{}])[0].get("delta", {})
-                    content = delta.get("content")
-                    if not content:
-                        continue
-                    buf.append(content)
-                    full_text.append(content)
-                    text = "".join(buf)
-                    parts = sentence_end.split(text)
-                    if len(parts) > 1:
-                        for sent in parts[:-1]:
-                            sent = strip_for_tts(sent.strip())
-                            if sent and fifo:
-                                fifo.write(sent + "\n")
-                                fifo.flush()
-                        buf = [parts[-1]]
-                except Exception:
-                    continue
-            if buf and fifo and not stop_tts_event.is_set():
-                remainder = strip_for_tts("".join(buf).strip())
-                if remainder:
-                    fifo.write(remainder + "\n")
-                    fifo.flush()
-    except Exception as e:
-        print(f"Gateway/TTS error: {e}", file=sys.stderr)
-    finally:
-        if fifo:
-            try:
-                fifo.close()
-            except Exception:
-                pass
-    return "".join(full_text).strip()
+    def __init__(self, config: dict):
+        self.cmd = os.path.expandvars(config["whisper_server_cmd"]).split()
+        self.url = (config.get("whisper_server_url") or "http://127.0.0.1:8178").rstrip("/")
+        self.startup_timeout = float(config.get("whisper_server_startup_seconds", 60))
+        self.proc = None
+        self.session = requests.Session()
 
+    def start(self) -> None:
+        self.stop()
+        self.proc = subprocess.Popen(self.cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"whisper-server exited with code {self.proc.returncode}")
+            try:
+                self.session.get(self.url + "/", timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.25)
+        raise RuntimeError(f"whisper-server not answering at {self.url} after {self.startup_timeout:.0f}s")
 
-# -----------------------------------------------------------------------------
-# Main loop
-# -----------------------------------------------------------------------------
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
 
-def main() -> None:
-    config = load_config()
-    sr = config["sample_rate"]
-    chunk = config["chunk_samples"]
-    ring_len = int(config["ring_buffer_seconds"] * sr)
-    wake_phrase = config["wake_phrase"]
+    def transcribe(self, job: STTJob, timeout: float) -> str:
+        if job.audio_path:
+            with open(job.audio_path, "rb") as f:
+                data = f.read()
+        else:
+            data = wav_bytes(job.audio, job.sample_rate)
+        r = self.session.post(
+            self.url + "/inference",
+            files={"file": ("audio.wav", data, "audio/wav")},
+            data={"response_format": "json", "temperature": "0.0"},
+            timeout=timeout,
+        )
+        r.raise_for_status()
+        return (r.json().get("text") or "").strip()[:2000]
 
-    if not HAS_SOUNDDEVICE:
-        print("Install sounddevice and start PulseAudio (see PIXEL_VOICE_RUNBOOK.md).", file=sys.stderr)
-        sys.exit(1)
-    # Wake word: OpenWakeWord (needs onnxruntime) or Porcupine (Termux-friendly). Else manual trigger.
-    manual_trigger = os.environ.get("VOICE_NODE_MANUAL_TRIGGER", "").lower() in ("1", "true", "yes")
-    wake_model = create_wake_model(config)
-    if wake_model is None and not manual_trigger:
-        print("No wake word engine available. Install openwakeword (+ onnxruntime) or pvporcupine (see PIXEL_WAKE_WORD_OPTIONS.md).", file=sys.stderr)
-        print("Or run with VOICE_NODE_MANUAL_TRIGGER=1 for press-Enter-to-record.", file=sys.stderr)
-        sys.exit(1)
-    if wake_model is None:
-        manual_trigger = True
-    ring = RingBuffer(ring_len)
-    tts_stop = threading.Event()
-    # Queue for record_until_silence (chunks from stream callback); cap to ~16s
-    import queue
-    chunk_queue = queue.Queue(maxsize=200)
+    def cancel(self) -> None:
+        # An in-flight decode can't be aborted over HTTP; a restart is the only way to free the server.
+        self.stop()
 
-    def audio_callback(indata, frames, time_info, status):
-        if status:
-            print(status, file=sys.stderr)
-        if frames == chunk and indata is not None:
-            ring.push(indata[:, 0].astype(np.int16))
+    def stop(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
             try:
-                chunk_queue.put_nowait(indata[:, 0].astype(np.int16).copy())
-            except queue.Full:
-                try:
-                    chunk_queue.get_nowait()
-                except queue.Empty:
-                    pass
-                try:
-                    chunk_queue.put_nowait(indata[:, 0].astype(np.int16).copy())
-                except queue.Full:
-                    pass
-
-    stream = sd.InputStream(
-        samplerate=sr,
-        channels=1,
-        dtype="int16",
-        blocksize=chunk,
-        callback=audio_callback,
-    )
-    stream.start()
-    if manual_trigger:
-        print(f"Voice node: manual mode (press Enter to record). Gateway {config['gateway_url']}", flush=True)
+                self.proc.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+
+def _whisper_python_transcribe(model, audio, sample_rate: int, audio_path: str | None) -> str:
+    if audio is not None and sample_rate == 16000:
+        # whisper takes float32 PCM at 16 kHz directly; no ffmpeg decode of a temp file
+        r = model.transcribe(audio.astype(np.float32) / 32768.0, fp16=False)
+    elif audio is not None:
+        path = write_temp_wav(audio, sample_rate)
+        try:
+            r = model.transcribe(path, fp16=False)
+        finally:
+            _unlink_quiet(path)
     else:
-        print(f"Voice node: listening for '{wake_phrase}' (gateway {config['gateway_url']})", flush=True)
-    conversation = []
+        r = model.transcribe(audio_path, fp16=False)
+    return (r.get("text") or "").strip()[:2000]
+
 
+def _whisper_python_child(conn, config: dict) -> None:
+    """WhisperPythonBackend's child process: load the model once, then answer (audio, rate, path) requests."""
     try:
-        while True:
-            if manual_trigger:
-                try:
-                    input("Press Enter to record... ")
-                except EOFError:
-                    break
-                print("Recording... (speak now; silence ends)", flush=True)
-                pre_roll = ring.get_all()
-                record_stop = threading.Event()
-                while not chunk_queue.empty():
-                    try:
-                        chunk_queue.get_nowait()
-                    except queue.Empty:
-                        break
-                recorded = record_until_silence(stream, config, record_stop, chunk_queue)
-            else:
-                # Get latest chunk from ring (same as what we push in callback)
-                time.sleep(chunk / sr)
-                latest = np.zeros(chunk, dtype=np.int16)
-                all_buf = ring.get_all()
-                if len(all_buf) >= chunk:
-                    latest[:] = all_buf[-chunk:]
+        model = _whisper_python_model(config)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", None))
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        try:
+            conn.send(("text", _whisper_python_transcribe(model, *request)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class WhisperPythonBackend:
+    """Python whisper in a child process that loads the model once; cancel() kills the child."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.proc = None
+        self.conn = None
+
+    def start(self) -> None:
+        self.stop()
+        # spawn, not fork: the node has audio and network threads a forked child would inherit mid-flight
+        ctx = multiprocessing.get_context("spawn")
+        parent, child = ctx.Pipe()
+        proc = ctx.Process(target=_whisper_python_child, args=(child, self.config), name="whisper-python", daemon=True)
+        try:
+            proc.start()
+        finally:
+            child.close()
+        self.proc, self.conn = proc, parent
+        kind, value = self._recv()
+        if kind != "ready":
+            self.stop()
+            raise RuntimeError(f"whisper model failed to load: {value}")
+
+    def _recv(self) -> tuple:
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError):
+            code = self.proc.exitcode if self.proc is not None else None
+            raise RuntimeError(f"whisper child exited (code {code})") from None
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.is_alive()
+
+    def transcribe(self, job: STTJob, timeout: float) -> str:
+        self.conn.send((job.audio, job.sample_rate, job.audio_path))
+        kind, value = self._recv()
+        if kind != "text":
+            raise RuntimeError(value)
+        return value
+
+    def cancel(self) -> None:
+        proc = self.proc
+        if proc is not None and proc.is_alive():
+            proc.kill()
+
+    def stop(self) -> None:
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        proc = self.proc
+        if proc is not None:
+            proc.join(timeout=3)
+            if proc.is_alive():
+                proc.kill()
+                proc.join(timeout=3)
+        if self.conn is not None:
+            self.conn.close()
+        self.proc = None
+        self.conn = None
+
+
+class WhisperCliBackend:
+    """whisper_cmd per utterance (reloads the model every time); kept as the fallback, but cancellable.
+    With stt_input: memory the WAV goes on stdin, else (or if the binary refuses it) through a temp file."""
+
+    def __init__(self, config: dict):
+        self.parts = config["whisper_cmd"].split()
+        # Same command for stdin: no -otxt (it would write "-.txt"), no timestamps on stdout
+        self.stdin_parts = [p for p in self.parts if p not in ("-otxt", "--output-txt")]
+        if "-nt" not in self.stdin_parts and "--no-timestamps" not in self.stdin_parts:
+            self.stdin_parts.insert(1, "-nt")
+        self.use_stdin = (config.get("stt_input") or "memory").strip().lower() == "memory"
+        self.proc = None
+
+    def start(self) -> None:
+        pass
+
+    def alive(self) -> bool:
+        return True
+
+    def _run(self, args: list, job: STTJob, timeout: float, stdin_data: bytes | None) -> tuple:
+        self.proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE if stdin_data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            stdout, _ = self.proc.communicate(input=stdin_data, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.communicate()
+            raise
+        finally:
+            code, self.proc = self.proc.returncode, None
+        return code, (stdout or b"").decode("utf-8", errors="replace")
+
+    def transcribe(self, job: STTJob, timeout: float) -> str:
+        stdin_failed = False
+        if job.audio is not None and self.use_stdin:
+            code, stdout = self._run(self.stdin_parts + ["-"], job, timeout, wav_bytes(job.audio, job.sample_rate))
+            if code == 0:
+                return _parse_cli_stdout(stdout)
+            if job.cancelled:
+                return ""
+            stdin_failed = True
+        path = job.audio_path or write_temp_wav(job.audio, job.sample_rate)
+        try:
+            code, stdout = self._run(self.parts + [path], job, timeout, None)
+            if code != 0:
+                if job.cancelled:
+                    return ""
+                raise RuntimeError(f"whisper_cmd exited with code {code}")
+            if stdin_failed:
+                # Only blame stdin once the same audio transcribes from a file
+                print("whisper_cmd does not accept stdin audio; using temp WAV files.", file=sys.stderr)
+                self.use_stdin = False
+            return _read_cli_output(path, stdout)
+        finally:
+            if not job.audio_path:
+                _unlink_quiet(path)
+                _unlink_quiet(path + ".txt")
+
+    def cancel(self) -> None:
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def stop(self) -> None:
+        self.cancel()
+
+
+def create_stt_backend(config: dict):
+    if (config.get("whisper_server_cmd") or "").strip():
+        return WhisperServerBackend(config)
+    if (config.get("whisper_cmd") or "").strip():
+        return WhisperCliBackend(config)
+    if config.get("whisper_python"):
+        return WhisperPythonBackend(config)
+    return None
+
+
+class STTWorker:
+    """Long-lived STT thread: loads the model once and serves jobs from a queue.
+    A job past stt_timeout_seconds is cancelled and the backend restarted."""
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.timeout = float(config.get("stt_timeout_seconds", 60))
+        self.max_restarts = int(config.get("stt_max_restarts", 5))
+        self.backend = create_stt_backend(config)
+        self.jobs = queue.Queue()
+        self.current = None
+        self.ready = False
+        self.restarts = 0
+        self.failures = 0
+        self._thread = None
+
+    def start(self) -> None:
+        if self.backend is None or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="stt-worker", daemon=True)
+        self._thread.start()
+
+    def _ensure_backend(self) -> bool:
+        if self.ready and self.backend.alive():
+            return True
+        if self.failures > self.max_restarts:
+            return False
+        if self.ready:
+            self.restarts += 1
+            print("STT backend died; restarting.", file=sys.stderr)
+        try:
+            t0 = time.monotonic()
+            self.backend.start()
+            self.ready = True
+            print(f"STT ready ({type(self.backend).__name__}, {time.monotonic() - t0:.1f}s)", file=sys.stderr)
+            return True
+        except Exception as e:
+            self.ready = False
+            self.failures += 1
+            print(f"STT backend failed to start: {e}", file=sys.stderr)
+            return False
+
+    def _run(self) -> None:
+        self._ensure_backend()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            if job.cancelled:
+                job.done.set()
+                continue
+            self.current = job
+            try:
+                if not self._ensure_backend():
+                    job.error = "STT backend unavailable"
                 else:
+                    job.text = self.backend.transcribe(job, self.timeout)
+                    self.failures = 0
+            except Exception as e:
+                job.error = str(e)
+                if not job.cancelled:
+                    self.failures += 1
+                    self.ready = False
+                    print(f"STT job failed: {e}", file=sys.stderr)
+            finally:
+                self.current = None
+                job.done.set()
+        self.backend.stop()
+
+    def submit(self, audio, sample_rate: int = 16000) -> STTJob:
+        self.start()
+        job = STTJob(audio, sample_rate)
+        self.jobs.put(job)
+        return job
+
+    def cancel(self, job: STTJob) -> None:
+        job.cancel()
+        if self.current is job:
+            self.backend.cancel()
+            self.ready = False
+
+    def transcribe(self, audio, sample_rate: int = 16000) -> str:
+        """Transcribe int16 PCM (preferred, no filesystem round trip) or a WAV file path."""
+        if self.backend is None:
+            return ""
+        job = self.submit(audio, sample_rate)
+        if not job.done.wait(self.timeout):
+            print(f"STT timed out after {self.timeout:.0f}s; cancelling.", file=sys.stderr)
+            self.cancel(job)
+            return ""
+        return job.text
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self.jobs.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+        elif self.backend is not None:
+            self.backend.stop()
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "restarts": self.restarts, "failures": self.failures}
+
+    def idle(self) -> bool:
+        return self.current is None and self.jobs.empty()
+
+
+class StreamingTranscriber:
+    """
+    Incremental STT while the user is still speaking (stt_streaming: true).
+    Recorded audio is cut into segments at VAD pauses; each closed segment goes to the STT worker
+    immediately, and while the worker is otherwise idle the open segment is re-decoded every
+    stt_partial_interval_seconds to emit a partial hypothesis (on_partial(text)). After end of speech
+    only the last segment is still to decode, so the post-speech wait no longer scales with utterance length.
+    speculate() decodes that last segment early, at a pause, and passes the would-be transcript to
+    on_speculative(text); if no speech follows, finish() reuses the decode instead of repeating it.
+    """
+
+    def __init__(self, stt: STTWorker, config: dict, sample_rate: int):
+        self.stt = stt
+        self.sr = sample_rate
+        self.interval = int(sample_rate * float(config.get("stt_partial_interval_seconds", 1.0)))
+        self.pause = int(sample_rate * float(config.get("stt_segment_pause_seconds", 0.25)))
+        self.min_segment = int(sample_rate * float(config.get("stt_min_segment_seconds", 2.0)))
+        self.max_segment = int(sample_rate * float(config.get("stt_max_segment_seconds", 8.0)))
+        self.on_partial = None
+        self.on_speculative = None
+        self.reused = 0
+        self.begin(np.zeros(0, dtype=np.int16))
+
+    def begin(self, pre_roll: np.ndarray) -> None:
+        """Start a new utterance; pre_roll is audio that precedes what record_until_silence will feed."""
+        self.buf = np.zeros(max(len(pre_roll) * 2, self.sr * 4), dtype=np.int16)
+        self.total = 0
+        self.origin = len(pre_roll)
+        self.seg_start = 0
+        self.segment_jobs = []
+        self.partial_job = None
+        self.last_partial_at = 0
+        self.partial = ""
+        self.partials = 0
+        self.pause_run = 0
+        self.tail_samples = 0
+        self.spec = None  # (seg_start, end, segments so far, job or None), from speculate()
+        self.spec_reported = False
+        self._append(pre_roll)
+
+    def _append(self, chunk: np.ndarray) -> None:
+        n = len(chunk)
+        if self.total + n > len(self.buf):
+            # Grow by doubling; jobs keep views of the old array, whose contents never change.
+            grown = np.zeros(max(len(self.buf) * 2, self.total + n), dtype=np.int16)
+            grown[: self.total] = self.buf[: self.total]
+            self.buf = grown
+        self.buf[self.total : self.total + n] = chunk
+        self.total += n
+
+    def _close_segment(self, end: int) -> None:
+        self.segment_jobs.append(self.stt.submit(self.buf[self.seg_start : end], self.sr))
+        self.seg_start = end
+        self.pause_run = 0
+
+    def _collect_partial(self) -> None:
+        job = self.partial_job
+        if job is None or not job.done.is_set():
+            return
+        self.partial_job = None
+        if job.cancelled or not job.text:
+            return
+        committed = " ".join(j.text.strip() for j in self.segment_jobs if j.done.is_set() and j.text)
+        self.partial = f"{committed} {job.text.strip()}".strip()
+        self.partials += 1
+        if self.on_partial is not None:
+            self.on_partial(self.partial)
+
+    def feed(self, chunk: np.ndarray, vad: StreamingVAD) -> None:
+        """on_chunk hook for record_until_silence."""
+        self._append(chunk)
+        if vad.is_speech and self.spec is not None:
+            if self.spec[3] is not None:
+                self.spec[3].cancel()  # talking again: that wasn't the end
+            self.spec = None
+        self.pause_run = 0 if vad.is_speech else self.pause_run + len(chunk)
+        seg_len = self.total - self.seg_start
+        if (vad.heard_speech and self.pause_run >= self.pause and seg_len >= self.min_segment) or seg_len >= self.max_segment:
+            self._close_segment(self.total)
+        elif self.partial_job is None and self.total - self.last_partial_at >= self.interval and self.stt.idle():
+            self.last_partial_at = self.total
+            self.partial_job = self.stt.submit(self.buf[self.seg_start : self.total], self.sr)
+        self._collect_partial()
+        self._collect_speculative()
+
+    def _tail_end(self, speech_end_sample: int | None) -> int:
+        if speech_end_sample is None:
+            return self.total
+        return min(self.total, self.origin + speech_end_sample + int(0.2 * self.sr))
+
+    def speculate(self, speech_end_sample: int) -> None:
+        """At a pause: decode now what finish(speech_end_sample) would. Repeated calls for the same pause are free."""
+        end = self._tail_end(speech_end_sample)
+        if self.spec is not None and self.spec[:3] == (self.seg_start, end, len(self.segment_jobs)):
+            return
+        if self.spec is not None and self.spec[3] is not None:
+            self.spec[3].cancel()
+        job = self.stt.submit(self.buf[self.seg_start : end], self.sr) if end - self.seg_start >= int(0.1 * self.sr) else None
+        self.spec = (self.seg_start, end, len(self.segment_jobs), job)
+        self.spec_reported = False
+
+    def _collect_speculative(self) -> None:
+        if self.spec is None or self.spec_reported:
+            return
+        jobs = self.segment_jobs[: self.spec[2]] + ([self.spec[3]] if self.spec[3] is not None else [])
+        if not all(j.done.is_set() for j in jobs):
+            return
+        self.spec_reported = True
+        text = " ".join(j.text.strip() for j in jobs if not j.cancelled and j.text and j.text.strip())
+        if text and self.on_speculative is not None:
+            self.on_speculative(text)
+
+    def finish(self, speech_end_sample: int | None = None) -> str:
+        """Decode the last segment and return the full transcript. speech_end_sample (the VAD's, relative to
+        the start of recording) trims trailing silence off the last segment."""
+        if self.partial_job is not None:
+            # Only skips it if not started; a running partial finishes and is ignored.
+            self.partial_job.cancel()
+            self.partial_job = None
+        end = self._tail_end(speech_end_sample)
+        self.tail_samples = max(0, end - self.seg_start)
+        spec = self.spec
+        if spec is not None and spec[:3] == (self.seg_start, end, len(self.segment_jobs)) and not (spec[3] and spec[3].cancelled):
+            # Nothing was said after the speculative decode: it is the last segment
+            self.reused += 1
+            if spec[3] is not None:
+                self.segment_jobs.append(spec[3])
+            self.seg_start = end
+        elif self.tail_samples >= int(0.1 * self.sr):
+            if spec is not None and spec[3] is not None:
+                spec[3].cancel()
+            self._close_segment(end)
+        texts = []
+        for job in self.segment_jobs:
+            if not job.done.wait(self.stt.timeout):
+                self.stt.cancel(job)
+                continue
+            if job.text.strip():
+                texts.append(job.text.strip())
+        return " ".join(texts)
+
+    def cancel(self) -> None:
+        spec_job = self.spec[3] if self.spec is not None else None
+        for job in self.segment_jobs + [j for j in (self.partial_job, spec_job) if j is not None]:
+            job.cancel()
+        self.segment_jobs = []
+        self.partial_job = None
+        self.spec = None
+
+    def stats(self) -> dict:
+        return {
+            "segments": len(self.segment_jobs),
+            "partials": self.partials,
+            "speculative_reused": self.reused,
+            "tail_seconds": round(self.tail_samples / self.sr, 2),
+        }
+
+
+# -----------------------------------------------------------------------------
+# Gateway (streaming) + TTS
+# -----------------------------------------------------------------------------
+
+class GatewayPool:
+    """
+    Keep-alive connections to one gateway, shared across turns so replies don't pay TCP/TLS setup.
+    probe() is a cheap GET (gateway_probe_path) that opens or refreshes a pooled connection and records
+    health; prewarm() runs it in the background, e.g. the moment the wake word fires, unless the pool
+    was used recently enough (gateway_keepalive_seconds) that its connection should still be open.
+    """
+
+    def __init__(self, base_url: str, config: dict):
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip("/")
+        # Edge answers GET on the function URL itself
+        self.probe_path = "" if is_edge_url(base_url) else config.get("gateway_probe_path", "/")
+        self.keepalive = float(config.get("gateway_keepalive_seconds", 30))
+        size = max(1, int(config.get("gateway_pool_size", 2)))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.healthy = None
+        self.last_used = 0.0
+        self.last_probe_ms = None
+        self.probes = 0
+        self._probing = threading.Lock()
+        self._probe_thread = None
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+    def probe(self, timeout: float = 3.0) -> bool:
+        if not self._probing.acquire(blocking=False):
+            return bool(self.healthy)
+        try:
+            t0 = time.monotonic()
+            r = self.session.get(self.base_url + self.probe_path, timeout=timeout)
+            r.close()
+            self.last_probe_ms = (time.monotonic() - t0) * 1000
+            self.healthy = r.status_code < 500
+            if self.healthy:
+                self.touch()
+        except requests.RequestException:
+            self.healthy = False
+        finally:
+            self.probes += 1
+            self._probing.release()
+        return self.healthy
+
+    def prewarm(self) -> None:
+        if time.monotonic() - self.last_used < self.keepalive:
+            return
+        threading.Thread(target=self.probe, name="gateway-prewarm", daemon=True).start()
+
+    def start_probing(self, interval: float) -> None:
+        """Probe every interval seconds in the background (keeps NAT/ngrok connections warm)."""
+        if interval <= 0 or self._probe_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.probe()
+
+        self._probe_thread = threading.Thread(target=loop, name="gateway-probe", daemon=True)
+        self._probe_thread.start()
+
+    def stats(self) -> dict:
+        return {"healthy": self.healthy, "probes": self.probes, "last_probe_ms": self.last_probe_ms}
+
+
+_GATEWAY_POOLS: dict = {}
+_GATEWAY_POOLS_LOCK = threading.Lock()
+
+
+def gateway_pool(gateway_url: str, config: dict) -> GatewayPool:
+    """Module-level pool per gateway URL."""
+    key = gateway_url.rstrip("/")
+    with _GATEWAY_POOLS_LOCK:
+        pool = _GATEWAY_POOLS.get(key)
+        if pool is None:
+            pool = _GATEWAY_POOLS[key] = GatewayPool(key, config)
+    return pool
+
+
+def is_edge_url(url: str) -> bool:
+    """Supabase Edge function (…supabase.co/functions/v1/jarvis) rather than a gateway base URL."""
+    return "supabase.co" in url and "functions/v1" in url
+
+
+class CircuitBreaker:
+    """Per-endpoint failure gate: open for gateway_breaker_reset_seconds after gateway_breaker_failures
+    failures in a row, then half-open for a single trial request whose outcome closes or re-opens it."""
+
+    def __init__(self, config: dict):
+        self.threshold = max(1, int(config.get("gateway_breaker_failures", 3)))
+        self.reset_seconds = float(config.get("gateway_breaker_reset_seconds", 30))
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self.trial_in_flight = None  # when the half-open trial was handed out
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self) -> bool:
+        """True if a request may go out now; in half-open, only the caller that claims the trial gets True."""
+        with self.lock:
+            state = self.state
+            if state != "half_open":
+                return state == "closed"
+            now = time.monotonic()
+            # A trial that never reports back (cancelled by barge-in) is given up after another reset period
+            if self.trial_in_flight is not None and now - self.trial_in_flight < self.reset_seconds:
+                return False
+            self.trial_in_flight = now
+            return True
+
+    def success(self) -> None:
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = None
+
+    def failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            self.trial_in_flight = None
+            if self.state == "half_open" or (self.opened_at is None and self.failures >= self.threshold):
+                self.trips += 1
+                self.opened_at = time.monotonic()
+
+
+class GatewayEndpoint:
+    """One entry of gateway_url (gateway base URL or Supabase Edge function URL) with its keep-alive pool,
+    circuit breaker and request/first-token counters."""
+
+    def __init__(self, url: str, token: str, config: dict):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.edge = is_edge_url(self.url)
+        self.name = self.url.split("://", 1)[-1].split("/", 1)[0] + (" (edge)" if self.edge else "")
+        self.pool = gateway_pool(self.url, config)
+        self.breaker = CircuitBreaker(config)
+        self.requests = 0
+        self.wins = 0
+        self.errors = 0
+        self.ttft_ms = deque(maxlen=50)
+
+    def request(self, agent_id: str, messages: list[dict], config: dict) -> tuple[str, dict, bytes]:
+        """(url, headers, body) for a streaming chat request with the full message list."""
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if self.edge:
+            headers["x-stream"] = "true"
+            payload = {"messages": messages, "session_id": config.get("gateway_session_id") or "voice-node"}
+            return self.url, headers, json.dumps(payload).encode()
+        headers["x-openclaw-agent-id"] = agent_id
+        payload = {"model": "openclaw:main", "messages": messages, "stream": True, "user": "voice-node"}
+        return f"{self.url}/v1/chat/completions", headers, json.dumps(payload).encode()
+
+    def stats(self) -> dict:
+        ttft = sorted(self.ttft_ms)
+        return {
+            "breaker": self.breaker.state,
+            "trips": self.breaker.trips,
+            "requests": self.requests,
+            "wins": self.wins,
+            "errors": self.errors,
+            "median_ttft_ms": round(ttft[len(ttft) // 2], 1) if ttft else None,
+            **self.pool.stats(),
+        }
+
+
+_GATEWAY_ENDPOINTS: dict = {}
+_GATEWAY_ENDPOINTS_LOCK = threading.Lock()
+
+
+def gateway_endpoints(gateway_url, config: dict) -> list[GatewayEndpoint]:
+    """gateway_url as endpoints in order: one URL, a list of URLs, or {url, token} entries (module-level per URL)."""
+    entries = gateway_url if isinstance(gateway_url, (list, tuple)) else [gateway_url]
+    out = []
+    for entry in entries:
+        if isinstance(entry, dict):
+            url, token = entry.get("url") or "", entry.get("token") or ""
+        else:
+            url, token = str(entry), ""
+        if not url.strip():
+            continue
+        url = url.strip().rstrip("/")
+        with _GATEWAY_ENDPOINTS_LOCK:
+            endpoint = _GATEWAY_ENDPOINTS.get(url)
+            if endpoint is None:
+                endpoint = _GATEWAY_ENDPOINTS[url] = GatewayEndpoint(
+                    url, token or config.get("gateway_token") or "", config
+                )
+        out.append(endpoint)
+    return out
+
+
+def strip_wake_phrase_from_text(text: str, wake_phrase: str) -> str:
+    """Remove wake phrase (and common variants) from the start of the transcript."""
+    if not text or not (text := text.strip()):
+        return ""
+    lower = text.lower()
+    # Try exact wake phrase (e.g. "Hey JARVIS") then "hey jarvis", then "jarvis"
+    for prefix in (
+        wake_phrase.strip(),
+        "hey jarvis",
+        "jarvis",
+    ):
+        if not prefix:
+            continue
+        if lower.startswith(prefix.lower()):
+            rest = text[len(prefix) :].lstrip(" ,")
+            return rest
+    return text
+
+
+def _close_on_stop(response, stop_event: threading.Event, done: threading.Event) -> None:
+    """Close a streaming response as soon as stop_event is set (iter_lines then raises and the loop exits)."""
+    while not done.is_set():
+        if stop_event.wait(0.05):
+            try:
+                response.close()
+            except Exception:
+                pass
+            return
+
+
+def _post_cancellable(session, url: str, stop_event: threading.Event, **kwargs):
+    """session.post in a helper thread, so stop_event can abandon it while waiting for response headers
+    (a slow or sleeping gateway). An abandoned response is closed by the helper when it finally arrives.
+    Returns None if stopped first."""
+    result = {}
+    ready = threading.Event()
+
+    def run():
+        try:
+            result["response"] = session.post(url, **kwargs)
+        except Exception as e:
+            result["error"] = e
+        ready.set()
+        if stop_event.is_set() and "response" in result:
+            result["response"].close()
+
+    threading.Thread(target=run, name="gateway-post", daemon=True).start()
+    while not ready.wait(0.05):
+        if stop_event.is_set():
+            return None
+    if "error" in result:
+        raise result["error"]
+    return result["response"]
+
+
+class TTSWriter:
+    """Owns the TTS FIFO so a missing, slow or dead reader never blocks the voice node.
+    say() never blocks: lines wait in a bounded backlog (tts_backlog_policy) while a thread (re)opens the FIFO."""
+
+    def __init__(self, path: str, config: dict):
+        self.path = path
+        self.size = max(1, int(config.get("tts_backlog_size", 16)))
+        self.policy = (config.get("tts_backlog_policy") or "merge").strip().lower()
+        self.reconnect_interval = float(config.get("tts_reconnect_seconds", 0.5))
+        self.max_age = float(config.get("tts_max_line_age_seconds", 10))
+        self.backlog = deque()  # (line, queued_at, is_control, on_written)
+        self.cond = threading.Condition()
+        self.fd = None
+        self.next_open = 0.0
+        self.written = 0
+        self.dropped = 0
+        self.merged = 0
+        self.stale = 0
+        self.connects = 0
+        self.disconnects = 0
+        self.stalls = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="tts-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def connected(self) -> bool:
+        return self.fd is not None
+
+    def say(self, line: str, on_written=None) -> bool:
+        """Queue one line for TTS; False if it was dropped because the backlog is full.
+        on_written() is called from the writer thread once the line is in the FIFO."""
+        line = " ".join(line.split())
+        if not line:
+            return False
+        with self.cond:
+            if len(self.backlog) >= self.size:
+                last = self.backlog[-1] if self.backlog else None
+                if self.policy == "merge" and last and not last[2] and len(last[0]) + len(line) < 3000:
+                    self.backlog[-1] = (last[0] + " " + line, last[1], False, last[3] or on_written)
+                    self.merged += 1
+                    self.cond.notify()
+                    return True
+                if self.policy == "drop_newest":
+                    self.dropped += 1
+                    return False
+                self.backlog.popleft()
+                self.dropped += 1
+            self.backlog.append((line, time.monotonic(), False, on_written))
+            self.cond.notify()
+        return True
+
+    def interrupt(self, signal: str) -> bool:
+        """Drop everything queued and send signal (barge-in) ahead of it; False if no reader is attached."""
+        with self.cond:
+            self.dropped += sum(1 for item in self.backlog if not item[2])
+            self.backlog.clear()
+            self.next_open = 0.0
+            self.backlog.append((signal, time.monotonic(), True, None))
+            self.cond.notify()
+        if self.fd is None:
+            self._open()
+        return self.fd is not None
+
+    def close(self) -> None:
+        with self.cond:
+            self._closed = True
+            self.cond.notify()
+        self._thread.join(timeout=2)
+        self._disconnect()
+
+    def _open(self) -> None:
+        with self.cond:
+            if self.fd is not None or time.monotonic() < self.next_open:
+                return
+            try:
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+                self.connects += 1
+            except OSError:  # ENXIO: no reader; ENOENT: FIFO not created yet
+                self.next_open = time.monotonic() + self.reconnect_interval
+
+    def _disconnect(self) -> None:
+        with self.cond:
+            fd, self.fd = self.fd, None
+            self.next_open = time.monotonic() + self.reconnect_interval
+        if fd is not None:
+            self.disconnects += 1
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _write(self, data: bytes) -> bool:
+        """Write all of data; waits for room while the reader is slow, fails if it goes away."""
+        import select
+
+        while data:
+            fd = self.fd
+            if fd is None or self._closed:
+                return False
+            try:
+                n = os.write(fd, data)
+                data = data[n:]
+            except BlockingIOError:
+                # Pipe full: the reader is alive but behind. Only this thread waits.
+                self.stalls += 1
+                select.select([], [fd], [], 0.2)
+            except OSError:  # EPIPE: reader exited
+                self._disconnect()
+                return False
+        return True
+
+    def _run(self) -> None:
+        while True:
+            with self.cond:
+                while not self._closed and not self.backlog:
+                    self.cond.wait()
+                if self._closed:
+                    return
+            if self.fd is None:
+                self._open()
+                if self.fd is None:
+                    self._expire()
+                    with self.cond:
+                        self.cond.wait(self.reconnect_interval)
                     continue
-                if not check_wake(latest, wake_model, config):
+            with self.cond:
+                if not self.backlog:
                     continue
-                print(f"[{wake_phrase}] detected, recording...", flush=True)
-                pre_roll = ring.get_all()
-                record_stop = threading.Event()
-                while not chunk_queue.empty():
+                item = self.backlog.popleft()
+            line, queued_at, control, on_written = item
+            if not control and time.monotonic() - queued_at > self.max_age:
+                self.stale += 1
+                continue
+            if self._write((line + "\n").encode()):
+                self.written += 1
+                if on_written is not None:
+                    on_written()
+            else:
+                with self.cond:
+                    self.backlog.appendleft(item)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        with self.cond:
+            while self.backlog and not self.backlog[0][2] and now - self.backlog[0][1] > self.max_age:
+                self.backlog.popleft()
+                self.stale += 1
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "backlog": len(self.backlog),
+            "written": self.written,
+            "dropped": self.dropped,
+            "merged": self.merged,
+            "stale": self.stale,
+            "reconnects": max(0, self.connects - 1),
+            "stalls": self.stalls,
+        }
+
+
+_TTS_WRITERS: dict = {}
+_TTS_WRITERS_LOCK = threading.Lock()
+
+
+def tts_writer(tts_fifo_path: str, config: dict) -> TTSWriter:
+    """Module-level writer per FIFO path."""
+    with _TTS_WRITERS_LOCK:
+        writer = _TTS_WRITERS.get(tts_fifo_path)
+        if writer is None:
+            writer = _TTS_WRITERS[tts_fifo_path] = TTSWriter(tts_fifo_path, config)
+    return writer
+
+
+class GatewayAttempt:
+    """One streaming chat request to one endpoint, read on its own thread; posts (attempt, kind, value)
+    with kind "token", "done" or "error" to the turn's queue. cancel() closes the stream."""
+
+    def __init__(self, endpoint: GatewayEndpoint, agent_id: str, messages: list[dict], config: dict, events: queue.Queue):
+        self.endpoint = endpoint
+        self.url, self.headers, self.body = endpoint.request(agent_id, messages, config)
+        self.timeout = float(config.get("gateway_timeout_seconds", 30))
+        self.events = events
+        self.stop = threading.Event()
+        self.finished = False
+        self.started_at = None
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self.endpoint.requests += 1
+        threading.Thread(target=self._run, name="gateway-stream", daemon=True).start()
+
+    def cancel(self) -> None:
+        self.stop.set()
+
+    def _run(self) -> None:
+        pool = self.endpoint.pool
+        done = threading.Event()
+        try:
+            r = _post_cancellable(
+                pool.session, self.url, self.stop, headers=self.headers, data=self.body, stream=True, timeout=self.timeout
+            )
+            if r is None:
+                return
+            with r:
+                pool.touch()
+                r.raise_for_status()
+                watcher = threading.Thread(target=_close_on_stop, args=(r, self.stop, done), daemon=True)
+                watcher.start()
+                for line in r.iter_lines():
+                    if self.stop.is_set():
+                        return
+                    if not line or not line.strip().startswith(b"data:"):
+                        continue
+                    raw = line.split(b"data:", 1)[1].strip()
+                    if raw == b"[DONE]":
+                        break
                     try:
-                        chunk_queue.get_nowait()
-                    except queue.Empty:
+                        data = json.loads(raw)
+                        content = (data.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    except Exception:
+                        continue
+                    if content:
+                        self.events.put((self, "token", content))
+            self.events.put((self, "done", None))
+        except Exception as e:
+            if not self.stop.is_set():
+                self.events.put((self, "error", e))
+        finally:
+            done.set()
+
+
+def stream_and_speak(
+    gateway_url,
+    agent_id: str,
+    messages: list[dict],
+    system_prompt: str,
+    tts_fifo_path: str,
+    stop_tts_event: threading.Event,
+    config: dict,
+    on_sentence=None,
+    trace: TurnTrace | None = None,
+    hold: threading.Event | None = None,
+) -> str:
+    """Stream reply from gateway and send sentences to TTS FIFO. Returns full reply text (partial if stopped).
+    gateway_url endpoints are tried in order, failing over at once and hedged after gateway_hedge_ttft_seconds.
+    Setting stop_tts_event closes the HTTP stream within ~50 ms, even while waiting for the next token.
+    Sentences go through the shared TTSWriter, so a stalled or missing FIFO reader never blocks the stream.
+    on_sentence(text) is called for every sentence queued for TTS. trace, if given, gets request_sent,
+    first_token, first_sentence (queued) and first_fifo_write marks, and the serving endpoint.
+    With hold (speculative requests), nothing is spoken until hold is set."""
+    messages = [{"role": "system", "content": system_prompt}] + messages
+    endpoints = gateway_endpoints(gateway_url, config)
+    order = list(endpoints)
+    hedge = float(config.get("gateway_hedge_ttft_seconds", 2.5))
+    timeout = float(config.get("gateway_timeout_seconds", 30))
+    stripper = MarkdownStripper()
+    segmenter = SentenceSegmenter(int(config.get("tts_first_clause_words", 4)))
+    full_text = []
+    tts = tts_writer(tts_fifo_path, config)
+    events = queue.Queue()
+    attempts = []
+    winner = None
+    held = []
+    on_written = None
+    if trace is not None:
+        on_written = lambda: trace.mark("first_fifo_write")  # noqa: E731
+
+    def launch() -> bool:
+        # The breaker is asked only for the endpoint actually launched: allow() claims a half-open trial
+        i = next((i for i, ep in enumerate(order) if ep.breaker.allow()), None)
+        if i is None:
+            if attempts or not order:
+                return False
+            i = 0  # every breaker open: try anyway
+        attempt = GatewayAttempt(order.pop(i), agent_id, messages, config, events)
+        if trace is not None and trace.payload_bytes is None:
+            trace.payload_bytes = len(attempt.body)
+        attempts.append(attempt)
+        attempt.start()
+        return True
+
+    def speak(sentences: list) -> None:
+        if hold is not None and not hold.is_set():
+            held.extend(sentences)
+            return
+        for sent in held + sentences:
+            sent = sent[:3000]
+            if sent and tts.say(sent, on_written):
+                if trace is not None:
+                    trace.mark("first_sentence")
+                if on_sentence is not None:
+                    on_sentence(sent)
+        held.clear()
+
+    if not order:
+        print("No gateway_url configured.", file=sys.stderr)
+        return ""
+    if trace is not None:
+        trace.mark("request_sent")
+    t0 = time.monotonic()
+    hedge_at = t0 + hedge if hedge > 0 else float("inf")
+    launch()
+    try:
+        while not stop_tts_event.is_set():
+            now = time.monotonic()
+            if held and hold.is_set():
+                speak([])
+            if winner is None:
+                if now - t0 >= timeout:
+                    for attempt in attempts:
+                        if not attempt.finished:
+                            attempt.endpoint.breaker.failure()
+                    print(f"Gateway error: no reply within {timeout:.0f}s", file=sys.stderr)
+                    break
+                if now >= hedge_at:
+                    hedge_at = now + hedge
+                    waiting = [a.endpoint.name for a in attempts if not a.finished]
+                    if launch():
+                        print(
+                            f"[gateway] no first token from {', '.join(waiting)} after {hedge:g}s; "
+                            f"also asking {attempts[-1].endpoint.name}",
+                            file=sys.stderr,
+                        )
+            try:
+                attempt, kind, value = events.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if winner is None:
+                if kind != "token":
+                    # Failed (or empty) before a first token: fail over now instead of waiting for the hedge
+                    attempt.finished = True
+                    attempt.endpoint.errors += 1
+                    attempt.endpoint.breaker.failure()
+                    print(f"Gateway {attempt.endpoint.name}: {value or 'empty reply'}", file=sys.stderr)
+                    if all(a.finished for a in attempts) and not launch():
                         break
-                recorded = record_until_silence(stream, config, record_stop, chunk_queue)
-            if len(recorded) < sr * 0.3:
-                print("Too short, ignoring.", flush=True)
+                    continue
+                winner = attempt
+                ttft_ms = (time.monotonic() - attempt.started_at) * 1000
+                attempt.endpoint.wins += 1
+                attempt.endpoint.ttft_ms.append(ttft_ms)
+                attempt.endpoint.breaker.success()
+                for other in attempts:
+                    if other is not attempt and not other.finished:
+                        other.cancel()
+                        other.endpoint.breaker.failure()  # slower than the hedge budget and the other endpoint
+                if trace is not None:
+                    trace.gateway = attempt.endpoint.name
+            if attempt is not winner:
                 continue
-            full_audio = np.concatenate([pre_roll, recorded]) if len(pre_roll) > 0 else recorded
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-                wav_path = f.name
-            try:
-                # Write WAV header + data
-                import wave
-                with wave.open(wav_path, "wb") as wav:
-                    wav.setnchannels(1)
-                    wav.setsampwidth(2)
-                    wav.setframerate(sr)
-                    wav.writeframes(full_audio.tobytes())
-                text = transcribe(wav_path, config)
-            finally:
-                try:
-                    os.unlink(wav_path)
-                except Exception:
-                    pass
-            if not text or not text.strip():
-                if not (config.get("whisper_cmd") or config.get("whisper_python")):
-                    print("No STT configured. Set whisper_cmd or whisper_python in ~/.jarvis/voice_node.yaml. See PIXEL_VOICE_RUNBOOK.md.", flush=True)
-                else:
-                    print("No transcript.", flush=True)
+            if kind == "error":
+                attempt.endpoint.errors += 1
+                print(f"Gateway/TTS error: {value}", file=sys.stderr)
+                break
+            if kind == "done":
+                speak(segmenter.feed(stripper.flush()) + [segmenter.flush()])
+                # Held and complete: wait for the commit, but not forever if nobody settles it
+                held_until = time.monotonic() + timeout
+                while held and not stop_tts_event.is_set() and time.monotonic() < held_until:
+                    if hold.wait(0.05):
+                        speak([])
+                break
+            full_text.append(value)
+            if trace is not None:
+                trace.mark("first_token")
+            # Markdown state (open fences, links) carries across deltas and sentences
+            speak(segmenter.feed(stripper.feed(value)))
+    except Exception as e:
+        if not stop_tts_event.is_set():
+            print(f"Gateway/TTS error: {e}", file=sys.stderr)
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+    return "".join(full_text).strip()
+
+
+# -----------------------------------------------------------------------------
+# Local intents: trivial commands answered on-device, no gateway round trip
+# -----------------------------------------------------------------------------
+
+# Matched against the whole normalized transcript (lowercase, no punctuation, fillers dropped), so
+# "what time is it in Tokyo" still goes to the gateway. Patterns are full-match regexes on that text.
+DEFAULT_LOCAL_INTENTS = [
+    {
+        "intent": "time",
+        "phrases": ["time", "the time", "what time is it", "whats the time", "tell me the time"],
+        "patterns": [r"what time is it( right)?( now)?", r"(what is|whats|tell me) the (current )?time( right)?( now)?"],
+    },
+    {
+        "intent": "date",
+        "phrases": ["date", "whats the date", "what day is it", "what day is today", "whats todays date"],
+        "patterns": [r"(what is|whats) (the date|todays date|the day)( today)?", r"what day is (it|today)( today)?"],
+    },
+    {
+        "intent": "stop",
+        "phrases": ["stop", "stop talking", "stop it", "be quiet", "quiet", "shut up", "cancel", "never mind", "nevermind"],
+    },
+    {
+        "intent": "volume_up",
+        "phrases": ["louder", "volume up", "turn it up", "speak up"],
+        "patterns": [r"(turn )?(the )?volume up( a bit)?", r"(turn|make) (it|the volume) (up|louder)( a bit)?"],
+    },
+    {
+        "intent": "volume_down",
+        "phrases": ["quieter", "softer", "volume down", "turn it down"],
+        "patterns": [r"(turn )?(the )?volume down( a bit)?", r"(turn|make) (it|the volume) (down|quieter|softer)( a bit)?"],
+    },
+    {
+        "intent": "repeat",
+        "phrases": ["repeat", "repeat that", "say that again", "say again", "what did you say", "come again", "pardon"],
+        "patterns": [r"(can you |could you )?(repeat|say) (that|it)( again)?"],
+    },
+]
+
+_INTENT_FILLERS = {"please", "jarvis", "hey", "ok", "okay", "um", "uh", "so", "thanks", "thank", "you"}
+
+
+def normalize_intent_text(text: str) -> str:
+    words = re.sub(r"[^a-z0-9 ]+", "", text.lower().replace("-", " ")).split()
+    while words and words[0] in _INTENT_FILLERS:
+        words.pop(0)
+    while words and words[-1] in _INTENT_FILLERS:
+        words.pop()
+    return " ".join(words)
+
+
+class IntentRouter:
+    """
+    Phrase table → intent, built once: exact phrases in a dict (one lookup), then full-match patterns.
+    Entries from local_intent_table come first, so config can override or add intents; an entry with
+    a "reply" is answered with that text.
+    """
+
+    def __init__(self, table: list[dict]):
+        self.exact = {}
+        self.patterns = []
+        for entry in table:
+            if not entry.get("intent"):
                 continue
-            if config.get("strip_wake_phrase_from_transcript", True):
-                text = strip_wake_phrase_from_text(text.strip(), wake_phrase)
+            for phrase in entry.get("phrases") or []:
+                self.exact.setdefault(normalize_intent_text(phrase), entry)
+            for pattern in entry.get("patterns") or []:
+                try:
+                    self.patterns.append((re.compile(pattern), entry))
+                except re.error as e:
+                    print(f"Warning: bad local intent pattern {pattern!r}: {e}", file=sys.stderr)
+
+    @classmethod
+    def from_config(cls, config: dict) -> IntentRouter | None:
+        if not config.get("local_intents", True):
+            return None
+        return cls(list(config.get("local_intent_table") or []) + DEFAULT_LOCAL_INTENTS)
+
+    def match(self, text: str) -> dict | None:
+        norm = normalize_intent_text(text)
+        if not norm:
+            return None
+        entry = self.exact.get(norm)
+        if entry is not None:
+            return entry
+        for rx, entry in self.patterns:
+            if rx.fullmatch(norm):
+                return entry
+        return None
+
+
+def spoken_time(now: time.struct_time) -> str:
+    hour = now.tm_hour % 12 or 12
+    return f"It's {hour}:{now.tm_min:02d} {'AM' if now.tm_hour < 12 else 'PM'}."
+
+
+def spoken_date(now: time.struct_time) -> str:
+    return f"Today is {time.strftime('%A, %B', now)} {now.tm_mday}."
+
+
+def change_volume(config: dict, direction: int) -> str:
+    """Step the media volume with termux-volume (volume_cmd); returns what to say."""
+    cmd = (config.get("volume_cmd") or "termux-volume").split()
+    stream = config.get("volume_stream", "music")
+    try:
+        out = subprocess.run(cmd, capture_output=True, text=True, timeout=5).stdout
+        current = next(s for s in json.loads(out) if s.get("stream") == stream)
+        level = max(0, min(int(current["max_volume"]), int(current["volume"]) + direction * int(config.get("volume_step", 2))))
+        subprocess.run(cmd + [stream, str(level)], capture_output=True, timeout=5, check=True)
+    except Exception as e:
+        print(f"Volume change failed: {e}", file=sys.stderr)
+        return "I can't change the volume here."
+    return f"Volume {level}."
+
+
+# -----------------------------------------------------------------------------
+# Conversation context: token budget, rolling summary, stable prefix
+# -----------------------------------------------------------------------------
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token in English); good enough for budgeting without a tokenizer."""
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, preferring a paragraph or sentence boundary in the last third."""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    for sep in ("\n\n", ". ", "\n"):
+        i = cut.rfind(sep)
+        if i >= limit * 2 // 3:
+            return cut[: i + 1].rstrip()
+    return cut.rstrip()
+
+
+def summarize_extractive(summary: str, turns: list, max_tokens: int) -> str:
+    """Local rolling summary: the first sentence of every folded turn, oldest dropped first to fit max_tokens."""
+    parts = [summary] if summary else []
+    for msg in turns:
+        first = re.split(r"(?<=[.!?])\s", msg["content"].strip(), maxsplit=1)[0]
+        parts.append(("User asked: " if msg["role"] == "user" else "You said: ") + first)
+    while len(parts) > 1 and estimate_tokens(" ".join(parts)) > max_tokens:
+        parts.pop(0)
+    return truncate_to_tokens(" ".join(parts), max_tokens)
+
+
+def summarize_via_gateway(gateway_url, agent_id: str, config: dict, summary: str, turns: list) -> str:
+    """Rolling summary from the gateway's model (non-streaming); runs on the compaction thread, not per turn.
+    Uses the first gateway endpoint whose breaker is closed (not Edge, which would store the prompt in its session)."""
+    words = int(config.get("context_summary_tokens", 200)) * 3 // 4
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in turns)
+    prompt = (
+        f"Update the running summary of a voice conversation with the new turns below. Keep names, facts, "
+        f"decisions and open requests; drop small talk. Plain sentences, at most {words} words.\n\n"
+        f"Summary so far: {summary or '(none)'}\n\nNew turns:\n{transcript}"
+    )
+    endpoint = next((ep for ep in gateway_endpoints(gateway_url, config) if not ep.edge and ep.breaker.allow()), None)
+    if endpoint is None:
+        raise RuntimeError("no gateway endpoint available")
+    headers = {"Content-Type": "application/json", "x-openclaw-agent-id": agent_id}
+    if endpoint.token:
+        headers["Authorization"] = f"Bearer {endpoint.token}"
+    try:
+        r = endpoint.pool.session.post(
+            f"{endpoint.url}/v1/chat/completions",
+            headers=headers,
+            json={"model": "openclaw:main", "messages": [{"role": "user", "content": prompt}], "stream": False, "user": "voice-node-summary"},
+            timeout=60,
+        )
+        r.raise_for_status()
+    except Exception:
+        endpoint.breaker.failure()
+        raise
+    endpoint.breaker.success()
+    endpoint.pool.touch()
+    return (r.json()["choices"][0]["message"]["content"] or "").strip()
+
+
+class ConversationContext:
+    """
+    What the gateway sees each turn, budgeted in estimated tokens rather than a fixed number of messages.
+    Messages go out as [system: prompt + rolling summary] + recent turns. Once the recent turns pass
+    context_recent_tokens, the oldest are folded into the summary on a background thread, down to half the
+    budget in one go; until that finishes they are still sent as they are. The system message therefore
+    only changes on compaction, and consecutive turns share a byte-identical prefix that gateway-side
+    prompt caching can reuse. context_summary: "extractive" (local), "gateway" (LLM) or "off" (drop).
+    """
+
+    def __init__(self, config: dict, summarize=None):
+        self.prompt = config.get("system_prompt", "")
+        self.recent_budget = max(64, int(config.get("context_recent_tokens", 1200)))
+        self.summary_budget = int(config.get("context_summary_tokens", 200))
+        self.mode = (config.get("context_summary") or "extractive").strip().lower()
+        self.summarize = summarize
+        self.summary = ""
+        self.turns = []
+        self.lock = threading.Lock()
+        self.compactions = 0
+        self.summary_ms = None
+        self._compacting = False
+
+    def add(self, role: str, content: str) -> None:
+        # One very long reply shouldn't crowd out everything else
+        content = truncate_to_tokens(content, self.recent_budget // 2)
+        with self.lock:
+            self.turns.append({"role": role, "content": content})
+            start = not self._compacting and self._tokens(self.turns) > self.recent_budget
+            if start:
+                self._compacting = True
+        if start:
+            threading.Thread(target=self._compact, name="context-compact", daemon=True).start()
+
+    def system_message(self) -> str:
+        if not self.summary:
+            return self.prompt
+        return f"{self.prompt}\n\nEarlier in this conversation: {self.summary}"
+
+    def messages(self) -> list[dict]:
+        """Recent turns, oldest first (the system message is separate)."""
+        with self.lock:
+            return list(self.turns)
+
+    @staticmethod
+    def _tokens(messages: list) -> int:
+        return sum(estimate_tokens(m["content"]) + 4 for m in messages)
+
+    def payload_tokens(self, messages: list) -> int:
+        return estimate_tokens(self.system_message()) + 4 + self._tokens(messages)
+
+    def _compact(self) -> None:
+        try:
+            with self.lock:
+                n = 0
+                # Keep at least the last exchange; start the kept window on a user turn
+                while n < len(self.turns) - 2 and self._tokens(self.turns[n:]) > self.recent_budget // 2:
+                    n += 1
+                while n < len(self.turns) - 1 and self.turns[n]["role"] != "user":
+                    n += 1
+                old, summary = self.turns[:n], self.summary
+            if not old:
+                return
+            t0 = time.monotonic()
+            if self.mode == "off":
+                new = ""
+            elif self.mode == "gateway" and self.summarize is not None:
+                try:
+                    new = truncate_to_tokens(self.summarize(summary, old), self.summary_budget)
+                except Exception as e:
+                    print(f"Context summary via gateway failed ({e}); using extractive.", file=sys.stderr)
+                    new = summarize_extractive(summary, old, self.summary_budget)
             else:
-                text = text.strip()
-            if not text:
-                print("(Wake phrase only, ignoring)", flush=True)
-                continue
-            print(f"User: {text}", flush=True)
-            conversation.append({"role": "user", "content": text})
-            if len(conversation) > 20:
-                conversation = conversation[-20:]
-            tts_stop.clear()
-            reply = stream_and_speak(
+                new = summarize_extractive(summary, old, self.summary_budget)
+            with self.lock:
+                self.summary = new
+                del self.turns[: len(old)]
+                self.compactions += 1
+                self.summary_ms = (time.monotonic() - t0) * 1000
+        finally:
+            with self.lock:
+                self._compacting = False
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "turns": len(self.turns),
+                "recent_tokens": self._tokens(self.turns),
+                "summary_tokens": estimate_tokens(self.summary),
+                "compactions": self.compactions,
+                "summary_ms": None if self.summary_ms is None else round(self.summary_ms),
+            }
+
+
+# -----------------------------------------------------------------------------
+# Latency tracing: one JSONL record per turn
+# -----------------------------------------------------------------------------
+
+# (span, from mark, to mark); a span is left out of the record when either mark is missing
+TRACE_SPANS = (
+    ("listen", "wake", "speech_end"),
+    ("endpoint", "speech_end", "record_end"),  # VAD silence wait
+    ("stt_wait", "record_end", "stt_start"),
+    ("stt", "stt_start", "stt_end"),
+    ("ttft", "request_sent", "first_token"),
+    ("first_sentence", "first_token", "first_sentence"),
+    ("fifo_wait", "first_sentence", "first_fifo_write"),
+    ("reply", "request_sent", "reply_done"),
+    ("speech_end_to_tts", "speech_end", "first_fifo_write"),
+    ("total", "wake", "reply_done"),
+)
+
+# Config that moves the numbers; recorded with every turn so a log can be split before/after a change
+TRACE_CONFIG_KEYS = (
+    "chunk_samples",
+    "vad_engine",
+    "vad_silence_seconds",
+    "stt_streaming",
+    "stt_input",
+    "whisper_server_cmd",
+    "whisper_cmd",
+    "whisper_python_model",
+    "gateway_hedge_ttft_seconds",
+    "speculate",
+)
+
+
+class TurnTrace:
+    """
+    time.monotonic() marks for one voice turn: wake, speech_end, record_end, stt_start, stt_end,
+    request_sent, first_token, first_sentence, first_fifo_write, reply_done. Only the first mark of a
+    name counts. record() turns them into ms since wake plus the TRACE_SPANS durations, and names the
+    gateway endpoint that served the reply.
+    """
+
+    def __init__(self, source: str = "wake", t: float | None = None):
+        self.source = source
+        self.wall = time.time()
+        self.marks = {}
+        self.outcome = None
+        self.audio_seconds = None  # length of the audio sent to STT
+        self.trimmed_seconds = 0.0  # pre-roll and silence cut before STT
+        self.payload_bytes = None
+        self.payload_tokens = None
+        self.gateway = None
+        self.speculation = None  # "hit" | "miss" when a speculative request was pending at the final transcript
+        self.saved_ms = None  # hit: how much sooner the first token was available than without speculation
+        self.fifo_written = threading.Event()  # set from the TTS writer thread
+        self.mark("wake", t)
+
+    def mark(self, name: str, t: float | None = None) -> None:
+        if name not in self.marks:
+            self.marks[name] = time.monotonic() if t is None else t
+        if name == "first_fifo_write":
+            self.fifo_written.set()
+
+    def record(self, config: dict) -> dict:
+        t0 = self.marks["wake"]
+        spans = {}
+        for name, start, end in TRACE_SPANS:
+            if start in self.marks and end in self.marks:
+                spans[name] = round((self.marks[end] - self.marks[start]) * 1000, 1)
+        return {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.wall)),
+            "source": self.source,
+            "outcome": self.outcome,
+            "marks_ms": {k: round((v - t0) * 1000, 1) for k, v in sorted(self.marks.items(), key=lambda kv: kv[1])},
+            "spans_ms": spans,
+            "audio_s": None if self.audio_seconds is None else round(self.audio_seconds, 2),
+            "trimmed_s": round(self.trimmed_seconds, 2),
+            "payload_bytes": self.payload_bytes,
+            "payload_tokens": self.payload_tokens,
+            "gateway": self.gateway,
+            "speculation": self.speculation,
+            "saved_ms": None if self.saved_ms is None else round(self.saved_ms, 1),
+            "config": {k: config.get(k) for k in TRACE_CONFIG_KEYS},
+        }
+
+
+class TraceLog:
+    """Appends TurnTrace records to a JSONL file (trace_log). Write errors are reported once, never raised."""
+
+    def __init__(self, path: str, config: dict):
+        self.path = os.path.expanduser(path) if path else ""
+        self.config = config
+        self.lock = threading.Lock()
+        self.written = 0
+        self._warned = False
+
+    def write(self, trace: TurnTrace | None, outcome: str) -> None:
+        if trace is None or not self.path:
+            return
+        trace.outcome = outcome
+        line = json.dumps(trace.record(self.config), separators=(",", ":"))
+        with self.lock:
+            try:
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+                self.written += 1
+            except OSError as e:
+                if not self._warned:
+                    print(f"Trace log {self.path}: {e}", file=sys.stderr)
+                    self._warned = True
+
+
+# -----------------------------------------------------------------------------
+# Pipeline: capture → wake → record (VAD) → STT → reply (gateway → TTS)
+# -----------------------------------------------------------------------------
+
+class BargeInGate:
+    """
+    Tells the user talking over a reply apart from JARVIS's own voice coming back through the mic.
+    Playback is tracked from the sentences written to the FIFO, timed at tts_chars_per_second.
+    Speech barge-in needs barge_in_speech_frames chunks in a row louder than barge_in_min_rms and
+    barge_in_echo_ratio x the echo level: a slow average of the mic while JARVIS talks (or the room floor,
+    if louder). The first barge_in_echo_warmup_seconds of audible playback only teach that level, so the
+    onset of JARVIS's own voice can't pass for the user. A wake word during a sentence that itself says
+    the wake word is treated as echo unless that loudness test passes too.
+    """
+
+    def __init__(self, config: dict):
+        self.cps = float(config.get("tts_chars_per_second", 14.0))
+        self.ratio = float(config.get("barge_in_echo_ratio", 2.5))
+        self.min_rms = float(config.get("barge_in_min_rms", 0.02))
+        self.frames = max(1, int(config.get("barge_in_speech_frames", 2)))
+        self.warmup_samples = int(float(config.get("barge_in_echo_warmup_seconds", 0.5)) * config["sample_rate"])
+        words = set(re.findall(r"[a-z]+", (config.get("wake_phrase") or "").lower())) - {"hey", "hi", "ok", "okay"}
+        self.wake_words = words | {"jarvis"}
+        self.sentences = deque(maxlen=32)
+        self.playback_end = 0.0
+        self.room_floor = None
+        self.echo_level = 0.0
+        self.was_playing = False
+        self.warmup_left = 0
+        self.warmup_cap = 0
+        self.warmup_levels = []
+        self.run = 0
+
+    def on_sentence(self, text: str) -> None:
+        now = time.monotonic()
+        start = max(now, self.playback_end)
+        self.playback_end = start + len(text) / self.cps
+        has_wake = bool(self.wake_words & set(re.findall(r"[a-z]+", text.lower())))
+        self.sentences.append((start, self.playback_end, has_wake))
+
+    def playing(self, now: float) -> bool:
+        return now < self.playback_end
+
+    def reset(self) -> None:
+        self.sentences.clear()
+        self.playback_end = 0.0
+        self.was_playing = False
+        self.run = 0
+
+    def idle(self) -> None:
+        """No reply (or not listening for speech barge-in): the next playback starts a fresh warm-up."""
+        self.was_playing = False
+        self.run = 0
+
+    def observe(self, chunk: np.ndarray, now: float | None = None) -> bool:
+        """Feed one mic chunk captured during a reply; True when the user is talking over it."""
+        energy = rms(chunk)
+        if self.room_floor is None:
+            self.room_floor = energy
+        playing = self.playing(time.monotonic() if now is None else now)
+        if playing and not self.was_playing:
+            # Warm-up counts audible chunks (TTS start-up latency), capped at 4x in case the echo never shows
+            self.warmup_left = self.warmup_samples
+            self.warmup_cap = 4 * self.warmup_samples
+            self.warmup_levels = []
+        self.was_playing = playing
+        if playing and self.warmup_left > 0:
+            self.warmup_cap -= len(chunk)
+            if energy >= self.min_rms:
+                self.warmup_left -= len(chunk)
+                self.warmup_levels.append(energy)
+            if self.warmup_left <= 0 or self.warmup_cap <= 0:
+                self.warmup_left = 0
+                if self.warmup_levels:
+                    self.echo_level = float(np.mean(self.warmup_levels))
+            self.run = 0
+            return False
+        if energy >= self.min_rms and energy > self.ratio * max(self.room_floor, self.echo_level):
+            # Not averaged in: the next loud chunk is judged against the same reference
+            self.run += 1
+            return self.run >= self.frames
+        self.run = 0
+        if playing:
+            self.echo_level += (energy - self.echo_level) * 0.05
+        else:
+            self.room_floor += (energy - self.room_floor) * 0.1
+        return False
+
+    def wake_is_echo(self, now: float) -> bool:
+        if self.run > 0:
+            return False
+        return any(has_wake and start - 0.5 <= now <= end + 1.0 for start, end, has_wake in self.sentences)
+
+
+class SpeculativeReply:
+    """A gateway stream started from a partial transcript while the user may still be talking.
+    Its sentences are held back from TTS until commit(); cancel() closes it unheard."""
+
+    def __init__(self, text: str, messages: list[dict], system_prompt: str, config: dict, on_sentence=None):
+        self.text = text
+        self.key = normalize_intent_text(text)
+        self.stop = threading.Event()
+        self.release = threading.Event()
+        self.trace = TurnTrace("speculative")
+        self.reply = ""
+        self.done = threading.Event()
+        self.thread = threading.Thread(
+            target=self._run, args=(messages, system_prompt, config, on_sentence), name="speculative-reply", daemon=True
+        )
+        self.thread.start()
+
+    def _run(self, messages: list[dict], system_prompt: str, config: dict, on_sentence) -> None:
+        try:
+            self.reply = stream_and_speak(
                 config["gateway_url"],
                 config["gateway_agent_id"],
-                conversation[-10:],
-                config.get("system_prompt", ""),
+                messages,
+                system_prompt,
                 config["tts_fifo"],
-                config.get("tts_barge_in_signal", "__STOP__"),
-                tts_stop,
+                self.stop,
                 config,
+                on_sentence=on_sentence,
+                trace=self.trace,
+                hold=self.release,
             )
-            if reply:
-                conversation.append({"role": "assistant", "content": reply})
-                print(f"JARVIS: {reply[:200]}{'...' if len(reply) > 200 else ''}", flush=True)
+        finally:
+            self.done.set()
+
+    def matches(self, text: str) -> bool:
+        return bool(self.key) and normalize_intent_text(text) == self.key
+
+    def cancel(self) -> None:
+        self.stop.set()
+
+    def commit(self, stop_event: threading.Event) -> str:
+        """Speak what was held and the rest of the stream; stop_event (barge-in) still cuts it off."""
+        self.release.set()
+        while not self.done.wait(0.05):
+            if stop_event.is_set():
+                self.stop.set()
+        return self.reply
+
+
+class Stage:
+    """
+    One pipeline stage: a worker thread draining a bounded inbox with handler(item).
+    put() is the backpressure point: it waits up to timeout for room, then drops the item and counts it.
+    stats() exposes queue depth, busy time and utilization since start.
+    """
+
+    def __init__(self, name: str, handler, maxsize: int = 2):
+        self.name = name
+        self.handler = handler
+        self.inbox = queue.Queue(maxsize=maxsize)
+        self.busy = False
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.started_at = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"stage-{self.name}", daemon=True)
+        self._thread.start()
+
+    def put(self, item, timeout: float = 0.0) -> bool:
+        try:
+            if timeout > 0:
+                self.inbox.put(item, timeout=timeout)
+            else:
+                self.inbox.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def idle(self) -> bool:
+        return not self.busy and self.inbox.empty()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                item = self.inbox.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.busy = True
+            t0 = time.monotonic()
+            try:
+                self.handler(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"{self.name} stage error: {e}", file=sys.stderr)
+            finally:
+                self.busy_seconds += time.monotonic() - t0
+                self.processed += 1
+                self.busy = False
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def stats(self) -> dict:
+        elapsed = max(time.monotonic() - (self.started_at or time.monotonic()), 1e-6)
+        return {
+            "depth": self.inbox.qsize(),
+            "busy_s": round(self.busy_seconds, 2),
+            "util": round(self.busy_seconds / elapsed, 3),
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+class VoicePipeline:
+    """
+    The voice node as independent stages so listening never stops while STT or a reply is running:
+      capture (audio callback → on_audio) → wake (WakeConsumer thread) → record (VAD) → stt → reply.
+    Stages are connected by bounded queues (pipeline_queue_size); a wake while recording is ignored,
+    and a full downstream queue blocks the upstream stage up to pipeline_put_timeout_seconds, then drops.
+    """
+
+    def __init__(self, config: dict, wake_model=None):
+        self.config = config
+        self.sr = config["sample_rate"]
+        self.chunk = config["chunk_samples"]
+        self.wake_phrase = config["wake_phrase"]
+        self.ring = RingBuffer(int(config["ring_buffer_seconds"] * self.sr))
+        self.wake_model = wake_model
+        self.wake = WakeConsumer(self.ring, self.chunk, wake_model, config)
+        self.arbiter = WakeArbiter(config["wake_arbiter"], config) if config.get("wake_arbiter") else None
+        self.vad = create_vad(config)
+        # Load the STT model now, in the background, instead of on the first utterance
+        self.stt = STTWorker(config)
+        self.streaming = bool(config.get("stt_streaming")) and self.stt.backend is not None
+        self.speculate = bool(config.get("speculate")) and self.streaming
+        if config.get("speculate") and not self.streaming:
+            print("Warning: speculate needs stt_streaming (partial transcripts); speculation off.", file=sys.stderr)
+        self.spec_stable = int(config.get("speculate_stable_partials", 2))
+        self.spec_pause = int(float(config.get("speculate_pause_seconds", 0.3)) * self.sr)
+        self.speculation = None  # SpeculativeReply for the utterance being recorded
+        self.spec_lock = threading.Lock()
+        self.spec_counts = {"started": 0, "hits": 0, "misses": 0, "aborted": 0}
+        self.spec_saved_ms = deque(maxlen=50)
+        self._last_partial = ("", 0)  # normalized partial, times in a row
+        self.gateways = gateway_endpoints(config["gateway_url"], config)
+        self.prewarm_on_wake = config.get("gateway_prewarm_on_wake", True)
+        # Queue for record_until_silence (chunks from the audio callback); cap to ~16s
+        self.chunk_queue = queue.Queue(maxsize=200)
+        self.tts = tts_writer(config["tts_fifo"], config)
+        self.trace_log = TraceLog(config.get("trace_log", ""), config)
+        self.tts_stop = threading.Event()
+        self.stop_event = threading.Event()
+        self.recording = threading.Event()
+        self.context = ConversationContext(
+            config,
+            summarize=lambda summary, turns: summarize_via_gateway(
+                config["gateway_url"], config["gateway_agent_id"], config, summary, turns
+            ),
+        )
+        self.intents = IntentRouter.from_config(config)
+        self.last_reply = ""
+        self.local_turns = 0
+        size = max(1, int(config.get("pipeline_queue_size", 2)))
+        self.put_timeout = float(config.get("pipeline_put_timeout_seconds", 30))
+        self.record_stage = Stage("record", self._record, maxsize=1)
+        self.stt_stage = Stage("stt", self._transcribe, maxsize=size)
+        self.reply_stage = Stage("reply", self._reply, maxsize=size)
+        self.stages = (self.record_stage, self.stt_stage, self.reply_stage)
+        self.wakes_ignored = 0
+        self._wake_thread = None
+        # Barge-in: "wake" (wake word during a reply), "speech" (any speech, or wake word), "off"
+        self.barge_in_mode = (config.get("barge_in") or "wake").strip().lower()
+        self.gate = BargeInGate(config)
+        self.wake.on_chunk = self._on_wake_chunk
+        self.barge_in_at = None
+        self.barge_ins = 0
+        self.echo_rejected = 0
+        self.interrupt_ms = deque(maxlen=50)
+
+    # capture -----------------------------------------------------------------
+
+    def on_audio(self, samples: np.ndarray) -> None:
+        """Called from the audio callback with one owned int16 chunk."""
+        self.ring.push(samples)
+        self.wake.notify()
+        try:
+            self.chunk_queue.put_nowait(samples)
+        except queue.Full:
+            try:
+                self.chunk_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                self.chunk_queue.put_nowait(samples)
+            except queue.Full:
+                pass
+
+    # wake --------------------------------------------------------------------
+
+    def replying(self, now: float | None = None) -> bool:
+        """A reply is being fetched or (by estimate) still playing."""
+        return self.reply_stage.busy or self.gate.playing(now or time.monotonic())
+
+    def _on_wake_chunk(self, chunk: np.ndarray) -> None:
+        # Runs on the wake thread for every chunk, before check_wake.
+        if self.barge_in_mode != "speech" or self.recording.is_set() or not self.replying():
+            self.gate.idle()
+            return
+        if self.gate.observe(chunk):
+            self.barge_in("speech")
+
+    def _wake_loop(self) -> None:
+        while not self.stop_event.is_set():
+            if not self.wake.wait_for_wake(self.stop_event):
+                continue
+            now = time.monotonic()
+            if self.recording.is_set():
+                self.wakes_ignored += 1
+                continue
+            replying = self.replying(now)
+            if replying and (self.barge_in_mode == "off" or self.gate.wake_is_echo(now)):
+                self.echo_rejected += 1
+                continue
+            if not self._arbitrate(replying):
+                continue
+            if replying:
+                self.barge_in("wake")
+                continue
+            print(f"[{self.wake_phrase}] detected, recording...", flush=True)
+            self.trigger("wake", now, self.wake.wake_end_seq)
+
+    def _arbitrate(self, replying: bool) -> bool:
+        """With a wake arbiter: claim the turn with this node's wake score and SNR; True if we answer it."""
+        if self.arbiter is None:
+            return True
+        audio = self.ring.get_all()
+        end = len(audio) - max(0, self.ring.write_seq - (self.wake.wake_end_seq or self.ring.write_seq))
+        snr = wake_snr_db(audio[: max(0, end)], self.chunk, self.sr)  # phrase ≈ the last second before its end
+        score = self.wake.wake_score
+        lost = self.arbiter.lost
+        won = self.arbiter.claim(score, snr, replying)
+        # The claim blocked the wake thread: what was captured meanwhile is the command (recorded from the
+        # ring separately) or another node's turn, so don't scan it late
+        self.wake.resync()
+        if won:
+            return True
+        if self.arbiter.lost == lost:
+            return False  # no verdict and not failing open (already reported)
+        print(
+            f"[{self.wake_phrase}] heard (score {score if score is None else round(score, 2)}, "
+            f"SNR {snr if snr is None else round(snr, 1)} dB); {self.arbiter.last_winner} answers",
+            flush=True,
+        )
+        if replying:
+            # Someone else took the conversation over: stop talking over them
+            self.tts_stop.set()
+            self.tts.interrupt(self.config.get("tts_barge_in_signal", "__STOP__"))
+            self.gate.reset()
+        return False
+
+    def barge_in(self, reason: str) -> None:
+        """User spoke over a reply: stop TTS, cancel the gateway stream, drop queued replies, record now."""
+        t0 = time.monotonic()
+        self.barge_in_at = t0
+        self.barge_ins += 1
+        self.tts_stop.set()
+        while True:
+            try:
+                _, _, spec = self.reply_stage.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if spec is not None:
+                spec.cancel()
+        sent = self.tts.interrupt(self.config.get("tts_barge_in_signal", "__STOP__"))
+        self.gate.reset()
+        stop_ms = (time.monotonic() - t0) * 1000
+        self.interrupt_ms.append(stop_ms)
+        print(f"[barge-in: {reason}] TTS stop {'sent' if sent else 'not sent (no reader)'} in {stop_ms:.1f} ms, recording...", flush=True)
+        self.trigger("barge_in", t0, self.wake.wake_end_seq if reason == "wake" else None)
+
+    def trigger(self, source: str = "manual", t: float | None = None, wake_end_seq: int | None = None) -> bool:
+        """Start recording an utterance (wake word, barge-in or manual Enter); t is when it fired and
+        wake_end_seq the ring position where the wake phrase ended, if known (pre-roll is trimmed to it)."""
+        if self.recording.is_set():
+            return False
+        self.recording.set()
+        if self.prewarm_on_wake:
+            self.prewarm()
+        if not self.record_stage.put((TurnTrace(source, t), wake_end_seq)):
+            self.recording.clear()
+            return False
+        return True
+
+    # record ------------------------------------------------------------------
+
+    def prewarm(self) -> None:
+        """Open (or refresh) connections to every endpoint a reply may use, hedges included."""
+        for endpoint in self.gateways:
+            if endpoint.breaker.state != "open":
+                endpoint.pool.prewarm()
+
+    def _pre_roll(self, wake_end_seq: int | None) -> np.ndarray:
+        """Audio before recording starts: from just before the end of the wake phrase, else the whole ring."""
+        if wake_end_seq is None or not self.config.get("stt_preroll_trim", True):
+            return self.ring.get_all()
+        start = wake_end_seq - int(float(self.config.get("stt_preroll_margin_seconds", 0.3)) * self.sr)
+        return self.ring.latest(max(0, self.ring.write_seq - start)).copy()
+
+    def _record(self, item: tuple) -> None:
+        trace, wake_end_seq = item
+        try:
+            full_ring = self.ring.filled
+            pre_roll = self._pre_roll(wake_end_seq)
+            trace.trimmed_seconds = (full_ring - len(pre_roll)) / self.sr
+            while not self.chunk_queue.empty():
+                try:
+                    self.chunk_queue.get_nowait()
+                except queue.Empty:
+                    break
+            streaming = None
+            on_chunk = None
+            if self.streaming:
+                streaming = StreamingTranscriber(self.stt, self.config, self.sr)
+                streaming.on_partial = self._on_partial
+                streaming.begin(pre_roll)
+                on_chunk = streaming.feed
+                if self.speculate:
+                    self._last_partial = ("", 0)
+                    streaming.on_speculative = lambda text: self._speculate(text, "pause")
+                    on_chunk = lambda chunk, vad: self._record_chunk(streaming, chunk, vad)  # noqa: E731
+            recorded = record_until_silence(None, self.config, self.stop_event, self.chunk_queue, self.vad, on_chunk)
+        finally:
+            self.recording.clear()
+        speculation = self._take_speculation()
+        if self.vad.heard_speech:
+            trace.mark("speech_end", self.vad.speech_end_time)
+        trace.mark("record_end")
+        trace.audio_seconds = (len(pre_roll) + len(recorded)) / self.sr
+        if len(recorded) < self.sr * 0.3:
+            print("Too short, ignoring.", flush=True)
+            if streaming:
+                streaming.cancel()
+            self._drop_speculation(speculation)
+            self.trace_log.write(trace, "too_short")
+            return
+        utterance = {
+            "pre_roll": pre_roll,
+            "recorded": recorded,
+            "streaming": streaming,
+            "speech_end_sample": self.vad.speech_end_sample if self.vad.heard_speech else None,
+            "trace": trace,
+            "speculation": speculation,
+        }
+        if not self.stt_stage.put(utterance, self.put_timeout):
+            self._drop_speculation(speculation)
+
+    # speculation -------------------------------------------------------------
+
+    def _record_chunk(self, streaming: StreamingTranscriber, chunk: np.ndarray, vad: StreamingVAD) -> None:
+        streaming.feed(chunk, vad)
+        if self.spec_pause > 0 and vad.heard_speech and not vad.is_speech:
+            if vad.samples - vad.speech_end_sample >= self.spec_pause:
+                streaming.speculate(vad.speech_end_sample)  # → on_speculative → _speculate
+
+    def _on_partial(self, partial: str) -> None:
+        print(f"  … {partial}", flush=True)
+        if not self.speculate:
+            return
+        key = normalize_intent_text(self._clean_transcript(partial))
+        runs = self._last_partial[1] + 1 if key and key == self._last_partial[0] else 1
+        self._last_partial = (key, runs)
+        with self.spec_lock:
+            current = self.speculation
+        if current is not None and not current.matches(self._clean_transcript(partial)):
+            self._drop_speculation(self._take_speculation())  # the hypothesis moved on
+        if self.spec_stable > 0 and runs >= self.spec_stable:
+            self._speculate(partial, "stable")
+
+    def _speculate(self, text: str, reason: str) -> None:
+        """Start (or keep) a held gateway request for text, a partial or would-be final transcript."""
+        text = self._clean_transcript(text)
+        # Only while nothing else is in flight: the context the request is built from must be final
+        if not text or not self.stt_stage.idle() or not self.reply_stage.idle() or self.gate.playing(time.monotonic()):
+            return
+        if self.intents is not None and self.intents.match(text) is not None:
+            return
+        with self.spec_lock:
+            current = self.speculation
+            if current is not None and current.matches(text):
+                return
+            messages = self.context.messages() + [{"role": "user", "content": text}]
+            self.speculation = SpeculativeReply(
+                text, messages, self.context.system_message(), self.config, on_sentence=self.gate.on_sentence
+            )
+            self.spec_counts["started"] += 1
+        if current is not None:
+            self._drop_speculation(current)
+        print(f"  [speculative request: {reason}] {text}", flush=True)
+
+    def _take_speculation(self) -> SpeculativeReply | None:
+        with self.spec_lock:
+            spec, self.speculation = self.speculation, None
+        return spec
+
+    def _drop_speculation(self, spec: SpeculativeReply | None) -> None:
+        if spec is not None:
+            spec.cancel()
+            self.spec_counts["aborted"] += 1
+
+    def _settle_speculation(self, spec: SpeculativeReply | None, text: str, trace: TurnTrace) -> SpeculativeReply | None:
+        """Final transcript is in: keep the speculative request if it asked the same thing, else cancel it."""
+        if spec is None:
+            return None
+        if spec.matches(text):
+            self.spec_counts["hits"] += 1
+            trace.speculation = "hit"
+            return spec
+        spec.cancel()
+        self.spec_counts["misses"] += 1
+        trace.speculation = "miss"
+        print(f"  [speculative miss] asked {spec.text!r}", flush=True)
+        return None
+
+    def _adopt_speculation(self, spec: SpeculativeReply, trace: TurnTrace) -> None:
+        """Move the committed request's marks onto the turn and work out how much sooner its first token was."""
+        marks = spec.trace.marks
+        if "first_sentence" in marks and self.tts.connected:
+            spec.trace.fifo_written.wait(0.5)
+        for name in ("request_sent", "first_token", "first_sentence", "first_fifo_write"):
+            if name in marks:
+                trace.mark(name, marks[name])
+        trace.payload_bytes = spec.trace.payload_bytes
+        trace.gateway = spec.trace.gateway
+        stt_end = trace.marks.get("stt_end")
+        if stt_end is not None and "first_token" in marks:
+            # Without speculation the request goes out at stt_end and takes the same time to first token
+            ttft = marks["first_token"] - marks["request_sent"]
+            trace.saved_ms = max(0.0, (stt_end + ttft - max(stt_end, marks["first_token"])) * 1000)
+            self.spec_saved_ms.append(trace.saved_ms)
+
+    # stt ---------------------------------------------------------------------
+
+    def _transcribe(self, utterance: dict) -> None:
+        trace = utterance["trace"]
+        trace.mark("stt_start")
+        if utterance["streaming"] is not None:
+            text = utterance["streaming"].finish(utterance["speech_end_sample"])
+        else:
+            pre_roll, recorded = utterance["pre_roll"], utterance["recorded"]
+            if self.config.get("stt_trim_silence"):
+                # Trailing: the VAD knows where speech ended; leading: energy scan of the pre-roll
+                end = utterance["speech_end_sample"]
+                if end is not None and end + int(0.2 * self.sr) < len(recorded):
+                    trace.trimmed_seconds += (len(recorded) - end - int(0.2 * self.sr)) / self.sr
+                    recorded = recorded[: end + int(0.2 * self.sr)]
+                lead = leading_silence(pre_roll, self.sr) if len(pre_roll) else 0
+                trace.trimmed_seconds += lead / self.sr
+                pre_roll = pre_roll[lead:]
+            full_audio = np.concatenate([pre_roll, recorded]) if len(pre_roll) > 0 else recorded
+            trace.audio_seconds = len(full_audio) / self.sr
+            text = self.stt.transcribe(full_audio, self.sr)
+        trace.mark("stt_end")
+        spec = self._settle_speculation(utterance.get("speculation"), self._clean_transcript(text or ""), trace)
+        if not text or not text.strip():
+            if self.stt.backend is None:
+                print("No STT configured. Set whisper_server_cmd, whisper_cmd or whisper_python in ~/.jarvis/voice_node.yaml. See PIXEL_VOICE_RUNBOOK.md.", flush=True)
+            else:
+                print("No transcript.", flush=True)
+            self.trace_log.write(trace, "no_transcript")
+            return
+        text = self._clean_transcript(text)
+        if not text:
+            print("(Wake phrase only, ignoring)", flush=True)
+            self.trace_log.write(trace, "wake_only")
+            return
+        print(f"User: {text}", flush=True)
+        if self.intents is not None:
+            entry = self.intents.match(text)
+            if entry is not None and self._local_intent(entry, trace):
+                self._drop_speculation(spec)
+                return
+        if not self.reply_stage.put((text, trace, spec), self.put_timeout):
+            self._drop_speculation(spec)
+
+    def _clean_transcript(self, text: str) -> str:
+        if self.config.get("strip_wake_phrase_from_transcript", True):
+            return strip_wake_phrase_from_text(text.strip(), self.wake_phrase)
+        return text.strip()
+
+    def _local_intent(self, entry: dict, trace: TurnTrace) -> bool:
+        """Answer a trivial command on-device (straight to the TTS FIFO); False to send it to the gateway."""
+        intent = entry["intent"]
+        if entry.get("reply"):
+            reply = entry["reply"]
+        elif intent == "stop":
+            self.tts_stop.set()
+            self.tts.interrupt(self.config.get("tts_barge_in_signal", "__STOP__"))
+            self.gate.reset()
+            reply = ""
+        elif intent == "time":
+            reply = spoken_time(time.localtime())
+        elif intent == "date":
+            reply = spoken_date(time.localtime())
+        elif intent in ("volume_up", "volume_down"):
+            reply = change_volume(self.config, 1 if intent == "volume_up" else -1)
+        elif intent == "repeat":
+            reply = strip_for_tts(self.last_reply) or "I haven't said anything yet."
+        else:
+            return False
+        self.local_turns += 1
+        if reply:
+            if self.tts.say(reply, lambda: trace.mark("first_fifo_write")):
+                trace.mark("first_sentence")
+                self.gate.on_sentence(reply)
+            print(f"JARVIS (local {intent}): {reply}", flush=True)
+        else:
+            print(f"(local {intent})", flush=True)
+        self._finish_trace(trace, f"local:{intent}")
+        return True
+
+    def _finish_trace(self, trace: TurnTrace, outcome: str) -> None:
+        trace.mark("reply_done")
+        if "first_sentence" in trace.marks and self.tts.connected:
+            trace.fifo_written.wait(0.5)  # short replies finish before the writer thread gets to the FIFO
+        self.trace_log.write(trace, outcome)
+
+    # reply -------------------------------------------------------------------
+
+    def _reply(self, item: tuple) -> None:
+        text, trace, spec = item
+        if spec is not None:
+            text = spec.text  # what the gateway was asked (same after normalization)
+        self.context.add("user", text)
+        messages = self.context.messages()
+        system_prompt = self.context.system_message()
+        trace.payload_tokens = self.context.payload_tokens(messages)
+        self.tts_stop.clear()
+        self.barge_in_at = None
+        if spec is not None:
+            reply = spec.commit(self.tts_stop)
+            self._adopt_speculation(spec, trace)
+        else:
+            reply = stream_and_speak(
+                self.config["gateway_url"],
+                self.config["gateway_agent_id"],
+                messages,
+                system_prompt,
+                self.config["tts_fifo"],
+                self.tts_stop,
+                self.config,
+                on_sentence=self.gate.on_sentence,
+                trace=trace,
+            )
+        self._finish_trace(trace, "barge_in" if self.barge_in_at is not None else ("ok" if reply else "no_reply"))
+        if self.barge_in_at is not None:
+            closed_ms = (time.monotonic() - self.barge_in_at) * 1000
+            self.interrupt_ms.append(closed_ms)
+            print(f"[barge-in] gateway stream closed {closed_ms:.0f} ms after detection", flush=True)
+        print(
+            f"[context] {len(messages)} message(s){' + summary' if self.context.summary else ''}, "
+            f"~{trace.payload_tokens} tokens, {trace.payload_bytes or 0} bytes",
+            flush=True,
+        )
+        if reply:
+            self.last_reply = reply
+            self.context.add("assistant", reply)
+            print(f"JARVIS: {reply[:200]}{'...' if len(reply) > 200 else ''}", flush=True)
+
+    # lifecycle ---------------------------------------------------------------
+
+    def start(self, listen_for_wake: bool = True) -> None:
+        self.stt.start()
+        self.prewarm()
+        for endpoint in self.gateways:
+            endpoint.pool.start_probing(float(self.config.get("gateway_probe_interval_seconds", 0)))
+        for stage in self.stages:
+            stage.start()
+        if (listen_for_wake and self.wake_model is not None) or self.barge_in_mode == "speech":
+            self._wake_thread = threading.Thread(target=self._wake_loop, name="stage-wake", daemon=True)
+            self._wake_thread.start()
+
+    def idle(self) -> bool:
+        return not self.recording.is_set() and all(stage.idle() for stage in self.stages)
+
+    def wait_idle(self, poll: float = 0.05) -> None:
+        while not self.idle() and not self.stop_event.is_set():
+            time.sleep(poll)
+
+    def close(self) -> None:
+        self.stop_event.set()
+        self.tts_stop.set()
+        self._drop_speculation(self._take_speculation())
+        if self._wake_thread is not None:
+            self._wake_thread.join(timeout=2)
+        for stage in self.stages:
+            stage.stop()
+        self.stt.close()
+        self.tts.close()
+
+    def speculation_stats(self) -> dict:
+        """Hit rate (of requests started), gateway requests thrown away, and first-token time saved on hits."""
+        c = self.spec_counts
+        saved = sorted(self.spec_saved_ms)
+        return {
+            **c,
+            "hit_rate": round(c["hits"] / c["started"], 3) if c["started"] else None,
+            "wasted_requests": c["misses"] + c["aborted"],
+            "median_saved_ms": round(saved[len(saved) // 2], 1) if saved else None,
+        }
+
+    def stats(self) -> dict:
+        out = {"ring": self.ring.stats()}
+        if self._wake_thread is not None:
+            out["wake"] = dict(self.wake.stats(), ignored=self.wakes_ignored)
+        if self.arbiter is not None:
+            out["arbiter"] = self.arbiter.stats()
+        if self.barge_ins or self.echo_rejected:
+            lat = sorted(self.interrupt_ms)
+            out["barge_in"] = {
+                "count": self.barge_ins,
+                "echo_rejected": self.echo_rejected,
+                "max_ms": round(lat[-1], 1) if lat else None,
+                "median_ms": round(lat[len(lat) // 2], 1) if lat else None,
+            }
+        for stage in self.stages:
+            out[stage.name] = stage.stats()
+        out["stt_worker"] = self.stt.stats()
+        out["gateway"] = {ep.name: ep.stats() for ep in self.gateways}
+        out["context"] = self.context.stats()
+        if self.intents is not None:
+            out["local_intents"] = self.local_turns
+        if self.speculate:
+            out["speculation"] = self.speculation_stats()
+        out["tts"] = self.tts.stats()
+        return out
+
+
+# -----------------------------------------------------------------------------
+# Main loop
+# -----------------------------------------------------------------------------
+
+def main() -> None:
+    config = load_config()
+    wake_phrase = config["wake_phrase"]
+
+    if not HAS_SOUNDDEVICE:
+        print("Install sounddevice and start PulseAudio (see PIXEL_VOICE_RUNBOOK.md).", file=sys.stderr)
+        sys.exit(1)
+    # Wake word: OpenWakeWord (needs onnxruntime) or Porcupine (Termux-friendly). Else manual trigger.
+    manual_trigger = os.environ.get("VOICE_NODE_MANUAL_TRIGGER", "").lower() in ("1", "true", "yes")
+    wake_model = create_wake_model(config)
+    if wake_model is None and not manual_trigger:
+        print("No wake word engine available. Install openwakeword (+ onnxruntime) or pvporcupine (see PIXEL_WAKE_WORD_OPTIONS.md).", file=sys.stderr)
+        print("Or run with VOICE_NODE_MANUAL_TRIGGER=1 for press-Enter-to-record.", file=sys.stderr)
+        sys.exit(1)
+    if wake_model is None:
+        manual_trigger = True
+    pipeline = VoicePipeline(config, wake_model)
+    capture = AudioCapture(config, pipeline.on_audio)
+    capture.start()
+    print(f"Capture: {capture.describe()}", flush=True)
+    if pipeline.arbiter is not None:
+        print(f"Wake arbiter: {config['wake_arbiter']} (this node: {pipeline.arbiter.node})", flush=True)
+    pipeline.start(listen_for_wake=not manual_trigger)
+    gateways = " → ".join(ep.name for ep in pipeline.gateways)
+    if manual_trigger:
+        print(f"Voice node: manual mode (press Enter to record). Gateway {gateways}", flush=True)
+    else:
+        print(f"Voice node: listening for '{wake_phrase}' (gateway {gateways})", flush=True)
+    stats_interval = float(config.get("pipeline_stats_seconds", 0))
+
+    try:
+        while True:
+            if manual_trigger:
+                try:
+                    input("Press Enter to record... ")
+                except EOFError:
+                    break
+                print("Recording... (speak now; silence ends)", flush=True)
+                pipeline.trigger()
+                # Keep the prompt from interleaving with this turn's output
+                pipeline.wait_idle()
+            else:
+                time.sleep(stats_interval or 1.0)
+                if stats_interval:
+                    print(f"Pipeline: {dict(pipeline.stats(), capture=capture.stats())}", file=sys.stderr)
     except KeyboardInterrupt:
         print("Stopping.", flush=True)
     finally:
-        stream.stop()
-        stream.close()
+        capture.close()
+        pipeline.close()
+        print(f"Pipeline: {dict(pipeline.stats(), capture=capture.stats())}", file=sys.stderr)
         if wake_model is not None and hasattr(wake_model, "delete"):
             try:
                 wake_model.delete()
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from voice_node import ConversationContext, estimate_tokens
+
+
+def context(summarize=None, **config):
+    return ConversationContext(dict({"system_prompt": "You are a voice assistant."}, **config), summarize)
+
+
+def settle(ctx):
+    """Wait for a compaction started by add() to finish."""
+    deadline = time.monotonic() + 5
+    while ctx._compacting:
+        assert time.monotonic() < deadline, "compaction did not finish"
+        time.sleep(0.001)
+
+
+def converse(ctx, exchanges, words=12):
+    sent = []
+    for i in range(exchanges):
+        for role in ("user", "assistant"):
+            msg = {"role": role, "content": f"{role} turn {i}. " + " ".join(f"word{k}" for k in range(words))}
+            ctx.add(msg["role"], msg["content"])
+            settle(ctx)
+            sent.append(msg)
+            yield sent
+
+
+@pytest.mark.parametrize("budget, exchanges, words", [
+    (64, 10, 4),
+    (200, 30, 12),
+    (600, 40, 30),
+    (1200, 60, 50),
+])
+def test_recent_turns_stay_within_budget(budget, exchanges, words):
+    ctx = context(context_recent_tokens=budget, context_summary_tokens=50)
+    for _ in converse(ctx, exchanges, words):
+        assert ctx.stats()["recent_tokens"] <= budget
+    assert ctx.compactions > 0
+    assert estimate_tokens(ctx.summary) <= 50
+    payload = ctx.payload_tokens(ctx.messages())
+    assert payload <= estimate_tokens(ctx.prompt) + 50 + budget + 20
+
+
+@pytest.mark.parametrize("budget, exchanges", [(64, 6), (200, 20), (600, 40)])
+def test_compaction_keeps_the_latest_turns(budget, exchanges):
+    ctx = context(context_recent_tokens=budget)
+    for sent in converse(ctx, exchanges):
+        kept = ctx.messages()
+        assert kept and kept == sent[-len(kept):]
+        assert kept[0]["role"] == "user"  # the kept window starts on a user turn
+    assert len(kept) < len(sent)
+
+
+def test_long_reply_is_truncated_to_half_the_budget():
+    ctx = context(context_recent_tokens=200)
+    ctx.add("assistant", "This is a sentence. " * 200)
+    assert estimate_tokens(ctx.messages()[0]["content"]) <= 100
+
+
+@pytest.mark.parametrize("mode, summarize, expected", [
+    ("extractive", None, "User asked: user turn 0."),
+    ("off", None, ""),
+    ("gateway", lambda summary, turns: f"{len(turns)} turns folded", "turns folded"),
+    ("gateway", None, "User asked: user turn 0."),  # no summarizer: extractive
+])
+def test_summary_modes(mode, summarize, expected):
+    ctx = context(context_recent_tokens=64, context_summary=mode, summarize=summarize)
+    for _ in converse(ctx, 4, words=4):
+        pass
+    assert ctx.compactions > 0
+    assert expected in ctx.summary if expected else ctx.summary == ""
+    assert (ctx.summary in ctx.system_message()) if ctx.summary else ctx.system_message() == ctx.prompt
+
+
+def test_gateway_summary_failure_falls_back_to_extractive(capsys):
+    def broken(summary, turns):
+        raise RuntimeError("gateway down")
+
+    ctx = context(context_recent_tokens=64, context_summary="gateway", summarize=broken)
+    for _ in converse(ctx, 4, words=4):
+        pass
+    assert "User asked: user turn 0." in ctx.summary
+    assert "gateway down" in capsys.readouterr().err
@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+import pytest
+
+from voice_node import DEFAULT_CONFIG, EnergyVAD
+
+SR = 16000
+CHUNK = 1280  # 80 ms
+
+
+def config(**overrides):
+    return dict(DEFAULT_CONFIG, sample_rate=SR, chunk_samples=CHUNK, **overrides)
+
+
+def tone(chunks, amplitude=0.3, freq=220.0):
+    t = np.arange(chunks * CHUNK) / SR
+    return (amplitude * 32767 * np.sin(2 * math.pi * freq * t)).astype(np.int16)
+
+
+def hiss(chunks, amplitude=0.001, seed=0):
+    rng = np.random.default_rng(seed)
+    return (amplitude * 32767 * rng.standard_normal(chunks * CHUNK)).astype(np.int16)
+
+
+def run(vad, audio):
+    """Feed audio chunk by chunk; the 1-based chunk that ended the utterance, or None."""
+    for i in range(0, len(audio), CHUNK):
+        if vad.process(audio[i : i + CHUNK]):
+            return i // CHUNK + 1
+    return None
+
+
+@pytest.mark.parametrize("silence_seconds", [0.3, 0.7, 1.2])
+@pytest.mark.parametrize("speech_chunks", [1, 5, 20])
+def test_speech_ends_after_silence_seconds(silence_seconds, speech_chunks):
+    vad = EnergyVAD(config(vad_silence_seconds=silence_seconds))
+    audio = np.concatenate([hiss(3), tone(speech_chunks), hiss(40, seed=1)])
+    ended = run(vad, audio)
+    silence_chunks = math.ceil(silence_seconds * SR / CHUNK)
+    assert ended == 3 + speech_chunks + silence_chunks
+    assert vad.end_reason == "silence"
+    assert vad.heard_speech
+    assert vad.speech_end_sample == (3 + speech_chunks) * CHUNK
+
+
+@pytest.mark.parametrize("gap_chunks, ends_in_gap", [(3, False), (8, False), (9, True)])
+def test_pause_shorter_than_silence_seconds_keeps_listening(gap_chunks, ends_in_gap):
+    # 0.7 s of silence is 8.75 chunks: a pause of up to 8 chunks is mid-utterance
+    vad = EnergyVAD(config(vad_silence_seconds=0.7))
+    audio = np.concatenate([tone(5), hiss(gap_chunks), tone(5), hiss(20, seed=1)])
+    ended = run(vad, audio)
+    if ends_in_gap:
+        assert ended == 5 + 9
+    else:
+        assert ended == 5 + gap_chunks + 5 + 9
+        assert vad.speech_end_sample == (10 + gap_chunks) * CHUNK
+
+
+def test_silence_only_ends_without_speech():
+    vad = EnergyVAD(config(vad_silence_seconds=0.7))
+    assert run(vad, hiss(20)) == 9
+    assert not vad.heard_speech
+
+
+def test_long_speech_ends_at_max_length():
+    vad = EnergyVAD(config(vad_max_utterance_seconds=2.0))
+    assert run(vad, tone(40)) == 25
+    assert vad.end_reason == "max_length"
+
+
+@pytest.mark.parametrize("hangover", [0, 3])
+def test_is_speech_holds_for_hangover_frames(hangover):
+    vad = EnergyVAD(config(vad_hangover_frames=hangover))
+    for chunk in np.split(tone(4), 4):
+        vad.process(chunk)
+    live = []
+    for chunk in np.split(hiss(5), 5):
+        vad.process(chunk)
+        live.append(vad.is_speech)
+    assert live == [True] * hangover + [False] * (5 - hangover)
+
+
+def test_loud_transient_stops_masking_speech_as_peak_decays():
+    # A clap at ~20x the speech level: quiet speech right after it is below threshold x peak, until the
+    # peak has decayed (half-life vad_peak_decay_seconds = 6.25 chunks here)
+    vad = EnergyVAD(config(vad_peak_decay_seconds=0.5, vad_silence_seconds=5.0))
+    vad.process(tone(1, amplitude=0.9))
+    heard = []
+    for chunk in np.split(tone(12, amplitude=0.05), 12):
+        vad.process(chunk)
+        heard.append(vad.speech_end_sample == vad.samples)
+    assert heard[:2] == [False, False]
+    assert heard.index(True) <= 6
@@ -0,0 +1,301 @@
+import http.server
+import importlib
+import os
+import threading
+import time
+
+import pytest
+
+import flappy_speech
+
+BODY_BYTES = 4000
+
+
+@pytest.fixture
+def tts_server():
+    """Local stand-in for the ElevenLabs endpoint: returns BODY_BYTES of fake mp3 per request."""
+    requests_seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            requests_seen.append(self.path)
+            body = b"ID3" + b"\0" * (BODY_BYTES - 3)
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/text-to-speech/test-voice", requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def speech(monkeypatch, tmp_path, tts_server):
+    url, _ = tts_server
+    monkeypatch.setenv("TTS_URL", url)
+    monkeypatch.setenv("FLAPPY_AUDIO_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setenv("FLAPPY_AUDIO_CACHE_MB", "50")
+    return importlib.reload(flappy_speech)
+
+
+def cache_bytes(speech):
+    return sum(size for _, size, _ in speech.audio_cache_entries())
+
+
+def test_cache_hit_makes_no_second_request(speech, tts_server):
+    _, seen = tts_server
+    first = speech.fetch_audio("Ouch!")
+    second = speech.fetch_audio("Ouch!")
+    assert first == second
+    assert os.path.getsize(first) == BODY_BYTES
+    assert len(seen) == 1
+
+
+def test_cache_key_changes_with_voice_settings(speech, tts_server, monkeypatch):
+    _, seen = tts_server
+    before = speech.fetch_audio("Ouch!")
+    monkeypatch.setattr(speech, "VOICE_SETTINGS", {"stability": 0.5, "similarity_boost": 1})
+    after = speech.audio_cache_path("Ouch!")
+    assert after != before
+    assert speech.fetch_audio("Ouch!") == after
+    assert len(seen) == 2
+
+
+def test_lru_eviction_keeps_cache_under_limit(speech, monkeypatch):
+    # Room for two files, not three
+    monkeypatch.setattr(speech, "AUDIO_CACHE_MAX_BYTES", int(2.5 * BODY_BYTES))
+    a = speech.fetch_audio("a")
+    b = speech.fetch_audio("b")
+    os.utime(a, (1000, 1000))
+    os.utime(b, (2000, 2000))
+    speech.fetch_audio("a")  # hit: a is now the most recently played
+    speech.fetch_audio("c")
+    assert cache_bytes(speech) <= speech.AUDIO_CACHE_MAX_BYTES
+    assert os.path.exists(a) and not os.path.exists(b)
+    assert speech.audio_cache_evictions == 1
+
+
+def test_cache_limit_comes_from_env(monkeypatch, tmp_path, tts_server):
+    url, seen = tts_server
+    monkeypatch.setenv("TTS_URL", url)
+    monkeypatch.setenv("FLAPPY_AUDIO_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setenv("FLAPPY_AUDIO_CACHE_MB", str(3 * BODY_BYTES / (1024 * 1024)))
+    speech = importlib.reload(flappy_speech)
+    for phrase in ("one", "two", "three", "four", "five"):
+        speech.fetch_audio(phrase)
+        assert cache_bytes(speech) <= 3 * BODY_BYTES
+    assert len(speech.audio_cache_entries()) == 3
+    assert len(seen) == 5
+
+
+def test_prefetch_fetches_each_phrase_once(speech, tts_server):
+    _, seen = tts_server
+    phrases = ["Ouch!", "Brick!", "Ouch!", "Whew!"]
+    speech.prefetch_phrases(phrases)
+    assert len(seen) == 3
+    speech.prefetch_phrases(phrases)
+    assert len(seen) == 3
+    assert all(os.path.exists(speech.audio_cache_path(p)) for p in phrases)
+
+
+def test_prefetch_stops_when_the_cache_is_full(speech, tts_server, monkeypatch):
+    _, seen = tts_server
+    monkeypatch.setattr(speech, "AUDIO_CACHE_MAX_BYTES", int(2.5 * BODY_BYTES))
+    speech.prefetch_phrases([f"line {i}" for i in range(6)])
+    # The third fetch overflows and evicts; prefetch stops instead of churning through the rest
+    assert len(seen) == 3
+    assert cache_bytes(speech) <= speech.AUDIO_CACHE_MAX_BYTES
+
+
+def test_failed_request_is_not_cached(speech, monkeypatch):
+    monkeypatch.setattr(speech, "TTS_URL", "http://127.0.0.1:9/unreachable")
+    with pytest.raises(Exception):
+        speech.fetch_audio("Ouch!")
+    assert not os.path.exists(speech.audio_cache_path("Ouch!"))
+
+
+class FakePlayer:
+    """Popen stand-in: plays until kill() or finish(), or returns at once when blocking=False."""
+
+    def __init__(self, path, blocking):
+        self.path = path
+        self.killed = False
+        self.done = threading.Event()
+        if not blocking:
+            self.done.set()
+
+    def poll(self):
+        return 0 if self.done.is_set() else None
+
+    def kill(self):
+        self.killed = True
+        self.done.set()
+
+    def finish(self):
+        self.done.set()
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+        return 0
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    speech = importlib.reload(flappy_speech)
+    speech.players = []
+    speech.blocking = False
+    monkeypatch.setattr(speech, "fetch_audio", lambda text: f"/fake/{text}.mp3")
+
+    def start_player(path):
+        player = FakePlayer(path, speech.blocking)
+        speech.players.append(player)
+        return player
+
+    monkeypatch.setattr(speech, "start_player", start_player)
+    return speech
+
+
+def queued(speech):
+    return [(-item[0], item[3], item[4]) for item in sorted(speech.speech_queue)]
+
+
+def drain(speech):
+    while speech.play_next():
+        pass
+    return [player.path for player in speech.players]
+
+
+def play_in_background(speech):
+    speech.blocking = True
+    worker = threading.Thread(target=speech.play_next)
+    worker.start()
+    for _ in range(200):
+        if speech.speech_playing:
+            return worker
+        time.sleep(0.01)
+    raise AssertionError("nothing started playing")
+
+
+def test_plays_highest_priority_first(scheduler):
+    scheduler.speak("Five!", "score_5")
+    scheduler.speak("Splat!", "pipe_hit")
+    scheduler.speak("New record!", "high_score")
+    assert drain(scheduler) == ["/fake/New record!.mp3", "/fake/Splat!.mp3", "/fake/Five!.mp3"]
+    assert scheduler.speech_stats["played"] == 3
+
+
+@pytest.mark.parametrize("chatter", ["flap_streak", "multi_flap", "flap_score_5", "flap_score_20", None])
+def test_event_drops_queued_chatter(scheduler, chatter):
+    scheduler.speak("Flappy flappy!", chatter)
+    scheduler.speak("Five!", "score_5")
+    assert queued(scheduler) == [(1, "score_5", "Five!")]
+    assert scheduler.speech_stats["preempted"] == 1
+
+
+def test_event_kills_playing_chatter(scheduler):
+    scheduler.speak("Flappy flappy!", "flap_streak")
+    worker = play_in_background(scheduler)
+    scheduler.speak("Splat!", "pipe_hit")
+    worker.join(timeout=1)
+    assert not worker.is_alive()
+    assert scheduler.players[0].killed
+    assert scheduler.speech_stats["preempted"] == 1
+    assert queued(scheduler) == [(2, "pipe_hit", "Splat!")]
+
+
+def test_event_does_not_kill_playing_event(scheduler):
+    scheduler.speak("Five!", "score_5")
+    worker = play_in_background(scheduler)
+    scheduler.speak("New record!", "high_score")
+    assert not scheduler.players[0].killed
+    scheduler.players[0].finish()
+    worker.join(timeout=1)
+    assert scheduler.speech_stats["preempted"] == 0
+
+
+def test_chatter_does_not_preempt_chatter(scheduler):
+    scheduler.speak("Flappy flappy!", "flap_streak")
+    worker = play_in_background(scheduler)
+    scheduler.speak("Flap flap!", "multi_flap")
+    assert not scheduler.players[0].killed
+    scheduler.players[0].finish()
+    worker.join(timeout=1)
+    assert len(queued(scheduler)) == 1
+
+
+def test_same_situation_coalesces_to_newest_line(scheduler):
+    scheduler.speak("Splat!", "pipe_hit")
+    scheduler.speak("Ouch!", "pipe_hit")
+    assert queued(scheduler) == [(2, "pipe_hit", "Ouch!")]
+    assert scheduler.speech_stats["coalesced"] == 1
+    assert scheduler.speech_stats["queued"] == 1
+
+
+def test_lines_without_situation_do_not_coalesce(scheduler):
+    scheduler.speak("Hey!")
+    scheduler.speak("Hey!")
+    assert len(queued(scheduler)) == 2
+    assert scheduler.speech_stats["coalesced"] == 0
+
+
+@pytest.mark.parametrize("situation, age, played", [
+    ("flap_streak", 0.5, True),
+    ("flap_streak", 1.0, False),
+    ("score_5", 1.9, True),
+    ("score_5", 2.5, False),
+    ("pipe_hit", 2.5, True),
+    ("pipe_hit", 3.5, False),
+    ("high_score", 3.5, True),
+    ("high_score", 4.5, False),
+])
+def test_stale_lines_are_dropped(scheduler, monkeypatch, situation, age, played):
+    now = 1000.0
+    monkeypatch.setattr(scheduler.time, "time", lambda: now)
+    scheduler.speak("Line", situation)
+    now += age
+    assert scheduler.play_next()
+    assert len(scheduler.players) == int(played)
+    assert scheduler.speech_stats["stale"] == int(not played)
+
+
+def fill_queue(speech):
+    for situation in ("score_5", "pipe_hit", "score_10", "ground_hit"):
+        speech.speak(situation, situation)
+    assert len(speech.speech_queue) == speech.SPEECH_QUEUE_MAX
+
+
+def test_full_queue_drops_new_line_of_equal_or_lower_priority(scheduler):
+    fill_queue(scheduler)
+    before = queued(scheduler)
+    scheduler.speak("Twenty!", "score_20")
+    scheduler.speak("Flap flap!", "multi_flap")
+    assert queued(scheduler) == before
+    assert scheduler.speech_stats["full"] == 2
+
+
+def test_full_queue_replaces_least_important_oldest_line(scheduler):
+    fill_queue(scheduler)
+    scheduler.speak("New record!", "high_score")
+    assert queued(scheduler) == [
+        (3, "high_score", "New record!"),
+        (2, "pipe_hit", "pipe_hit"),
+        (2, "ground_hit", "ground_hit"),
+        (1, "score_10", "score_10"),
+    ]
+    assert scheduler.speech_stats["full"] == 1
+
+
+def test_failed_fetch_is_counted_and_skipped(scheduler, monkeypatch):
+    monkeypatch.setattr(scheduler, "fetch_audio", lambda text: None)
+    scheduler.speak("Splat!", "pipe_hit")
+    assert scheduler.play_next()
+    assert not scheduler.play_next()
+    assert scheduler.players == []
+    assert scheduler.speech_stats["failed"] == 1
@@ -0,0 +1,106 @@
+import time
+import types
+
+import pytest
+
+from voice_node import DEFAULT_CONFIG, IntentRouter, TurnTrace, VoicePipeline, normalize_intent_text, spoken_time
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter.from_config(DEFAULT_CONFIG)
+
+
+def intent(router, text):
+    entry = router.match(text)
+    return None if entry is None else entry["intent"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("What time is it?", "time"),
+    ("what time is it right now", "time"),
+    ("Hey Jarvis, what's the time?", "time"),
+    ("Tell me the current time, please.", "time"),
+    ("Time.", "time"),
+    ("What's the date today?", "date"),
+    ("What day is it?", "date"),
+    ("Stop!", "stop"),
+    ("Stop talking.", "stop"),
+    ("Okay, never mind.", "stop"),
+    ("Be quiet", "stop"),
+    ("Volume up.", "volume_up"),
+    ("Turn the volume up a bit, please.", "volume_up"),
+    ("Make it louder", "volume_up"),
+    ("louder", "volume_up"),
+    ("Turn it down.", "volume_down"),
+    ("Volume down", "volume_down"),
+    ("Can you repeat that?", "repeat"),
+    ("Say that again.", "repeat"),
+])
+def test_local_intents(router, text, expected):
+    assert intent(router, text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "What time is it in Tokyo?",
+    "What time does the store open?",
+    "Stop the timer in ten minutes.",
+    "Don't stop.",
+    "Turn the volume up on the TV in the kitchen.",
+    "What's the weather like?",
+    "Repeat after me: hello.",
+    "Hey Jarvis.",
+    "",
+    "...",
+])
+def test_non_matches_fall_through_to_the_gateway(router, text):
+    assert router.match(text) is None
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Hey Jarvis, what's the time?", "whats the time"),
+    ("Okay um stop please", "stop"),
+    ("Thank you.", ""),
+    ("Turn it up - a bit", "turn it up a bit"),
+])
+def test_normalize_intent_text(text, expected):
+    assert normalize_intent_text(text) == expected
+
+
+def test_config_table_comes_first():
+    config = dict(DEFAULT_CONFIG, local_intent_table=[
+        {"intent": "greet", "phrases": ["good morning"], "reply": "Morning!"},
+        {"intent": "lights", "phrases": ["stop"]},
+    ])
+    router = IntentRouter.from_config(config)
+    assert router.match("Good morning!")["reply"] == "Morning!"
+    assert intent(router, "stop") == "lights"
+    assert intent(router, "what time is it") == "time"
+
+
+def test_local_intents_can_be_disabled():
+    assert IntentRouter.from_config(dict(DEFAULT_CONFIG, local_intents=False)) is None
+
+
+def test_bad_pattern_is_skipped(capsys):
+    router = IntentRouter([{"intent": "x", "patterns": ["(unclosed", "fine"]}])
+    assert intent(router, "fine") == "x"
+    assert "bad local intent pattern" in capsys.readouterr().err
+
+
+def test_unknown_intent_without_reply_goes_to_the_gateway():
+    # A config entry the node has no handler for is not answered locally
+    pipeline = types.SimpleNamespace(local_turns=0)
+    assert VoicePipeline._local_intent(pipeline, {"intent": "lights"}, TurnTrace()) is False
+    assert pipeline.local_turns == 0
+
+
+@pytest.mark.parametrize("hour, minute, expected", [
+    (0, 5, "It's 12:05 AM."),
+    (9, 30, "It's 9:30 AM."),
+    (12, 0, "It's 12:00 PM."),
+    (23, 59, "It's 11:59 PM."),
+])
+def test_spoken_time(hour, minute, expected):
+    now = time.struct_time((2026, 1, 2, hour, minute, 0, 4, 2, 0))
+    assert spoken_time(now) == expected
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from voice_node import RingBuffer
+
+
+def samples(start, n):
+    return np.arange(start, start + n, dtype=np.int16)
+
+
+def filled_ring(size, pushes):
+    ring = RingBuffer(size)
+    seq = 0
+    for n in pushes:
+        ring.push(samples(seq, n))
+        seq += n
+    return ring
+
+
+@pytest.mark.parametrize("pushes, latest", [
+    ([3], [0, 1, 2]),
+    ([8], list(range(8))),
+    ([5, 5], list(range(2, 10))),  # wraps once
+    ([7, 7, 7], list(range(13, 21))),  # wraps several times
+    ([20], list(range(12, 20))),  # one push larger than the ring keeps its tail
+])
+def test_sequence_numbers_survive_wraparound(pushes, latest):
+    ring = filled_ring(8, pushes)
+    assert ring.write_seq == sum(pushes)
+    assert ring.pos == sum(pushes) % 8
+    view = ring.latest(8)
+    assert (view.start_seq, view.end_seq) == (sum(pushes) - len(latest), sum(pushes))
+    assert view.array().tolist() == latest
+
+
+def test_wrapped_view_has_two_segments():
+    ring = filled_ring(8, [6, 4])
+    view = ring.since(4)
+    assert len(view.segments) == 2
+    assert view.array().tolist() == [4, 5, 6, 7, 8, 9]
+
+
+@pytest.mark.parametrize("pushes, seq, max_samples, expected, overruns, overrun_samples", [
+    ([6], 2, None, [2, 3, 4, 5], 0, 0),
+    ([6], 6, None, [], 0, 0),
+    ([6, 4], 2, None, list(range(2, 10)), 0, 0),  # oldest sample still held: no overrun
+    ([6, 4], 0, None, list(range(2, 10)), 1, 2),
+    ([6, 4, 4], 1, None, list(range(6, 14)), 1, 5),
+    ([6, 4], 3, 2, [3, 4], 0, 0),
+])
+def test_since_counts_overruns(pushes, seq, max_samples, expected, overruns, overrun_samples):
+    ring = filled_ring(8, pushes)
+    assert ring.since(seq, max_samples).array().tolist() == expected
+    assert ring.overruns == overruns
+    assert ring.overrun_samples == overrun_samples
+
+
+def test_since_after_clear_is_not_an_overrun():
+    ring = filled_ring(8, [6])
+    ring.clear()
+    ring.push(samples(6, 2))
+    assert ring.since(0).array().tolist() == [6, 7]
+    assert ring.filled == 2
+    assert ring.overruns == 0
+
+
+@pytest.mark.parametrize("later_pushes, intact", [
+    ([], True),
+    ([2], True),  # fills the free space, overwrites nothing in the view
+    ([4], True),  # overwrites samples before the view only
+    ([5], False),  # laps the first sample of the view
+    ([3, 3], False),
+])
+def test_intact_detects_lapped_views(later_pushes, intact):
+    ring = filled_ring(8, [6])
+    view = ring.since(2)
+    before = view.array().copy()
+    seq = 6
+    for n in later_pushes:
+        ring.push(samples(seq, n))
+        seq += n
+    assert view.intact() is intact
+    copied = view.copy()
+    assert ring.torn_reads == int(not intact)
+    if intact:
+        assert copied.tolist() == before.tolist()
+
+
+def test_write_in_progress_counts_as_torn():
+    ring = filled_ring(8, [8])
+    view = ring.latest(4)
+    assert view.intact()
+    # Producer has claimed the next chunk but not yet published it
+    ring._claim_seq = ring.write_seq + 5
+    assert not view.intact()
+    view.copy()
+    assert ring.stats()["torn_reads"] == 1
@@ -0,0 +1,87 @@
+import pytest
+
+from tts_text import SentenceSegmenter
+
+
+def segment(text, first_clause_words=0, step=None):
+    """All pieces the segmenter produces for text fed step characters at a time (None: all at once)."""
+    seg = SentenceSegmenter(first_clause_words)
+    step = step or len(text)
+    out = []
+    for i in range(0, len(text), step):
+        out += seg.feed(text[i : i + step])
+    rest = seg.flush()
+    return out + ([rest] if rest else [])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("It's late. Go to bed!", ["It's late.", "Go to bed!"]),
+    ("Really? Yes.", ["Really?", "Yes."]),
+    ("First line\nSecond line", ["First line", "Second line"]),
+    ("Wait... what?", ["Wait...", "what?"]),
+    ("No end", ["No end"]),
+])
+def test_sentence_ends(text, expected):
+    assert segment(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Ask Dr. Smith tomorrow. He knows.", ["Ask Dr. Smith tomorrow.", "He knows."]),
+    ("Mr. and Mrs. Jones are here. Hi.", ["Mr. and Mrs. Jones are here.", "Hi."]),
+    ("Bring fruit, e.g. apples. Thanks.", ["Bring fruit, e.g. apples.", "Thanks."]),
+    ("That is, i.e. never. Fine.", ["That is, i.e. never.", "Fine."]),
+    ("Written by J. R. R. Tolkien. Great.", ["Written by J. R. R. Tolkien.", "Great."]),
+    ("Meet at 9 a.m. tomorrow. Bye.", ["Meet at 9 a.m. tomorrow.", "Bye."]),
+    ("Eggs, milk, etc. are in. Done.", ["Eggs, milk, etc. are in.", "Done."]),
+    ("The Jan. numbers are in. Good.", ["The Jan. numbers are in.", "Good."]),
+    ("So I. Then you.", ["So I.", "Then you."]),  # "I" is a word, not an initial
+])
+def test_abbreviations_do_not_end_a_sentence(text, expected):
+    assert segment(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("It costs 3.50 today. Cheap.", ["It costs 3.50 today.", "Cheap."]),
+    ("Pi is 3.14159. Roughly.", ["Pi is 3.14159.", "Roughly."]),
+    ("See example.com/docs for more. Ok.", ["See example.com/docs for more.", "Ok."]),
+    ("Open https://a.example.org/x.html now. Then wait.", ["Open https://a.example.org/x.html now.", "Then wait."]),
+    ("Version 2.0.1 shipped. Yay!", ["Version 2.0.1 shipped.", "Yay!"]),
+])
+def test_decimals_and_urls_do_not_end_a_sentence(text, expected):
+    assert segment(text) == expected
+
+
+REPLY = "Sure thing, the meeting is at three, in room four. Bring the slides, please."
+
+
+@pytest.mark.parametrize("first_clause_words, expected", [
+    (0, ["Sure thing, the meeting is at three, in room four.", "Bring the slides, please."]),
+    (2, ["Sure thing,", "the meeting is at three, in room four.", "Bring the slides, please."]),
+    (4, ["Sure thing, the meeting is at three,", "in room four.", "Bring the slides, please."]),
+    (20, ["Sure thing, the meeting is at three, in room four.", "Bring the slides, please."]),
+])
+def test_first_clause_flush_only_for_the_first_piece(first_clause_words, expected):
+    assert segment(REPLY, first_clause_words) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Right now; it is late.", ["Right now;", "it is late."]),
+    ("Two things: one, two.", ["Two things:", "one, two."]),
+    ("Ok so — here goes.", ["Ok so —", "here goes."]),
+    ("Ok so - here goes.", ["Ok so -", "here goes."]),
+    ("A well-known fact, sadly.", ["A well-known fact,", "sadly."]),  # hyphen inside a word is not a break
+    ("It is 3,500 dollars.", ["It is 3,500 dollars."]),  # no space after the comma
+])
+def test_first_clause_breaks(text, expected):
+    assert segment(text, first_clause_words=2) == expected
+
+
+@pytest.mark.parametrize("text, first_clause_words", [
+    ("Ask Dr. Smith tomorrow. He knows.", 0),
+    ("It costs 3.50 today. See example.com/docs. Ok.", 0),
+    (REPLY, 4),
+    ("Line one\nLine two. Three? Four!", 2),
+])
+@pytest.mark.parametrize("step", [1, 2, 3, 7])
+def test_streaming_matches_one_shot(text, first_clause_words, step):
+    assert segment(text, first_clause_words, step) == segment(text, first_clause_words)